@@ -21,8 +21,11 @@ __version__ = "3.4.0"
 import os
 
 from .show import *
+from .cache import *
 from .config import *
 from .comms import *
+from .metrics import *
+from .aio import *
 from .utils import *
 
 from .colors import *
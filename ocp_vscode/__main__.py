@@ -90,6 +90,12 @@ def track_param(ctx, param, value):
     help="The port to start OCP CAD with",
     callback=track_param,
 )
+@click.option(
+    "--unix_socket",
+    default=None,
+    help="Additionally listen on this unix domain socket for Python clients on the same host, use set_port(path) or OCP_PORT=path to connect",
+    callback=track_param,
+)
 @click.option(
     "--debug",
     is_flag=True,
@@ -0,0 +1,374 @@
+"""Awaitable versions of show, show_object, status, set_viewer_config and save_screenshot"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import traceback
+
+from websockets.asyncio.client import connect, unix_connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+from websockets.protocol import State
+
+from ocp_vscode.comms import (
+    COMMS_DEFAULTS,
+    MIRRORS,
+    Fragments,
+    MessageType,
+    _decode_response,
+    _encode,
+    _error_config,
+    _expects_response,
+    _viewer_config,
+    get_comms_default,
+    get_host,
+    get_port,
+    invalidate_mirror,
+    is_pytest,
+    unix_socket_path,
+)
+from ocp_vscode.config import (
+    _status_from_response,
+    _ui_message,
+    set_viewer_config,
+    validate_tool_args,
+)
+from ocp_vscode.deferred import DEFERRED, send_model
+from ocp_vscode.metrics import METRICS, Timer
+from ocp_vscode.progressive import start_refinement
+from ocp_vscode.show import (
+    _create_message,
+    _screenshot_command,
+    _screenshot_polls,
+    _stack_object,
+    none_filter,
+    show,
+    show_object,
+)
+from ocp_vscode.utils import comms_warning
+
+__all__ = [
+    "ashow",
+    "ashow_object",
+    "astatus",
+    "aset_viewer_config",
+    "asave_screenshot",
+]
+
+
+class AsyncConnectionManager:
+    """Asyncio counterpart of comms.ConnectionManager
+
+    Keeps one connection per (event loop, host, port), so that several viewers
+    can be served concurrently from one event loop.
+    """
+
+    def __init__(self):
+        self._connections = {}
+        self._locks = {}
+
+    def _key(self, host, port):
+        loop = asyncio.get_running_loop()
+        # forget connections of event loops that are gone
+        for key in [k for k in self._connections if k[0].is_closed()]:
+            del self._connections[key]
+            self._locks.pop(key, None)
+        return (loop, host, port)
+
+    def _get_lock(self, key):
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    async def _get_connection(self, key, timeit=False, name=""):
+        ws = self._connections.get(key)
+        if ws is not None and ws.protocol.state is not State.OPEN:
+            await self._drop(key)
+            ws = None
+
+        if ws is None:
+            with Timer(timeit, "", f"websocket connect ({name})", 1, metric="connect"):
+                _, host, port = key
+                kwargs = dict(
+                    close_timeout=0.05,
+                    # avoid compressing twice
+                    compression=(
+                        None if COMMS_DEFAULTS["compression"] is not None else "deflate"
+                    ),
+                )
+                path = unix_socket_path(port)
+                if path is not None:
+                    ws = await unix_connect(path, "ws://localhost/", **kwargs)
+                else:
+                    ws = await connect(f"ws://{host}:{port}", **kwargs)
+            self._connections[key] = ws
+
+        return ws
+
+    async def _drop(self, key):
+        ws = self._connections.pop(key, None)
+        if ws is not None:
+            try:
+                await ws.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+    async def send(self, host, port, message, receive=False, timeit=False, name=""):
+        """Send a message and optionally wait for the response.
+
+        If sending over a reused connection fails, the connection is reopened and
+        the message is sent once more.
+        """
+        key = self._key(host, port)
+        async with self._get_lock(key):
+            for attempt in range(2):
+                reused = key in self._connections
+                ws = await self._get_connection(key, timeit, name)
+                try:
+                    if isinstance(message, Fragments):
+                        for fragment in message:
+                            await ws.send(fragment)
+                    else:
+                        await ws.send(message)
+                except ConnectionClosed:
+                    await self._drop(key)
+                    if reused and attempt == 0:
+                        continue
+                    raise
+
+                if not receive:
+                    return None
+
+                try:
+                    return await ws.recv()
+                except ConnectionClosed:
+                    await self._drop(key)
+                    raise
+
+    async def close(self):
+        """Close all connections of the running event loop"""
+        loop = asyncio.get_running_loop()
+        for key in [k for k in self._connections if k[0] is loop]:
+            async with self._get_lock(key):
+                await self._drop(key)
+
+
+CONNECTIONS = AsyncConnectionManager()
+
+
+async def _resolve_port(port):
+    if port is None:
+        # port discovery might block or ask the user
+        loop = asyncio.get_running_loop()
+        port = await loop.run_in_executor(None, get_port)
+    return port
+
+
+async def _asend(data, message_type, port=None, timeit=False):
+    """Send data to the viewer, see comms._send"""
+    port = await _resolve_port(port)
+    try:
+        if message_type in (MessageType.DATA, MessageType.BACKEND):
+            # serializing large messages would block the event loop
+            loop = asyncio.get_running_loop()
+            j, size = await loop.run_in_executor(
+                None, _encode, data, message_type, timeit, port
+            )
+        else:
+            j, size = _encode(data, message_type, timeit, port)
+        receive = _expects_response(data, message_type)
+        METRICS.record("bytes", size)
+        METRICS.record("messages")
+
+        try:
+            with Timer(
+                timeit,
+                "",
+                f"websocket send {size / 1024 / 1024:.3f} MB",
+                1,
+                metric="send",
+            ):
+                response = await CONNECTIONS.send(
+                    get_host(),
+                    port,
+                    j,
+                    receive=receive,
+                    timeit=timeit,
+                    name=message_type.name,
+                )
+            if receive:
+                METRICS.record("round_trips")
+
+            return _decode_response(response, message_type, receive)
+
+        except (ConnectionRefusedError, OSError, WebSocketException) as ex:
+            comms_warning(f"Connection error: {ex}\nMessage: {data}")
+            return _error_config()
+
+        except Exception as ex:
+            comms_warning(f"Unexpected error: {ex}\n{traceback.format_exc()}")
+            return _error_config()
+
+    except Exception as ex:  # pylint: disable=broad-except
+        print(
+            f"Cannot connect to viewer on port {port}, is it running and the right port provided?"
+        )
+        print(ex)
+        return None
+
+
+async def asend_data(data, port=None, timeit=False):
+    """Send data to the viewer"""
+    port = await _resolve_port(port)
+    result = await _asend(data, MessageType.DATA, port, timeit)
+    MIRRORS.shown(port)
+    return result
+
+
+async def asend_command(data, port=None, timeit=False):
+    """Send command to the viewer, "config" and "status" are answered from the
+    local mirror if possible"""
+    mirrored = data in ("config", "status") and COMMS_DEFAULTS["mirror"]
+    if mirrored:
+        port = await _resolve_port(port)
+        result = MIRRORS.get(data, port)
+        if result is not None:
+            return _viewer_config(data, port, result)
+
+    port = await _resolve_port(port)
+    result = await _asend(data, MessageType.COMMAND, port, timeit)
+    if result.get("command") == "status":
+        result = result["text"]
+    if mirrored and isinstance(result, dict):
+        MIRRORS.refresh(data, port, result)
+    return _viewer_config(data, port, result)
+
+
+async def asend_backend(data, port=None, timeit=False):
+    """Send data to the backend, returns the acknowledgement"""
+    return await _asend(data, MessageType.BACKEND, port, timeit)
+
+
+async def ashow(*cad_objs, **kwargs):
+    """Awaitable version of show() with the same parameters.
+
+    Tessellation runs in the default executor of the event loop, so that
+    several models and viewers can be processed concurrently.
+    """
+    bound = inspect.signature(show).bind(*cad_objs, **kwargs)
+    bound.apply_defaults()
+    kwargs = none_filter(bound.arguments, ["cad_objs"])
+    validate_tool_args(kwargs.get("explode"), kwargs.get("analysis_tool"))
+
+    with METRICS.show():
+        return await _ashow(*cad_objs, **kwargs)
+
+
+async def _ashow(*cad_objs, **kwargs):
+    port = kwargs["port"] = await _resolve_port(kwargs.get("port"))
+    loop = asyncio.get_running_loop()
+
+    def send_batch(message, timeit):
+        # called in the executor, keep the batches on the connection of the loop
+        asyncio.run_coroutine_threadsafe(
+            asend_data(message, port=port, timeit=timeit), loop
+        ).result()
+
+    # the executor does not inherit the context that holds the show metrics
+    result = await loop.run_in_executor(
+        None,
+        functools.partial(
+            contextvars.copy_context().run,
+            _create_message,
+            *cad_objs,
+            send_batch=send_batch,
+            **kwargs,
+        ),
+    )
+    if result is None:
+        return None
+    t, mapping, timeit = result
+
+    if is_pytest():
+        return t, mapping
+
+    with Timer(timeit, "", "send"):
+        await asend_data(t, port=port, timeit=timeit)
+    mapping = DEFERRED.model(mapping, port, get_comms_default("lazy_backend"))
+    if mapping is not None:
+
+        def send_backend(message, port, timeit):
+            # called in the executor, encoding the shapes would block the loop
+            return asyncio.run_coroutine_threadsafe(
+                asend_backend(message, port=port, timeit=timeit), loop
+            ).result()
+
+        await loop.run_in_executor(
+            None,
+            functools.partial(
+                contextvars.copy_context().run,
+                send_model,
+                mapping,
+                port,
+                timeit,
+                send=send_backend,
+            ),
+        )
+    start_refinement(port)
+
+
+async def ashow_object(obj, **kwargs):
+    """Awaitable version of show_object() with the same parameters"""
+    bound = inspect.signature(show_object).bind(obj, **kwargs)
+    bound.apply_defaults()
+    kwargs = none_filter(bound.arguments, ["obj"])
+    validate_tool_args(kwargs.get("explode"), kwargs.get("analysis_tool"))
+
+    cad_objs, kwargs = _stack_object(obj, **kwargs)
+    return await ashow(*cad_objs, **kwargs)
+
+
+async def astatus(port=None, debug=False):
+    """Awaitable version of status()"""
+    if is_pytest():
+        return {}
+
+    response = await asend_command("status", port=port)
+    return _status_from_response(response, debug)
+
+
+async def aset_viewer_config(port=None, **kwargs):
+    """Awaitable version of set_viewer_config() with the same parameters"""
+    bound = inspect.signature(set_viewer_config).bind(port=port, **kwargs)
+    validate_tool_args(kwargs.get("explode"), kwargs.get("analysis_tool"))
+
+    port = await _resolve_port(port)
+    config = {k: v for k, v in bound.arguments.items() if v is not None}
+    config["port"] = port
+    await _asend(_ui_message(config), MessageType.CONFIG, port)
+    invalidate_mirror(port)
+
+
+async def asave_screenshot(filename, port=None, polling=True, progress_only=False):
+    """Awaitable version of save_screenshot()"""
+    command, mtime = _screenshot_command(filename)
+    await asend_command(command, port=port)
+
+    if polling:
+        for delay in _screenshot_polls(command, mtime, progress_only):
+            await asyncio.sleep(delay)
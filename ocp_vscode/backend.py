@@ -16,28 +16,28 @@
 # limitations under the License.
 
 import argparse
-import base64
 from dataclasses import dataclass
 import sys
 import traceback
 import os
-
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from OCP.TopAbs import TopAbs_EDGE, TopAbs_FACE, TopAbs_VERTEX
+from OCP.TopExp import TopExp
+from OCP.TopTools import TopTools_IndexedMapOfShape
+from ocp_tessellate import trace as ocp_trace
 from ocp_tessellate.ocp_utils import (
-    deserialize,
     make_compound,
     tq_to_loc,
     identity_location,
     downcast,
 )
-
-from ocp_tessellate.tessellator import (
-    get_edges,
-    get_faces,
-    get_vertices,
-)
 from ocp_tessellate.trace import Trace
 
 from ocp_vscode.backend_logo import logo
+from ocp_vscode.brep import FORMATS, Brep, ShapeStore
 
 if os.environ.get("JUPYTER_CADQUERY") is None:
     is_jupyter_cadquery = False
@@ -57,6 +57,88 @@ class Tool:
     Properties = "PropertiesMeasurement"
 
 
+# The sub shape kinds of the ids of the viewer, e.g. "/Group/Box/faces/faces_3"
+SUB_SHAPES = {
+    "faces": TopAbs_FACE,
+    "edges": TopAbs_EDGE,
+    "vertices": TopAbs_VERTEX,
+}
+# Threads that load the parts of a model in the background
+LOADERS = min(4, os.cpu_count() or 1)
+
+SUB_SHAPE_ID = re.compile(
+    r"(?P<part>.+)/(?P<kind>faces|edges|vertices)/(?P=kind)_(?P<index>\d+)"
+)
+
+
+class Part:
+    """A part of the model.
+
+    The shapes of the part are deserialized by load(), either by the loader
+    pool of the backend or by the first measurement that needs the part. The
+    faces, edges and vertices are indexed when the pool loads the part or a
+    measurement requests one of them, and every requested sub shape is kept.
+    """
+
+    def __init__(self, breps, loc):
+        self.breps = breps
+        self.loc = loc
+        self.compound = None
+        self.shape = None
+        # kind -> TopTools_IndexedMapOfShape of the compound
+        self.maps = {}
+        # (kind, index) -> located sub shape
+        self.shapes = {}
+        self._lock = threading.RLock()
+
+    def load(self, index=False):
+        """Deserialize the shapes of the part and with index=True index all
+        its sub shapes"""
+        with self._lock:
+            if self.compound is None:
+                shapes = [brep.get() for brep in self.breps]
+                compound = make_compound(shapes) if len(shapes) > 1 else shapes[0]
+                self.shape = compound.Moved(self.loc)
+                self.compound = compound
+                self.breps = None
+            if index:
+                for kind in SUB_SHAPES:
+                    self._map(kind)
+        return self
+
+    def _map(self, kind):
+        with self._lock:
+            shapes = self.maps.get(kind)
+            if shapes is None:
+                shapes = TopTools_IndexedMapOfShape()
+                TopExp.MapShapes_s(self.load().compound, SUB_SHAPES[kind], shapes)
+                self.maps[kind] = shapes
+            return shapes
+
+    def sub_shape(self, kind, index):
+        """The located sub shape with the given index of kind faces, edges or
+        vertices, in the order of the tessellation"""
+        shape = self.shapes.get((kind, index))
+        if shape is None:
+            shapes = self._map(kind)
+            if not 0 <= index < shapes.Extent():
+                raise KeyError(f"{kind} {index} does not exist")
+            shape = downcast(shapes.FindKey(index + 1).Moved(self.loc))
+            self.shapes[(kind, index)] = shape
+        return shape
+
+    def trace(self, id_, trace):
+        """Write all sub shapes to the trace log"""
+        for kind, dump in (
+            ("faces", trace.face),
+            ("edges", trace.edge),
+            ("vertices", trace.vertex),
+        ):
+            shapes = self._map(kind)
+            for i in range(shapes.Extent()):
+                dump(f"{id_}/{kind}/{kind}_{i}", downcast(shapes.FindKey(i + 1)))
+
+
 def print_to_stdout(*msg):
     """
     Write the given message to the stdout
@@ -77,6 +159,11 @@ def error_handler(func):
     return wrapper
 
 
+@error_handler
+def _preload(part):
+    part.load(index=True)
+
+
 class ViewerBackend:
     """
     Represents the backend of the viewer, it listens to the websocket and handles the events
@@ -85,9 +172,19 @@ class ViewerBackend:
     The responses holds all the data needed to display the measurements.
     """
 
-    def __init__(self, port: int, jcv_id=None) -> None:
+    def __init__(self, port: int, jcv_id=None, workers=LOADERS) -> None:
         self.port = port
-        self.model = None
+        # leaf id -> Part, kept for delta updates
+        self.parts = {}
+        self.shapes = ShapeStore()
+        # loads the parts of a model while measurements are answered already
+        self.loader = (
+            ThreadPoolExecutor(workers, thread_name_prefix="ocp-backend-loader")
+            if workers > 0
+            else None
+        )
+        self.loading = []
+        self.scene = None
         self.activated_tool = None
         self.filter_type = "none"  # The current active selection filter
         self.jcv_id = jcv_id
@@ -109,7 +206,7 @@ class ViewerBackend:
         Dispatch the event to the appropriate handler
         """
         if event_type == MessageType.DATA:
-            self.load_model(message)
+            return self.load_model(message)
         elif event_type == MessageType.UPDATES:
             changes = message
 
@@ -144,12 +241,34 @@ class ViewerBackend:
             return self.handle_properties(shape_id)
 
     def load_model(self, raw_model):
-        """Read the transferred model from websocket"""
+        """Read the transferred model from websocket.
+
+        A delta model (with "base") only contains the changed parts, the others
+        are {"id": id, "keep": True} and taken from the previous model. If the
+        backend does not hold the base scene, the delta is rejected with
+        {"ok": False, "reason": "unknown_base"} and the client sends the model
+        again in full.
+
+        Shapes are sent with their content hash and their BREP is omitted if
+        the ShapeStore holds it already. Returns the hashes of the ShapeStore
+        and the BREP formats the backend reads, which are sent back with the
+        acknowledgement.
+
+        load_model returns before the shapes are deserialized. The loader pool
+        deserializes and indexes the parts in the order of the model, and
+        get_shape loads a part that is still waiting for the pool right away.
+        """
+        base = raw_model.get("base")
+        unknown_base = base is not None and base != self.scene
+        previous = {} if unknown_base else self.parts
 
         def walk(model, trace):
             for v in model["parts"]:
                 if v.get("parts") is not None:
                     walk(v, trace)
+                elif v.get("keep"):
+                    if v["id"] in previous:
+                        self.parts[v["id"]] = previous[v["id"]]
                 else:
                     id_ = v["id"]
                     loc = (
@@ -158,40 +277,67 @@ class ViewerBackend:
                         else tq_to_loc(*v["loc"])
                     )
                     if isinstance(v["shape"], dict):
-                        compound = deserialize(
-                            base64.b64decode(v["shape"]["obj"].encode("utf-8"))
-                        )
+                        breps = [self._brep(v["shape"]["obj"])]
                     else:
-                        shape = [
-                            deserialize(base64.b64decode(s.encode("utf-8")))
-                            for s in v["shape"]
-                        ]
-                        compound = make_compound(shape) if len(shape) > 1 else shape[0]
-                    self.model[id_] = compound.Moved(loc)
-                    faces = get_faces(compound)
-                    for i, face in enumerate(faces):
-                        trace.face(f"{id_}/faces/faces_{i}", face)
-
-                        self.model[f"{id_}/faces/faces_{i}"] = downcast(face.Moved(loc))
-                    edges = get_edges(compound)
-                    for i, edge in enumerate(edges):
-                        trace.edge(f"{id_}/edges/edges_{i}", edge)
-
-                        self.model[f"{id_}/edges/edges_{i}"] = (
-                            edge if loc is None else downcast(edge.Moved(loc))
-                        )
-                    vertices = get_vertices(compound)
-                    for i, vertex in enumerate(vertices):
-                        trace.vertex(f"{id_}/vertices/vertex_{i}", vertex)
-
-                        self.model[f"{id_}/vertices/vertices_{i}"] = (
-                            vertex if loc is None else downcast(vertex.Moved(loc))
-                        )
-
-        self.model = {}
+                        breps = [self._brep(s) for s in v["shape"]]
+                    if any(brep is None for brep in breps):
+                        missing.append(id_)
+                        continue
+                    part = self.parts[id_] = Part(breps, loc)
+                    if ocp_trace.DEBUG:
+                        part.trace(id_, trace)
+
+        self.parts = {}
+        missing = []
         trace = Trace("ocp-vscode-backend.log")
         walk(raw_model, trace)
         trace.close()
+        # a delta without its base misses the unchanged parts, the backend holds
+        # no complete scene until the client sends the model in full
+        self.scene = None if unknown_base else raw_model.get("scene")
+        self.shapes.evict()
+        self._preload()
+        if missing:
+            print_to_stdout(
+                f"Shapes of {len(missing)} parts were not sent and are unknown, "
+                "they cannot be measured until the next show"
+            )
+        result = {"shapes": self.shapes.hashes(), "formats": FORMATS}
+        if unknown_base:
+            return {"ok": False, "reason": "unknown_base", **result}
+        return result
+
+    def _brep(self, obj):
+        """The Brep of a transferred shape, a base64 BREP or a content addressed
+        {"hash": ..., "format": ..., "brep": ...} entry"""
+        if isinstance(obj, str):
+            return Brep(obj, "bin")
+        return self.shapes.get(obj)
+
+    def _preload(self):
+        """Load and index the parts in the loader pool in the order of the
+        model. Parts of the last model that were not loaded yet are dropped."""
+        for future in self.loading:
+            future.cancel()
+        if self.loader is None:
+            self.loading = []
+        else:
+            self.loading = [
+                self.loader.submit(_preload, part) for part in self.parts.values()
+            ]
+
+    def get_shape(self, shape_id):
+        """The located shape of a part or of one of its faces, edges or vertices
+        for an id of the viewer, e.g. "/Group/Box/faces/faces_3" """
+        part = self.parts.get(shape_id)
+        if part is not None:
+            return part.load().shape
+
+        match = SUB_SHAPE_ID.fullmatch(shape_id)
+        part = None if match is None else self.parts.get(match["part"])
+        if part is None:
+            raise KeyError(f"Unknown shape id '{shape_id}'")
+        return part.sub_shape(match["kind"], int(match["index"]))
 
     def handle_properties(self, shape_id):
         """
@@ -200,7 +346,7 @@ class ViewerBackend:
         if not is_jupyter_cadquery:
             print_to_stdout(f"Identifier received '{shape_id}'")
 
-        shape = self.model[shape_id]
+        shape = self.get_shape(shape_id)
 
         response = get_properties(shape)
 
@@ -221,8 +367,8 @@ class ViewerBackend:
         if not is_jupyter_cadquery:
             print_to_stdout(f"Identifiers received '{id1}', '{id2}'")
 
-        shape1 = self.model[id1]
-        shape2 = self.model[id2]
+        shape1 = self.get_shape(id1)
+        shape2 = self.get_shape(id2)
 
         response = get_distance(shape1, shape2, center)
         response["type"] = "backend_response"
@@ -0,0 +1,292 @@
+"""Content addressed transfer of the shapes of the backend model"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import base64
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+
+from OCP.TopoDS import TopoDS_Shape
+from ocp_tessellate.ocp_utils import deserialize, serialize
+
+from ocp_vscode.delta import fingerprint
+from ocp_vscode.metrics import METRICS
+
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+MAX_HASHES = 10000
+
+# The backend keeps at most this many bytes of serialized BREP
+MAX_STORE_SIZE = 256 * 1024 * 1024
+
+# The formats of transferred BREPs the backend can read: "bin" is the binary
+# BREP of BinTools, the others are compressed binary BREPs
+FORMATS = ["bin", "bin+zlib"] + (["bin+zstd"] if HAS_ZSTD else [])
+
+
+def pack(brep, fmt):
+    """Compress a binary BREP for the format fmt"""
+    if fmt == "bin+zstd":
+        return zstandard.ZstdCompressor(level=3).compress(brep)
+    if fmt == "bin+zlib":
+        return zlib.compress(brep, 1)
+    return brep
+
+
+def unpack(data, fmt):
+    """The binary BREP of data in format fmt"""
+    if fmt == "bin":
+        return data
+    if fmt == "bin+zlib":
+        return zlib.decompress(data)
+    if fmt == "bin+zstd" and HAS_ZSTD:
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Cannot read BREP format '{fmt}'")
+
+
+def _transformation(location):
+    trsf = location.Transformation()
+    return tuple(trsf.Value(i, j) for i in range(1, 4) for j in range(1, 5))
+
+
+class BrepHashes:
+    """Content hashes of the last MAX_HASHES shapes by the identity of their
+    TShape and their location, so unchanged shapes are not serialized again.
+    Every placement of a TShape has its own entry."""
+
+    def __init__(self, maxsize=MAX_HASHES):
+        self.maxsize = maxsize
+        # (TShape hash, orientation, transformation) -> (TShape, content hash)
+        self.hashes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape):
+        """The content hash of shape and its serialized BREP, the BREP is None
+        if the hash was known"""
+        tshape = shape.TShape()
+        identity = (
+            hash(tshape),
+            shape.Orientation(),
+            _transformation(shape.Location()),
+        )
+        with self._lock:
+            entry = self.hashes.get(identity)
+            if entry is not None and entry[0] == tshape:
+                self.hashes.move_to_end(identity)
+                return entry[1], None
+
+        brep = serialize(shape)
+        content_hash = hashlib.sha256(brep).hexdigest()
+        with self._lock:
+            self.hashes[identity] = (tshape, content_hash)
+            while len(self.hashes) > self.maxsize:
+                self.hashes.popitem(last=False)
+        return content_hash, brep
+
+    def clear(self):
+        with self._lock:
+            self.hashes.clear()
+
+
+HASHES = BrepHashes()
+
+
+class BackendShapes:
+    """The content hashes of the shapes and the scene the backend of every port
+    holds.
+
+    The backend reports the hashes of its ShapeStore and the BREP formats it
+    reads with the acknowledgement of a model. Shapes of the next model with
+    one of these hashes are only sent as {"hash": hash}, all others as
+    {"hash": hash, "format": format, "brep": base64 BREP}. Backends without a
+    list of formats get uncompressed binary BREPs.
+
+    Once a backend acknowledged a model, the next one is sent as delta of it:
+    parts with the same location and shapes are {"id": id, "keep": True} and
+    the model gets the acknowledged scene as "base". A backend that does not
+    hold this scene rejects the delta and the model is sent again in full.
+    """
+
+    def __init__(self):
+        # port -> content hashes
+        self.held = {}
+        # port -> BREP formats of the backend
+        self.formats = {}
+        # port -> (scene id, leaf id -> key of location and shapes)
+        self.scenes = {}
+        # port -> (scene id, keys, base) of the model waiting for its ack
+        self._sending = {}
+        self._lock = threading.Lock()
+
+    def encode(self, mapping, port, compression=None):
+        """A copy of the backend mapping with content addressed shapes and the
+        hashes of the shapes sent with their BREP. The BREPs are compressed
+        with compression ("zlib" or "zstd") if the backend reads it."""
+        with self._lock:
+            held = self.held.get(port, set())
+            fmt = f"bin+{compression}" if compression else "bin"
+            if fmt not in self.formats.get(port, ["bin"]):
+                fmt = "bin"
+            if mapping.get("scene") is None:
+                base, previous = None, {}
+            else:
+                base, previous = self.scenes.get(port, (None, {}))
+        sent = set()
+        keys = {}
+        kept = 0
+
+        def shape(content_hash, brep, obj):
+            nonlocal kept
+            if content_hash in held or content_hash in sent:
+                kept += 1
+                return {"hash": content_hash}
+            sent.add(content_hash)
+            if brep is None:
+                brep = serialize(obj)
+            return {
+                "hash": content_hash,
+                "format": fmt,
+                "brep": base64.b64encode(pack(brep, fmt)).decode("utf-8"),
+            }
+
+        def walk(node):
+            if node.get("parts") is not None:
+                return {**node, "parts": [walk(part) for part in node["parts"]]}
+            value = node["shape"]
+            objs = [value.get("obj")] if isinstance(value, dict) else value
+            hashes = {
+                i: HASHES.get(obj)
+                for i, obj in enumerate(objs)
+                if isinstance(obj, TopoDS_Shape)
+            }
+            content = [hashes[i][0] if i in hashes else None for i in range(len(objs))]
+            key = keys[node["id"]] = fingerprint((node.get("loc"), content))
+            if previous.get(node["id"]) == key:
+                return {"id": node["id"], "keep": True}
+            objs = [
+                shape(*hashes[i], obj) if i in hashes else obj
+                for i, obj in enumerate(objs)
+            ]
+            if isinstance(value, dict):
+                value = {**value, "obj": objs[0]}
+            else:
+                value = objs
+            return {**node, "shape": value}
+
+        model = walk(mapping)
+        if base is not None:
+            model["base"] = base
+        with self._lock:
+            self._sending[port] = (mapping.get("scene"), keys, base)
+        METRICS.record("brep_kept", kept)
+        return model, sent
+
+    def acknowledge(self, port, ack, sent):
+        """Store the hashes and the scene the backend reported. The viewer
+        extension answers before the backend loaded the model, so the shapes
+        just sent are added.
+
+        Returns False if the model was a delta the backend cannot apply, it
+        needs to be sent again in full."""
+        with self._lock:
+            scene, keys, base = self._sending.pop(port, (None, {}, None))
+            rejected = isinstance(ack, dict) and ack.get("reason") == "unknown_base"
+            if isinstance(ack, dict) and ack.get("shapes") is not None:
+                self.held[port] = set(ack["shapes"]) | sent
+                self.formats[port] = ack.get("formats", ["bin"])
+            else:
+                self.held.pop(port, None)
+                self.formats.pop(port, None)
+
+            if rejected or port not in self.held or scene is None:
+                self.scenes.pop(port, None)
+                return base is None
+            self.scenes[port] = (scene, keys)
+            return True
+
+
+BACKEND_SHAPES = BackendShapes()
+
+
+class Brep:
+    """A transferred shape, deserialized by the first call of get"""
+
+    def __init__(self, data, fmt):
+        # base64 encoded BREP in format fmt
+        self._data = data
+        self._fmt = fmt
+        self._shape = None
+        self._lock = threading.Lock()
+        # the size of the BREP, of the transferred BREP until deserialized
+        self.size = len(data) * 3 // 4
+
+    def loaded(self):
+        return self._shape is not None
+
+    def get(self):
+        with self._lock:
+            if self._shape is None:
+                brep = unpack(base64.b64decode(self._data.encode("utf-8")), self._fmt)
+                self._shape = deserialize(brep)
+                self.size = len(brep)
+                self._data = None
+            return self._shape
+
+
+class ShapeStore:
+    """The transferred shapes of the backend by content hash.
+
+    Shapes are kept as Brep and only deserialized when they are needed. The
+    least recently used shapes are evicted by evict() once their BREPs exceed
+    maxsize bytes, the shapes of the current model were used last.
+    """
+
+    def __init__(self, maxsize=MAX_STORE_SIZE):
+        self.maxsize = maxsize
+        # content hash -> Brep
+        self.shapes = OrderedDict()
+
+    def hashes(self):
+        return list(self.shapes)
+
+    def get(self, obj):
+        """The Brep of a transferred {"hash": ..., "format": ..., "brep": ...}
+        entry, None if only the hash was sent and the shape is unknown or if
+        the format cannot be read"""
+        content_hash = obj["hash"]
+        brep = self.shapes.get(content_hash)
+        if brep is not None:
+            self.shapes.move_to_end(content_hash)
+            return brep
+
+        data, fmt = obj.get("brep"), obj.get("format", "bin")
+        if data is None or fmt not in FORMATS:
+            return None
+        brep = self.shapes[content_hash] = Brep(data, fmt)
+        return brep
+
+    def evict(self):
+        size = sum(brep.size for brep in self.shapes.values())
+        while size > self.maxsize and self.shapes:
+            _, brep = self.shapes.popitem(last=False)
+            size -= brep.size
@@ -0,0 +1,517 @@
+"""Tessellation cache of show()"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import hashlib
+import os
+import pathlib
+import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+import ocp_tessellate.convert as oc
+from OCP.BRepBuilderAPI import BRepBuilderAPI_Copy
+from ocp_tessellate import tessellator as ocp_tessellator
+from ocp_tessellate._version import __version__ as ocp_tessellate_version
+from ocp_tessellate.ocp_utils import serialize
+from ocp_tessellate.tessellator import get_size
+from ocp_tessellate.tessellator import tessellate as _cached_tessellate
+
+from ocp_vscode.brep import HASHES
+from ocp_vscode.instancing import FINGERPRINTS
+from ocp_vscode.metrics import METRICS
+
+__all__ = [
+    "clear_tessellation_cache",
+    "disable_disk_cache",
+    "enable_disk_cache",
+    "get_tessellation_cache_stats",
+    "set_tessellation_cache_size",
+]
+
+# ocp_tessellate caches by content hash only, use the uncached function
+_tessellate = _cached_tessellate.__wrapped__
+
+
+def tessellator_mark():
+    """The progress mark ocp_tessellate prints for a tessellated shape"""
+    native = ocp_tessellator.NATIVE and ocp_tessellator.is_native_tessellator_enabled()
+    return "*" if native else "+"
+
+
+def _cache_size():
+    size = os.environ.get("OCP_CACHE_SIZE_MB")
+    return 256 * 1024 * 1024 if size is None else int(size) * 1024 * 1024
+
+
+class TessellationCache:
+    """LRU cache of tessellation results, limited by the size of the meshes.
+
+    Meshes are stored under the content hash ocp_tessellate computes for every
+    instance (cache_id) and the tessellation parameters. Tessellating a shape
+    stores the mesh in the shape and hence changes its content hash, so shapes
+    that were tessellated before are also found by the identity of their TShape.
+    Instances are relocated to the origin, so both keys are location independent.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        # (cache_id, params) -> [mesh, size, identity keys]
+        self.meshes = OrderedDict()
+        # (TShape hash, orientation, params) -> (TShape, (cache_id, params))
+        self.shapes = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _identity(shape, params):
+        tshape = shape.TShape()
+        return (hash(tshape), shape.Orientation(), params), tshape
+
+    def _find(self, identity, tshape, cache_id, params):
+        key = (cache_id, params)
+        if key not in self.meshes:
+            entry = self.shapes.get(identity)
+            if entry is not None and entry[0] == tshape:
+                key = entry[1]
+        return key
+
+    def contains(self, shape, cache_id, params):
+        """Check for the mesh of shape without counting a hit or miss"""
+        identity, tshape = self._identity(shape, params)
+        with self._lock:
+            return self._find(identity, tshape, cache_id, params) in self.meshes
+
+    def get(self, shape, cache_id, params):
+        """Get the cached mesh of shape or None"""
+        identity, tshape = self._identity(shape, params)
+        with self._lock:
+            key = self._find(identity, tshape, cache_id, params)
+            if key in self.meshes:
+                self.meshes.move_to_end(key)
+                self.meshes[key][2].add(identity)
+                self.shapes[identity] = (tshape, key)
+                self.hits += 1
+                return self.meshes[key][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, shape, cache_id, params, mesh):
+        """Add the mesh of shape and evict the least recently used meshes"""
+        identity, tshape = self._identity(shape, params)
+        size = get_size(mesh)
+        with self._lock:
+            key = (cache_id, params)
+            if key in self.meshes or size > self.maxsize:
+                return
+
+            self.meshes[key] = [mesh, size, {identity}]
+            self.shapes[identity] = (tshape, key)
+            self.size += size
+            while self.size > self.maxsize:
+                self._evict(next(iter(self.meshes)))
+
+    def _evict(self, key):
+        _, size, identities = self.meshes.pop(key)
+        for identity in identities:
+            if self.shapes.get(identity, (None, None))[1] == key:
+                del self.shapes[identity]
+        self.size -= size
+
+    def resize(self, maxsize):
+        with self._lock:
+            self.maxsize = maxsize
+            while self.size > self.maxsize:
+                self._evict(next(iter(self.meshes)))
+
+    def clear(self):
+        with self._lock:
+            self.meshes.clear()
+            self.shapes.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self.meshes),
+                "size": self.size,
+                "maxsize": self.maxsize,
+            }
+
+
+TESSELLATION_CACHE = TessellationCache(_cache_size())
+
+
+class DiskCache:
+    """Tessellation results as uncompressed .npz files in a directory, shared
+    across Python sessions.
+
+    Files are named by the sha256 hash of the serialized BREP of the relocated
+    shape and the tessellation parameters. When the files exceed maxsize, the
+    least recently used ones are deleted.
+    """
+
+    def __init__(self, path, maxsize):
+        self.path = pathlib.Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # running total of the file sizes, the directory is only scanned when it
+        # exceeds maxsize
+        self.size = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(shape, params, brep=None):
+        """Content hash of shape (independent of its location) and params,
+        brep is the serialized shape if already available"""
+        sha = hashlib.sha256(serialize(shape) if brep is None else brep)
+        sha.update(repr((shape.Orientation(), params, ocp_tessellate_version)).encode())
+        return sha.hexdigest()
+
+    def _file(self, key):
+        return self.path / f"{key}.npz"
+
+    def contains(self, key):
+        return self._file(key).exists()
+
+    def get(self, key):
+        """Load the cached mesh or None"""
+        filename = self._file(key)
+        try:
+            with np.load(filename) as npz:
+                mesh = {name: npz[name] for name in npz.files}
+            # the modification time tracks the last use for the eviction
+            os.utime(filename)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return mesh
+
+    def put(self, key, mesh):
+        """Store mesh and evict the least recently used files if the cache
+        exceeds maxsize"""
+        filename = self._file(key)
+        # write to a temporary file first, other sessions might read the cache
+        fd, tmp = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, **mesh)
+                written = f.tell()
+            try:
+                replaced = filename.stat().st_size
+            except OSError:
+                replaced = 0
+            os.replace(tmp, filename)
+        except OSError:
+            pathlib.Path(tmp).unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            if self.size is not None:
+                self.size += written - replaced
+            full = self.size is None or self.size > self.maxsize
+        if full:
+            self.evict()
+
+    def _files(self):
+        files = []
+        for filename in self.path.glob("*.npz"):
+            try:
+                stat = filename.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, filename))
+        return sorted(files)
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits maxsize,
+        other sessions may have added files since the last scan"""
+        files = self._files()
+        size = sum(f[1] for f in files)
+        for _, file_size, filename in files:
+            if size <= self.maxsize:
+                break
+            filename.unlink(missing_ok=True)
+            size -= file_size
+        with self._lock:
+            self.size = size
+
+    def clear(self):
+        for _, _, filename in self._files():
+            filename.unlink(missing_ok=True)
+        with self._lock:
+            self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        files = self._files()
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(files),
+            "size": sum(f[1] for f in files),
+            "maxsize": self.maxsize,
+            "path": str(self.path),
+        }
+
+
+DISK_CACHE = None
+
+# (cache_id, params) -> (mesh, disk cache key) tessellated by worker processes
+# for the running show
+_PREFETCHED = contextvars.ContextVar("ocp_vscode_prefetched", default=None)
+
+
+@contextmanager
+def prefetched(meshes):
+    """Let tessellate use the meshes computed in advance, see parallel.py"""
+    token = _PREFETCHED.set(meshes)
+    try:
+        yield
+    finally:
+        _PREFETCHED.reset(token)
+
+
+# mesh copies of the shapes without their triangulation, see fresh_meshes()
+_FRESH = contextvars.ContextVar("ocp_vscode_fresh_meshes", default=False)
+
+
+@contextmanager
+def fresh_meshes():
+    """Let tessellate mesh a copy of the topology of the shapes. OCCT keeps the
+    triangulation on the faces and keeps a finer one instead of meshing coarser,
+    so coarse tessellations of already shown shapes need a copy."""
+    token = _FRESH.set(True)
+    try:
+        yield
+    finally:
+        _FRESH.reset(token)
+
+
+# tessellate_group calls in this context use tessellate of this module
+_CACHED = contextvars.ContextVar("ocp_vscode_cached", default=False)
+_PATCH_LOCK = threading.Lock()
+_PATCH_USERS = 0
+_ORIGINAL = None
+
+
+def _dispatch(*args, **kwargs):
+    # ocp_tessellate.convert.tessellate while a tessellate_group of ocp_vscode runs,
+    # other callers keep the tessellate of ocp_tessellate
+    if _CACHED.get():
+        return tessellate(*args, **kwargs)
+    return _ORIGINAL(*args, **kwargs)
+
+
+def tessellate_group(*args, **kwargs):
+    """ocp_tessellate.convert.tessellate_group with the tessellation cache of
+    ocp_vscode. The module is only patched while calls of this function run."""
+    global _PATCH_USERS, _ORIGINAL  # pylint: disable=global-statement
+
+    token = _CACHED.set(True)
+    with _PATCH_LOCK:
+        if _PATCH_USERS == 0:
+            _ORIGINAL = oc.tessellate
+            oc.tessellate = _dispatch
+        _PATCH_USERS += 1
+    try:
+        return oc.tessellate_group(*args, **kwargs)
+    finally:
+        with _PATCH_LOCK:
+            _PATCH_USERS -= 1
+            if _PATCH_USERS == 0:
+                oc.tessellate = _ORIGINAL
+        _CACHED.reset(token)
+
+
+def _unmeshed(shape):
+    if isinstance(shape, (list, tuple)):
+        return [_unmeshed(s) for s in shape]
+    # shares the geometry, but not the faces holding the triangulation
+    return BRepBuilderAPI_Copy(shape, False, False).Shape()
+
+
+def tessellation_params(
+    deviation,
+    angular_tolerance,
+    compute_faces,
+    compute_edges,
+    compute_uvs,
+    normalize_uvs,
+):
+    """The parameters a mesh depends on, part of all cache keys"""
+    # quality only depends on deviation and the bounding box of the shape
+    return (
+        deviation,
+        angular_tolerance,
+        compute_faces,
+        compute_edges,
+        compute_uvs,
+        normalize_uvs,
+    )
+
+
+def tessellate(
+    shape,
+    cache_key,
+    deviation,
+    quality,
+    angular_tolerance,
+    compute_faces=True,
+    compute_edges=True,
+    debug=False,
+    progress=None,
+    shape_id="",
+    compute_uvs=False,
+    normalize_uvs=True,
+):
+    """ocp_tessellate.tessellator.tessellate using the TESSELLATION_CACHE"""
+    obj = shape[0] if isinstance(shape, (list, tuple)) else shape
+    params = tessellation_params(
+        deviation,
+        angular_tolerance,
+        compute_faces,
+        compute_edges,
+        compute_uvs,
+        normalize_uvs,
+    )
+
+    mesh = TESSELLATION_CACHE.get(obj, cache_key, params)
+    if mesh is not None:
+        METRICS.record("cache_hits")
+        if progress is not None:
+            progress.update("c")
+        return mesh
+
+    disk_cache = DISK_CACHE
+    meshes = _PREFETCHED.get()
+    if meshes is not None and (cache_key, params) in meshes:
+        mesh, disk_key = meshes.pop((cache_key, params))
+        METRICS.record("cache_misses")
+        if progress is not None:
+            progress.update(tessellator_mark())
+        TESSELLATION_CACHE.put(obj, cache_key, params, mesh)
+        if disk_cache is not None and disk_key is not None:
+            disk_cache.put(disk_key, mesh)
+        return mesh
+
+    if disk_cache is not None:
+        # hash before tessellating, tessellation adds the mesh to the shape
+        disk_key = disk_cache.key(obj, params)
+        mesh = disk_cache.get(disk_key)
+        if mesh is not None:
+            METRICS.record("disk_cache_hits")
+            if progress is not None:
+                progress.update("c")
+            TESSELLATION_CACHE.put(obj, cache_key, params, mesh)
+            return mesh
+
+    METRICS.record("cache_misses")
+    mesh = _tessellate(
+        _unmeshed(shape) if _FRESH.get() else shape,
+        cache_key,
+        deviation,
+        quality,
+        angular_tolerance,
+        compute_faces=compute_faces,
+        compute_edges=compute_edges,
+        debug=debug,
+        progress=progress,
+        shape_id=shape_id,
+        compute_uvs=compute_uvs,
+        normalize_uvs=normalize_uvs,
+    )
+    TESSELLATION_CACHE.put(obj, cache_key, params, mesh)
+    if disk_cache is not None:
+        disk_cache.put(disk_key, mesh)
+    return mesh
+
+
+def get_tessellation_cache_stats():
+    """Get hits, misses, entries, size (bytes) and maxsize (bytes) of the
+    tessellation cache, and of the disk cache under the key "disk" if enabled"""
+    stats = TESSELLATION_CACHE.stats()
+    if DISK_CACHE is not None:
+        stats["disk"] = DISK_CACHE.stats()
+    return stats
+
+
+def clear_tessellation_cache(disk=False):
+    """Remove all meshes from the tessellation cache and reset its statistics.
+    The geometric fingerprints and content hashes of the shapes are removed, too.
+
+    Parameters:
+        disk: Also delete all files of the disk cache (default=False)
+    """
+    TESSELLATION_CACHE.clear()
+    FINGERPRINTS.clear()
+    HASHES.clear()
+    if disk and DISK_CACHE is not None:
+        DISK_CACHE.clear()
+
+
+def enable_disk_cache(path=None, size_mb=1024):
+    """Keep tessellation results on disk to reuse them in later Python sessions.
+
+    Parameters:
+        path:    The cache directory (default="~/.cache/ocp_vscode")
+        size_mb: Maximum size of the cache files in MB (default=1024)
+    """
+    global DISK_CACHE  # pylint: disable=global-statement
+
+    if path is None:
+        path = pathlib.Path.home() / ".cache" / "ocp_vscode"
+    DISK_CACHE = DiskCache(pathlib.Path(path).expanduser(), int(size_mb * 1024 * 1024))
+    DISK_CACHE.evict()
+
+
+def disable_disk_cache():
+    """Stop using the disk cache, its files are kept"""
+    global DISK_CACHE  # pylint: disable=global-statement
+
+    DISK_CACHE = None
+
+
+if os.environ.get("OCP_DISK_CACHE_DIR"):
+    enable_disk_cache(
+        os.environ["OCP_DISK_CACHE_DIR"],
+        int(os.environ.get("OCP_DISK_CACHE_SIZE_MB", "1024")),
+    )
+
+
+def set_tessellation_cache_size(size_mb):
+    """Set the maximum size of the tessellation cache.
+
+    Parameters:
+        size_mb: Maximum size of the cached meshes in MB, 0 to switch the cache
+                 off (default=256, or the environment variable OCP_CACHE_SIZE_MB)
+    """
+    TESSELLATION_CACHE.resize(int(size_mb * 1024 * 1024))
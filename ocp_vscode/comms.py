@@ -15,26 +15,43 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import atexit
 import base64
+import copy
 import enum
 import json
 import os
 import socket
+import struct
+import threading
 import traceback
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
 import questionary
 
-from websockets.sync.client import connect
-from websockets.exceptions import WebSocketException
+from websockets.sync.client import connect, unix_connect
+from websockets.exceptions import ConnectionClosed, WebSocketException
+from websockets.protocol import State
 
 import orjson
-from ocp_tessellate.utils import Timer
 from ocp_tessellate.ocp_utils import (
     is_topods_shape,
     is_toploc_location,
     serialize,
     loc_to_tq,
 )
-from .state import get_ports, update_state, get_config_file
+from .state import (
+    get_cached_port,
+    get_config_file,
+    get_ports,
+    set_cached_port,
+    shared_memory_prefix,
+    update_state,
+)
+from .metrics import METRICS, Timer
 from .utils import comms_warning
 
 from IPython import get_ipython
@@ -47,11 +64,56 @@ try:
 except Exception:
     JCONSOLE = False
 
+try:
+    import zstandard
+
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
 CMD_URL = "ws://127.0.0.1"
 CMD_PORT = 3939
 
 INIT_DONE = False
 
+COMMS_DEFAULTS = {
+    # send numpy buffers of DATA messages as raw binary frames
+    "binary": False,
+    # codec for DATA and BACKEND messages: None, "zlib" or "zstd"
+    "compression": None,
+    # only compress messages of at least this size (bytes)
+    "compression_threshold": 1024 * 1024,
+    # hand large DATA and BACKEND messages to a local standalone viewer via
+    # shared memory
+    "shared_memory": False,
+    # only use shared memory for messages of at least this size (bytes)
+    "shared_memory_threshold": 16 * 1024 * 1024,
+    # split DATA, BACKEND and BACKEND_RESPONSE messages into fragments of at
+    # most this size (bytes), 0 to always send messages as a whole
+    "chunk_size": 16 * 1024 * 1024,
+    # only send the parts of a scene that changed since the last show
+    "delta": True,
+    # keep a local copy of the workspace config and status that the viewer
+    # keeps up to date, instead of asking for them before every show
+    "mirror": True,
+    # only send the backend model when a measurement tool is active
+    "lazy_backend": False,
+    # codec for the BREPs of the backend model: None, "zlib" or "zstd"
+    "brep_compression": "zlib",
+}
+
+# seconds to wait for the first config and status of a subscription
+MIRROR_TIMEOUT = 2
+
+COMPRESSION_CODECS = ("zlib", "zstd")
+
+# port -> codecs the viewer reported with its config, viewers that do not
+# report them only decode zlib
+VIEWER_CODECS = {}
+
+# buffers smaller than this are coalesced into one frame
+BINARY_COALESCE_SIZE = 64 * 1024
+
 
 #
 # Send data to the viewer
@@ -76,6 +138,8 @@ __all__ = [
     "send_response",
     "set_port",
     "get_port",
+    "set_comms_default",
+    "get_comms_default",
     "listener",
     "is_pytest",
 ]
@@ -85,16 +149,45 @@ def is_pytest():
     return os.environ.get("OCP_VSCODE_PYTEST") == "1"
 
 
+def unix_socket_path(port):
+    """Return the socket path if port denotes a unix domain socket, else None.
+
+    Accepted are "unix:///path/to/socket", "unix:/path/to/socket" and paths.
+    """
+    if isinstance(port, (str, os.PathLike)):
+        port = os.fspath(port)
+        if port.startswith("unix://"):
+            return port[7:]
+        elif port.startswith("unix:"):
+            return port[5:]
+        elif os.sep in port:
+            return port
+    return None
+
+
 def port_check(port):
-    """Check whether the port is listening"""
-    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    """Check whether the port (or unix domain socket) is listening"""
+    path = unix_socket_path(port)
+    if path is None:
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        address = (get_host(), port)
+    else:
+        s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        address = path
     s.settimeout(1)
-    result = s.connect_ex((get_host(), port)) == 0
-    if result:
-        s.close()
+    result = s.connect_ex(address) == 0
+    s.close()
     return result
 
 
+def ws_connect(port, host=None, **kwargs):
+    """Open a websocket to the viewer on a TCP port or a unix domain socket"""
+    path = unix_socket_path(port)
+    if path is not None:
+        return unix_connect(path, "ws://localhost/", **kwargs)
+    return connect(f"ws://{get_host() if host is None else host}:{port}", **kwargs)
+
+
 def default(obj):
     """Default JSON serializer."""
     if is_topods_shape(obj):
@@ -107,6 +200,275 @@ def default(obj):
         raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
 
+def set_comms_default(key, value):
+    """Set a transport default, e.g. set_comms_default("binary", True)"""
+    if key not in COMMS_DEFAULTS:
+        raise KeyError(f"'{key}' is an unknown transport setting")
+
+    if key in ("compression", "brep_compression"):
+        if value in (False, "none"):
+            value = None
+        if value is not None and value not in COMPRESSION_CODECS:
+            raise ValueError(
+                f"Unknown compression '{value}', use one of {COMPRESSION_CODECS}"
+            )
+        if value == "zstd" and not HAS_ZSTD:
+            raise ValueError("Compression 'zstd' needs the package 'zstandard'")
+        if key == "compression" and value != COMMS_DEFAULTS["compression"]:
+            # websocket compression is only negotiated without own compression
+            CONNECTIONS.close()
+
+    COMMS_DEFAULTS[key] = value
+
+
+def get_comms_default(key):
+    """Get a transport default"""
+    return COMMS_DEFAULTS.get(key)
+
+
+def encode_binary(message_type, data):
+    """Encode data as binary message without base64 encoding numpy arrays.
+
+    Layout:
+        b"X:" | header length (uint32, little endian) | JSON header | buffers
+
+    The JSON header is {"type": <message type>, "buffers": [[offset, size], ...],
+    "message": <data>} where every numpy array in data is replaced by
+    {"shape", "dtype", "buffer": <index into buffers>, "codec": "raw"}.
+    The header is padded with blanks so that the buffers start 8 byte aligned.
+    Offsets are relative to the start of the buffers and 8 byte aligned, too, so
+    that the viewer can create typed arrays directly on the received buffer.
+
+    Returns a list of byte chunks, large numpy buffers are not copied.
+    """
+    arrays = []
+
+    def walk(obj):
+        if isinstance(obj, np.ndarray):
+            if not obj.flags["C_CONTIGUOUS"]:
+                obj = np.ascontiguousarray(obj)
+            obj = obj.ravel()
+            arrays.append(memoryview(obj).cast("B"))
+            return {
+                "shape": obj.shape,
+                "dtype": str(obj.dtype),
+                "buffer": len(arrays) - 1,
+                "codec": "raw",
+            }
+        elif isinstance(obj, (tuple, list)):
+            return [walk(el) for el in obj]
+        elif isinstance(obj, dict):
+            return {k: walk(v) for k, v in obj.items()}
+        else:
+            return obj
+
+    message = walk(data)
+
+    def padding(size):
+        return (8 - size % 8) % 8
+
+    offsets = []
+    offset = 0
+    for buf in arrays:
+        offsets.append((offset, buf.nbytes))
+        offset += buf.nbytes + padding(buf.nbytes)
+
+    header = {"type": message_type, "buffers": offsets, "message": message}
+    header = orjson.dumps(header, default=default)  # pylint: disable=no-member
+    header += b" " * padding(6 + len(header))
+
+    chunks = []
+    pending = bytearray(b"X:" + struct.pack("<I", len(header)) + header)
+    for buf in arrays:
+        if buf.nbytes >= BINARY_COALESCE_SIZE:
+            chunks.append(bytes(pending))
+            chunks.append(buf)
+            pending = bytearray(padding(buf.nbytes))
+        else:
+            pending += buf
+            pending += bytes(padding(buf.nbytes))
+    if pending:
+        chunks.append(bytes(pending))
+
+    return chunks
+
+
+def compress(message, codec):
+    """Compress a message (bytes or list of byte chunks).
+
+    Layout:
+        b"Z:" | codec | b":" | compressed message (including its own prefix)
+
+    Returns a list of byte chunks.
+    """
+    if codec == "zstd":
+        compressor = zstandard.ZstdCompressor(level=3).compressobj()
+    else:
+        compressor = zlib.compressobj(level=1)
+
+    chunks = [b"Z:" + codec.encode() + b":"]
+    for chunk in message if isinstance(message, list) else [message]:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            chunks.append(compressed)
+    chunks.append(compressor.flush())
+
+    return chunks
+
+
+def decompress(message):
+    """Decompress a message created by compress()"""
+    separator = message.index(b":", 2)
+    codec = message[2:separator].decode()
+    if codec == "zstd":
+        if not HAS_ZSTD:
+            raise ValueError("Compression 'zstd' needs the package 'zstandard'")
+        return (
+            zstandard.ZstdDecompressor()
+            .decompressobj()
+            .decompress(message[separator + 1 :])
+        )
+    elif codec == "zlib":
+        return zlib.decompress(message[separator + 1 :])
+    else:
+        raise ValueError(f"Unknown compression '{codec}'")
+
+
+def to_shared_memory(message, size, port):
+    """Copy the message into a new shared memory segment and return the handle
+    message "M:{name, size, type}". The viewer unlinks the segment after reading it.
+    """
+    chunks = message if isinstance(message, list) else [message]
+    # the viewer only reads segments with the prefix of its port or socket path
+    name = (
+        f"{shared_memory_prefix(unix_socket_path(port) or port)}{uuid.uuid4().hex[:16]}"
+    )
+    shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+    try:
+        offset = 0
+        for chunk in chunks:
+            shm.buf[offset : offset + len(chunk)] = chunk
+            offset += len(chunk)
+    except Exception:
+        shm.close()
+        shm.unlink()
+        raise
+
+    # the segment must survive this process, the viewer owns it now
+    resource_tracker.unregister(shm._name, "shared_memory")  # pylint: disable=protected-access
+    shm.close()
+    handle = {"name": name, "size": size, "type": bytes(chunks[0][:1]).decode()}
+    return b"M:" + orjson.dumps(handle)  # pylint: disable=no-member
+
+
+def from_shared_memory(handle, prefixes):
+    """Read the message of a parsed handle {name, size, type} and unlink the
+    segment. Only segments whose name starts with one of prefixes are opened, the
+    viewer must not read or unlink segments of other applications.
+    """
+    name, size = handle.get("name"), handle.get("size")
+    if not isinstance(name, str) or "/" in name or not name.startswith(tuple(prefixes)):
+        raise ValueError(f"'{name}' is not a shared memory segment of this viewer")
+
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        if not isinstance(size, int) or not 0 <= size <= shm.size:
+            raise ValueError(f"Invalid size {size} of segment '{name}' ({shm.size})")
+        return bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+class Fragments:
+    """A message (bytes or list of byte chunks) of size bytes, split into
+    websocket messages with at most chunk_size payload bytes each.
+
+    Layout of every fragment:
+        b"F:" | type | b":" | id | b":" | seq | b":" | count | b":" | payload
+
+    type is the first letter of the message (e.g. D, X, B or Z) and the payloads
+    of all count fragments of a message id, joined in seq order, are the message.
+    Fragments are created lazily, so a Fragments object can be sent again.
+    """
+
+    def __init__(self, message, size, chunk_size):
+        self.message = message if isinstance(message, list) else [message]
+        self.chunk_size = chunk_size
+        self.count = -(-size // chunk_size)
+        self.id = uuid.uuid4().hex
+        self.type = bytes(self.message[0][:1]).decode()
+
+    def _header(self, seq):
+        return f"F:{self.type}:{self.id}:{seq}:{self.count}:".encode()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        seq = 0
+        fragment = bytearray(self._header(seq))
+        payload = 0
+        for chunk in self.message:
+            view = memoryview(chunk).cast("B")
+            while len(view) > 0:
+                part = view[: self.chunk_size - payload]
+                fragment += part
+                payload += len(part)
+                view = view[len(part) :]
+                if payload == self.chunk_size:
+                    yield fragment
+                    seq += 1
+                    fragment = bytearray(self._header(seq))
+                    payload = 0
+        if payload > 0:
+            yield fragment
+
+
+def parse_fragment(fragment):
+    """Split a fragment into type, id, seq, count and the offset of its payload"""
+    fields = []
+    start = 2
+    for _ in range(4):
+        end = fragment.index(b":", start)
+        fields.append(bytes(fragment[start:end]).decode())
+        start = end + 1
+    typ, message_id, seq, count = fields
+    return typ, message_id, int(seq), int(count), start
+
+
+class Defragmenter:
+    """Reassemble the messages of one connection sent as Fragments"""
+
+    def __init__(self):
+        self.messages = {}
+
+    def add(self, fragment):
+        """Add a fragment, returns the message (bytearray) when it is complete,
+        else None"""
+        _, message_id, seq, count, start = parse_fragment(fragment)
+        if seq == 0:
+            self.messages[message_id] = bytearray()
+        elif message_id not in self.messages:
+            raise ValueError(f"Fragment {seq} of unknown message {message_id}")
+
+        message = self.messages[message_id]
+        message += memoryview(fragment)[start:]
+        if seq + 1 < count:
+            return None
+
+        return self.messages.pop(message_id)
+
+
+def is_local(port):
+    """Whether the viewer on port runs on this host"""
+    return unix_socket_path(port) is not None or get_host() in (
+        "127.0.0.1",
+        "localhost",
+        "::1",
+    )
+
+
 def get_port():
     """Get the port"""
     if is_pytest():
@@ -124,24 +486,272 @@ def get_host():
 
 
 def set_port(port, host="127.0.0.1"):
-    """Set the port"""
+    """Set the port, or the path of a unix domain socket the standalone viewer
+    listens on (see --unix_socket)"""
     global CMD_PORT, CMD_URL, INIT_DONE  # pylint: disable=global-statement
     CMD_PORT = port
     CMD_URL = f"ws://{host}"
     INIT_DONE = True
 
 
-def _send(data, message_type, port=None, timeit=False):
-    """Send data to the viewer"""
-    global WS
+class ConnectionManager:
+    """Keep one long-lived websocket connection per (host, port)
+
+    A single show() sends several messages (config, status, data, backend), so
+    connecting once and reusing the socket avoids a handshake per message.
+    Connections that were closed by the viewer are transparently reopened.
+    """
+
+    def __init__(self):
+        self._connections = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _get_lock(self, key):
+        with self._lock:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def _get_connection(self, key, timeit=False, name=""):
+        ws = self._connections.get(key)
+        if ws is not None and ws.protocol.state is not State.OPEN:
+            self._drop(key)
+            ws = None
+
+        if ws is None:
+            with Timer(timeit, "", f"websocket connect ({name})", 1, metric="connect"):
+                host, port = key
+                ws = ws_connect(
+                    port,
+                    host,
+                    close_timeout=0.05,
+                    # avoid compressing twice
+                    compression=(
+                        None if COMMS_DEFAULTS["compression"] is not None else "deflate"
+                    ),
+                )
+            self._connections[key] = ws
 
-    if port is None:
-        if not INIT_DONE:
-            find_and_set_port()
-            set_connection_file()
-        port = CMD_PORT
-    try:
-        with Timer(timeit, "", "json dumps", 1):
+        return ws
+
+    def _drop(self, key):
+        ws = self._connections.pop(key, None)
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+    def send(self, host, port, message, receive=False, timeit=False, name=""):
+        """Send a message and optionally wait for the response.
+
+        If sending over a reused connection fails, the connection is reopened and
+        the message is sent once more.
+        """
+        key = (host, port)
+        with self._get_lock(key):
+            for attempt in range(2):
+                reused = key in self._connections
+                ws = self._get_connection(key, timeit, name)
+                try:
+                    if isinstance(message, Fragments):
+                        for fragment in message:
+                            ws.send(fragment)
+                    else:
+                        ws.send(message)
+                except ConnectionClosed:
+                    self._drop(key)
+                    if reused and attempt == 0:
+                        continue
+                    raise
+
+                if not receive:
+                    return None
+
+                try:
+                    return ws.recv()
+                except ConnectionClosed:
+                    self._drop(key)
+                    raise
+
+    def close(self, host=None, port=None):
+        """Close the connection to (host, port) or all connections"""
+        with self._lock:
+            keys = (
+                list(self._connections.keys())
+                if host is None and port is None
+                else [(host, port)]
+            )
+        for key in keys:
+            with self._get_lock(key):
+                self._drop(key)
+
+
+CONNECTIONS = ConnectionManager()
+atexit.register(CONNECTIONS.close)
+
+
+class ViewerMirror:
+    """Local copy of the workspace config and status of the viewer on one port.
+
+    A background thread subscribes to the viewer, which sends the config and
+    status right away and pushes every change of them afterwards. Until the
+    first push arrived, after the connection was lost and after invalidate(),
+    get() returns None and the caller asks the viewer as before.
+    """
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.values = {}
+        self.stale = set()
+        self.alive = True
+        # False for viewers that do not support subscriptions
+        self.supported = True
+        # name -> callback(status), called for every pushed status and with
+        # None when the subscription ended
+        self.listeners = {}
+        self._ws = None
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            self._ws = ws_connect(self.port, self.host, close_timeout=0.05)
+            self._ws.send(b'C:"subscribe"')
+            try:
+                self._apply(orjson.loads(self._ws.recv(timeout=MIRROR_TIMEOUT)))
+            except TimeoutError:
+                self.supported = False
+                return
+            while True:
+                self._apply(orjson.loads(self._ws.recv()))
+        except Exception:  # pylint: disable=broad-except
+            pass
+        finally:
+            self.alive = False
+            self.close()
+            self._notify(None)
+
+    def _apply(self, message):
+        with self._lock:
+            if "config" in message:
+                self.values["config"] = message["config"]
+            if "status" in message:
+                self.values["status"] = message["status"]
+            if "splash" in message and "config" in self.values:
+                self.values["config"]["_splash"] = message["splash"]
+        if "status" in message:
+            self._notify(message["status"])
+
+    def _notify(self, status):
+        for callback in list(self.listeners.values()):
+            try:
+                callback(status)
+            except Exception:  # pylint: disable=broad-except
+                traceback.print_exc()
+
+    def active_tool(self):
+        """The measurement tool active in the viewer, None if there is none or
+        the status is unknown"""
+        with self._lock:
+            tool = self.values.get("status", {}).get("activeTool")
+        return None if tool == "None" else tool
+
+    def get(self, command):
+        """A copy of the "config" or "status", None if unknown or stale"""
+        with self._lock:
+            if not self.alive or command in self.stale or command not in self.values:
+                return None
+            return copy.deepcopy(self.values[command])
+
+    def refresh(self, command, value):
+        """Store the response of a "config" or "status" command"""
+        with self._lock:
+            self.values[command] = copy.deepcopy(value)
+            self.stale.discard(command)
+
+    def shown(self):
+        """The viewer leaves the splash screen with the first model"""
+        with self._lock:
+            if "config" in self.values:
+                self.values["config"]["_splash"] = False
+
+    def invalidate(self):
+        """The next get() asks the viewer, e.g. after sending a new config"""
+        with self._lock:
+            self.stale = {"config", "status"}
+
+    def close(self):
+        ws = self._ws
+        if ws is not None:
+            try:
+                ws.close()
+            except Exception:  # pylint: disable=broad-except
+                pass
+
+
+class MirrorManager:
+    """One ViewerMirror per (host, port), restarted when the connection is lost"""
+
+    def __init__(self):
+        self._mirrors = {}
+        self._lock = threading.Lock()
+
+    def get_mirror(self, host, port):
+        with self._lock:
+            mirror = self._mirrors.get((host, port))
+            if mirror is None or (mirror.supported and not mirror.alive):
+                mirror = self._mirrors[(host, port)] = ViewerMirror(host, port)
+            return mirror
+
+    def get(self, command, port):
+        mirror = self.get_mirror(get_host(), port)
+        return mirror.get(command) if mirror.supported else None
+
+    def listen(self, port, name, callback):
+        """Call callback(status) for every status the viewer on port pushes,
+        returns the mirror"""
+        mirror = self.get_mirror(get_host(), port)
+        mirror.listeners[name] = callback
+        return mirror
+
+    def refresh(self, command, port, value):
+        mirror = self._mirrors.get((get_host(), port))
+        if mirror is not None:
+            mirror.refresh(command, value)
+
+    def shown(self, port):
+        mirror = self._mirrors.get((get_host(), port))
+        if mirror is not None:
+            mirror.shown()
+
+    def invalidate(self, port=None):
+        with self._lock:
+            for (_, mirror_port), mirror in self._mirrors.items():
+                if port is None or mirror_port == port:
+                    mirror.invalidate()
+
+    def close(self):
+        with self._lock:
+            for mirror in self._mirrors.values():
+                mirror.close()
+            self._mirrors = {}
+
+
+MIRRORS = MirrorManager()
+atexit.register(MIRRORS.close)
+
+
+def _encode(data, message_type, timeit=False, port=None):
+    """Serialize (and optionally compress or share) a message, returns it with
+    its size"""
+    with Timer(timeit, "", "json dumps", 1, metric="json_dumps"):
+        if message_type == MessageType.DATA and COMMS_DEFAULTS["binary"]:
+            j = encode_binary("D", data)
+        else:
             j = orjson.dumps(data, default=default)  # pylint: disable=no-member
             if message_type == MessageType.COMMAND:
                 j = b"C:" + j
@@ -156,62 +766,131 @@ def _send(data, message_type, port=None, timeit=False):
             elif message_type == MessageType.CONFIG:
                 j = b"S:" + j
 
-        with Timer(timeit, "", f"websocket connect ({message_type.name})", 1):
+    size = sum(len(c) for c in j) if isinstance(j, list) else len(j)
+    if (
+        COMMS_DEFAULTS["shared_memory"]
+        and message_type in (MessageType.DATA, MessageType.BACKEND)
+        and size >= COMMS_DEFAULTS["shared_memory_threshold"]
+        and is_local(port)
+    ):
+        with Timer(timeit, "", "shared memory", 1, metric="shared_memory") as t:
+            t.info = f"{size / 1024 / 1024:.3f} MB"
+            return to_shared_memory(j, size, port), size
+
+    codec = COMMS_DEFAULTS["compression"]
+    if codec == "zstd" and "zstd" not in VIEWER_CODECS.get(port, ()):
+        # e.g. the VS Code extension on a Node.js without zstd
+        codec = "zlib"
+    if (
+        codec is not None
+        and message_type in (MessageType.DATA, MessageType.BACKEND)
+        and size >= COMMS_DEFAULTS["compression_threshold"]
+    ):
+        with Timer(timeit, "", f"compress ({codec})", 1, metric="compress") as t:
+            j = compress(j, codec)
+            compressed_size = sum(len(c) for c in j)
+            t.info = (
+                f"{size / 1024 / 1024:.3f} MB -> {compressed_size / 1024 / 1024:.3f} MB"
+            )
+            size = compressed_size
+
+    chunk_size = COMMS_DEFAULTS["chunk_size"]
+    if (
+        chunk_size
+        and message_type
+        in (MessageType.DATA, MessageType.BACKEND, MessageType.BACKEND_RESPONSE)
+        and size > chunk_size
+    ):
+        j = Fragments(j, size, chunk_size)
+
+    return j, size
+
+
+def _expects_response(data, message_type):
+    """Whether the viewer answers this message"""
+    no_response_commands = ("screenshot", "set_relative_time")
+    if message_type == MessageType.COMMAND:
+        return not (isinstance(data, dict) and data.get("type") in no_response_commands)
+    return message_type == MessageType.BACKEND
+
+
+def _decode_response(response, message_type, receive):
+    """Convert the viewer response into the result of _send"""
+    result = None
+    if message_type == MessageType.COMMAND:
+        if receive:
             try:
-                with connect(f"{CMD_URL}:{port}", close_timeout=0.05) as ws:
-                    ws.send(j)
-
-                    with Timer(
-                        timeit, "", f"websocket send {len(j) / 1024 / 1024:.3f} MB", 1
-                    ):
-                        result = None
-                        no_response_commands = ("screenshot", "set_relative_time")
-                        if message_type == MessageType.COMMAND and not (
-                            isinstance(data, dict)
-                            and data.get("type") in no_response_commands
-                        ):
-                            try:
-                                result = json.loads(ws.recv())
-                            except Exception as ex:  # pylint: disable=broad-except
-                                print(ex)
-                        elif message_type == MessageType.COMMAND and (
-                            isinstance(data, dict)
-                            and data.get("type") in no_response_commands
-                        ):
-                            result = {}
-                        elif message_type == MessageType.BACKEND:
-                            ack = json.loads(ws.recv())
-                            if not ack.get("ok"):
-                                print(
-                                    "Warning: OCP CAD Viewer backend is not connected "
-                                    "— measurements/properties unavailable",
-                                    flush=True,
-                                )
-
-            except (ConnectionRefusedError, OSError, WebSocketException) as ex:
-                comms_warning(f"Connection error: {ex}\nMessage: {data}")
-                # set some dummy values to avoid errors
-                from ocp_vscode.config import Collapse  # late import to break cycle
-
-                return {
-                    "collapse": Collapse.ROOT,
-                    "_splash": False,
-                    "default_facecolor": (1, 234, 56),
-                    "default_thickedgecolor": (123, 45, 6),
-                    "default_vertexcolor": (123, 45, 6),
-                }
-            except Exception as ex:
-                comms_warning(f"Unexpected error: {ex}\n{traceback.format_exc()}")
-                # set some dummy values to avoid errors
-                from ocp_vscode.config import Collapse  # late import to break cycle
-
-                return {
-                    "collapse": Collapse.ROOT,
-                    "_splash": False,
-                    "default_facecolor": (1, 234, 56),
-                    "default_thickedgecolor": (123, 45, 6),
-                    "default_vertexcolor": (123, 45, 6),
-                }
+                result = json.loads(response)
+            except Exception as ex:  # pylint: disable=broad-except
+                print(ex)
+        else:
+            result = {}
+    elif message_type == MessageType.BACKEND:
+        result = json.loads(response)
+        if not result.get("ok") and result.get("reason") != "unknown_base":
+            print(
+                "Warning: OCP CAD Viewer backend is not connected "
+                "— measurements/properties unavailable",
+                flush=True,
+            )
+    return result
+
+
+def _error_config():
+    """Some dummy config values to avoid errors when the viewer is not reachable"""
+    from ocp_vscode.config import Collapse  # late import to break cycle
+
+    return {
+        "collapse": Collapse.ROOT,
+        "_splash": False,
+        "default_facecolor": (1, 234, 56),
+        "default_thickedgecolor": (123, 45, 6),
+        "default_vertexcolor": (123, 45, 6),
+    }
+
+
+def _send(data, message_type, port=None, timeit=False):
+    """Send data to the viewer"""
+
+    if port is None:
+        if not INIT_DONE:
+            find_and_set_port()
+            set_connection_file()
+        port = CMD_PORT
+    try:
+        j, size = _encode(data, message_type, timeit, port)
+        receive = _expects_response(data, message_type)
+        METRICS.record("bytes", size)
+        METRICS.record("messages")
+
+        try:
+            with Timer(
+                timeit,
+                "",
+                f"websocket send {size / 1024 / 1024:.3f} MB",
+                1,
+                metric="send",
+            ):
+                response = CONNECTIONS.send(
+                    get_host(),
+                    port,
+                    j,
+                    receive=receive,
+                    timeit=timeit,
+                    name=message_type.name,
+                )
+            if receive:
+                METRICS.record("round_trips")
+
+            result = _decode_response(response, message_type, receive)
+
+        except (ConnectionRefusedError, OSError, WebSocketException) as ex:
+            comms_warning(f"Connection error: {ex}\nMessage: {data}")
+            return _error_config()
+
+        except Exception as ex:
+            comms_warning(f"Unexpected error: {ex}\n{traceback.format_exc()}")
+            return _error_config()
 
         return result
 
@@ -225,7 +904,9 @@ def _send(data, message_type, port=None, timeit=False):
 
 def send_data(data, port=None, timeit=False):
     """Send data to the viewer"""
-    return _send(data, MessageType.DATA, port, timeit)
+    result = _send(data, MessageType.DATA, port, timeit)
+    MIRRORS.shown(CMD_PORT if port is None else port)
+    return result
 
 
 def send_config(config, port=None, title=None, timeit=False):
@@ -234,16 +915,38 @@ def send_config(config, port=None, title=None, timeit=False):
 
 
 def send_command(data, port=None, title=None, timeit=False):
-    """Send command to the viewer"""
+    """Send command to the viewer, "config" and "status" are answered from the
+    local mirror if possible"""
+    mirrored = data in ("config", "status") and COMMS_DEFAULTS["mirror"]
+    if mirrored:
+        if port is None:
+            port = get_port()
+        result = MIRRORS.get(data, port)
+        if result is not None:
+            return _viewer_config(data, port, result)
+
     result = _send(data, MessageType.COMMAND, port, timeit)
     if result.get("command") == "status":
-        return result["text"]
-    else:
-        return result
+        result = result["text"]
+    if mirrored and isinstance(result, dict):
+        MIRRORS.refresh(data, port, result)
+    return _viewer_config(data, CMD_PORT if port is None else port, result)
+
+
+def _viewer_config(command, port, result):
+    """Keep the codecs of a "config" response in VIEWER_CODECS"""
+    if command == "config" and isinstance(result, dict):
+        VIEWER_CODECS[port] = result.pop("_codecs", ["zlib"])
+    return result
+
+
+def invalidate_mirror(port=None):
+    """Ask the viewer for config and status again, e.g. after changing them"""
+    MIRRORS.invalidate(port)
 
 
 def send_backend(data, port=None, timeit=False):
-    """Send data to the viewer"""
+    """Send data to the viewer, returns the acknowledgement"""
     return _send(data, MessageType.BACKEND, port, timeit)
 
 
@@ -266,7 +969,8 @@ def listener(callback):
 
     def _listen():
         last_config = {}
-        with connect(f"{CMD_URL}:{CMD_PORT}", max_size=2**28) as websocket:
+        fragments = Defragmenter()
+        with ws_connect(CMD_PORT, max_size=2**28) as websocket:
             websocket.send(b"L:Python listener")
             while True:
                 try:
@@ -274,9 +978,19 @@ def listener(callback):
                     if message is None:
                         continue
 
+                    if isinstance(message, bytes) and message[:2] == b"F:":
+                        # large backend message, forwarded fragment by fragment
+                        message = fragments.add(message)
+                        if message is None:
+                            continue
+                        message = message[2:]
+
                     message = json.loads(message)
                     if "model" in message.keys():
-                        callback(message["model"], MessageType.DATA)
+                        result = callback(message["model"], MessageType.DATA)
+                        if isinstance(result, dict):
+                            # the shapes the backend holds, see brep.BackendShapes
+                            websocket.send(b"H:" + orjson.dumps(result))
 
                     if message.get("command") == "status":
                         changes = message["text"]
@@ -302,13 +1016,20 @@ def find_and_set_port():
     """Set the port and connection file"""
 
     def find_port():
-        port = None
+        port = get_cached_port()
+        if port is not None and port_check(int(port)):
+            return int(port)
+
         ports = get_ports()
+        if len(ports) == 0:
+            return None
+
+        # probe all ports at once, each probe can take up to the socket timeout
+        with ThreadPoolExecutor(max_workers=len(ports)) as executor:
+            checks = list(executor.map(lambda p: port_check(int(p)), ports))
 
-        valid_ports = []
-        for p in ports:
-            if port_check(int(p)):
-                valid_ports.append(p)
+        # a busy viewer can miss a probe, its entry stays for the next search
+        valid_ports = [p for p, ok in zip(ports, checks) if ok]
 
         if len(valid_ports) == 0:
             return None
@@ -328,17 +1049,22 @@ def find_and_set_port():
             if port is not None and port != "":
                 port = int(port)
 
-        return port
+        if port is not None and port != "":
+            set_cached_port(port)
 
-    try:
-        port = int(os.environ.get("OCP_PORT", "0"))
-    except ValueError:
-        print(
-            f"Port {os.environ.get('OCP_PORT')} taken from environment variable OCP_PORT is invalid"
-        )
-        port = 0
+        return port
 
-    if port > 0:
+    port = os.environ.get("OCP_PORT", "0")
+    if unix_socket_path(port) is None:
+        try:
+            port = int(port)
+        except ValueError:
+            print(
+                f"Port {os.environ.get('OCP_PORT')} taken from environment variable OCP_PORT is invalid"
+            )
+            port = 0
+
+    if unix_socket_path(port) is not None or port > 0:
         print(f"Using predefined port {port} taken from environment variable OCP_PORT")
     else:
         port = find_port()
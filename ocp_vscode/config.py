@@ -20,7 +20,14 @@ import os
 import warnings
 
 if os.environ.get("JUPYTER_CADQUERY") is None:
-    from ocp_vscode.comms import send_command, send_config, get_port, is_pytest
+    from ocp_vscode.comms import (
+        send_command,
+        send_config,
+        get_port,
+        invalidate_mirror,
+        is_pytest,
+        set_comms_default,
+    )
 
     is_jupyter_cadquery = False
 else:
@@ -246,10 +253,26 @@ CONFIG_CONTROL_KEYS = [
     "show_parent",
     "show_sketch_local",
     "timeit",
+    "workers",
+    "lod",
+    "instancing",
 ]
 
 CONFIG_KEYS = CONFIG_WORKSPACE_KEYS + CONFIG_CONTROL_KEYS + ["zoom"]
 
+CONFIG_COMMS_KEYS = [
+    "binary",
+    "compression",
+    "compression_threshold",
+    "shared_memory",
+    "shared_memory_threshold",
+    "chunk_size",
+    "delta",
+    "mirror",
+    "lazy_backend",
+    "brep_compression",
+]
+
 CONFIG_SET_KEYS = [
     "ambient_intensity",
     "analysis_tool",
@@ -395,8 +418,23 @@ def set_viewer_config(
     if not is_jupyter_cadquery and port is None:
         port = get_port()
 
-    config = {k: v for k, v in locals().items() if v is not None}
+    data = _ui_message({k: v for k, v in locals().items() if v is not None})
+
+    try:
+        send_config(data, port=port, title=viewer)
+
+    except Exception as ex:
+        raise RuntimeError(
+            "Cannot set viewer config. Is the viewer running?\n" + str(ex.args)
+        ) from ex
+
+    if not is_jupyter_cadquery:
+        # the viewer pushes the changed status later, ask for it next time
+        invalidate_mirror(port)
+
 
+def _ui_message(config):
+    """Create the message for set_viewer_config from the non-None arguments"""
     if config.get("collapse") is not None:
         config["collapse"] = config["collapse"].value
     if config.get("default_edgecolor") is not None:
@@ -412,19 +450,11 @@ def set_viewer_config(
         if isinstance(config.get(key), Enum):
             config[key] = config[key].value
 
-    data = {
+    return {
         "type": "ui",
         "config": config,
     }
 
-    try:
-        send_config(data, port=port, title=viewer)
-
-    except Exception as ex:
-        raise RuntimeError(
-            "Cannot set viewer config. Is the viewer running?\n" + str(ex.args)
-        ) from ex
-
 
 def get_default(key, port=None):
     """Get default value for key"""
@@ -507,6 +537,19 @@ def set_defaults(
     studio_4k_env_maps=None,
     debug=None,
     timeit=None,
+    workers=None,
+    lod=None,
+    instancing=None,
+    binary=None,
+    compression=None,
+    compression_threshold=None,
+    shared_memory=None,
+    shared_memory_threshold=None,
+    chunk_size=None,
+    delta=None,
+    mirror=None,
+    lazy_backend=None,
+    brep_compression=None,
     port=None,
     # Jupyter CadQuery
     viewer=None,
@@ -601,6 +644,12 @@ def set_defaults(
         deviation:          Shapes: Deviation from linear deflection value (default=0.1)
         angular_tolerance:  Shapes: Angular deflection in radians for tessellation (default=0.2)
         edge_accuracy:      Edges: Precision of edge discretization (default: mesh quality / 100)
+        workers:            Tessellate in a pool of this number of processes, 0 or 1 to
+                            tessellate in the calling process (default=0)
+        lod:                Send a coarser level of detail for objects that are small in the
+                            whole scene (default=False)
+        instancing:         Tessellate and send objects that are identical up to a rigid motion
+                            only once, also when they do not share their topology (default=False)
 
         default_color:      Default mesh color (default=(232, 176, 36))
         default_edgecolor:  Default mesh color (default=(128, 128, 128))
@@ -623,6 +672,31 @@ def set_defaults(
         debug:              Show debug statements to the VS Code browser console (default=False)
         timeit:             Show timing information from level 0-3 (default=False)
 
+    - Transport
+        binary:             Send mesh buffers as raw binary websocket frames instead of
+                            base64 encoded JSON (default=False)
+        compression:        Compress model and backend messages with "zlib" or "zstd"
+                            (needs the package zstandard), False to switch off (default=None).
+                            Viewers that do not decode zstd get zlib
+        compression_threshold: Only compress messages larger than this number of bytes
+                            (default=1048576)
+        shared_memory:      Hand large model and backend messages to a standalone viewer on
+                            the same host via shared memory instead of the socket (default=False)
+        shared_memory_threshold: Only use shared memory for messages larger than this number
+                            of bytes (default=16777216)
+        chunk_size:         Send model and backend messages larger than this number of bytes
+                            as fragments of this size, 0 to switch off (default=16777216)
+        delta:              Only send the objects that changed since the last show to the
+                            viewer and the backend (default=True)
+        mirror:             Keep a local copy of the workspace config and status that the
+                            viewer keeps up to date, instead of asking for them before every
+                            show (default=True)
+        lazy_backend:       Only send the shapes to the measurement backend when a measurement
+                            tool of the viewer is active, keep them until then (default=False)
+        brep_compression:   Compress the shapes for the measurement backend with "zlib" or
+                            "zstd" (needs the package zstandard), False to switch off
+                            (default="zlib")
+
     - VS Code only:
         port:              THe port the viewer is running on
 
@@ -643,6 +717,8 @@ def set_defaults(
             is_jupyter_cadquery and key in ["viewer", "cad_width", "height"]
         ):
             DEFAULTS[key] = value
+        elif key in CONFIG_COMMS_KEYS and not is_jupyter_cadquery:
+            set_comms_default(key, value)
         elif key == "port":
             continue
         else:
@@ -680,6 +756,11 @@ def status(port=None, viewer=None, debug=False):
         port = get_port()
 
     response = send_command("status", port=port, title=viewer)
+    return _status_from_response(response, debug)
+
+
+def _status_from_response(response, debug=False):
+    """Convert the response of the status command"""
     if debug:
         return response.get("_debugStarted", False)
 
@@ -750,6 +831,9 @@ def combined_config(port=None, viewer=None):
     if use_status:
         wspace_config.update(workspace_filter(wspace_status))
 
+    # the id of the scene the viewer shows, the base for delta updates
+    wspace_config["_scene"] = wspace_status.get("scene")
+
     wspace_config.update(DEFAULTS)
 
     return dict(sorted(wspace_config.items()))
@@ -0,0 +1,112 @@
+"""Deferred transfer of the backend model until a measurement tool is used"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+import threading
+
+from ocp_vscode.brep import BACKEND_SHAPES
+from ocp_vscode.comms import MIRRORS, get_comms_default, send_backend
+from ocp_vscode.metrics import Timer
+
+
+def _encode(mapping, port, timeit):
+    with Timer(timeit, "", "encode backend model", 1, metric="brep"):
+        return BACKEND_SHAPES.encode(
+            mapping, port, get_comms_default("brep_compression")
+        )
+
+
+def send_model(mapping, port, timeit=False, send=send_backend):
+    """Send the backend mapping with content addressed shapes, as delta of the
+    scene the backend acknowledged last. A rejected delta is sent again in
+    full. send(message, port=..., timeit=...) returns the acknowledgement, see
+    aio.ashow for the asyncio version."""
+    for _ in range(2):
+        model, sent = _encode(mapping, port, timeit)
+        ack = send({"model": model}, port=port, timeit=timeit)
+        if BACKEND_SHAPES.acknowledge(port, ack, sent):
+            break
+
+
+class DeferredModels:
+    """The backend models of every port that were not sent yet.
+
+    With set_defaults(lazy_backend=True) a show only sends its backend model
+    if a measurement tool of the viewer is active. Otherwise the model is kept
+    until the status mirror of the port (see comms.ViewerMirror) reports an
+    active tool. Models still pending when the process exits are dropped.
+    Viewers without status subscriptions always get the model right away.
+    """
+
+    def __init__(self):
+        # port -> backend mapping
+        self.pending = {}
+        self.closed = False
+        # held while a model is taken and sent, so models arrive in order
+        self._lock = threading.RLock()
+
+    def _status(self, port, status):
+        """Send the pending model when a tool was activated or the subscription
+        ended, e.g. because the viewer does not support it"""
+        if (
+            not self.closed
+            and port in self.pending
+            and (status is None or status.get("activeTool") not in (None, "None"))
+        ):
+            threading.Thread(target=self.flush, args=(port,), daemon=True).start()
+
+    def model(self, mapping, port, lazy):
+        """The backend mapping to send now, None if it is deferred"""
+        with self._lock:
+            # backend mappings are complete, a newer one replaces the pending one
+            self.pending.pop(port, None)
+            if lazy:
+                mirror = MIRRORS.listen(
+                    port, "deferred", lambda status: self._status(port, status)
+                )
+                if mirror.supported and mirror.active_tool() is None:
+                    self.pending[port] = mapping
+                    return None
+            return mapping
+
+    def send(self, mapping, port, timeit=False):
+        """Send the backend mapping or defer it"""
+        with self._lock:
+            mapping = self.model(mapping, port, get_comms_default("lazy_backend"))
+            if mapping is not None:
+                send_model(mapping, port, timeit)
+
+    def flush(self, port=None):
+        """Send the pending model of port or of all ports"""
+        with self._lock:
+            ports = list(self.pending) if port is None else [port]
+            for p in ports:
+                mapping = self.pending.pop(p, None)
+                if mapping is not None:
+                    send_model(mapping, p)
+
+    def close(self):
+        """Drop the pending models, sending them would only delay the exit of
+        the process. The mirrors end their subscriptions at exit, which must
+        not send them either."""
+        self.closed = True
+        self.pending.clear()
+
+
+DEFERRED = DeferredModels()
+# registered after comms.MIRRORS.close, so it runs before it
+atexit.register(DEFERRED.close)
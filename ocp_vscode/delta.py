@@ -0,0 +1,174 @@
+"""Delta updates of the scene shown in the viewer"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import uuid
+
+import numpy as np
+from ocp_tessellate.ocp_utils import is_toploc_location, loc_to_tq
+
+from ocp_vscode.metrics import METRICS
+
+# port -> the last Scene sent to the viewer on this port
+SCENES = {}
+
+
+class Scene:
+    """Fingerprints of a scene sent to the viewer"""
+
+    def __init__(self, scene_id, instances, leaves):
+        self.id = scene_id
+        # instance index -> fingerprint
+        self.instances = instances
+        # leaf id -> fingerprint of geometry, location, color, material, state, ...
+        self.leaves = leaves
+        # () -> full data message, for a scene sent as delta, see full_scene
+        self.full = None
+
+
+def _update(digest, obj):
+    if isinstance(obj, np.ndarray):
+        digest.update(f"<{obj.dtype}{obj.shape}>".encode())
+        digest.update(np.ascontiguousarray(obj).data)
+    elif isinstance(obj, dict):
+        digest.update(b"{")
+        for key in sorted(obj):
+            digest.update(f"{key}:".encode())
+            _update(digest, obj[key])
+        digest.update(b"}")
+    elif isinstance(obj, (list, tuple)):
+        digest.update(b"[")
+        for value in obj:
+            _update(digest, value)
+            digest.update(b",")
+        digest.update(b"]")
+    elif is_toploc_location(obj):
+        _update(digest, loc_to_tq(obj))
+    else:
+        digest.update(repr(obj).encode())
+
+
+def fingerprint(obj):
+    """Hash of nested dicts, lists and numpy arrays"""
+    digest = hashlib.blake2b(digest_size=16)
+    _update(digest, obj)
+    return digest.hexdigest()
+
+
+def _leaves(shapes):
+    for part in shapes["parts"]:
+        if part.get("parts") is not None:
+            yield from _leaves(part)
+        else:
+            yield part
+
+
+def _leaf_fingerprint(leaf, instances):
+    shape = leaf.get("shape")
+    if isinstance(shape, dict) and shape.get("ref") is not None:
+        # refs change with the order of the instances, use the mesh instead
+        leaf = {**leaf, "shape": instances[shape["ref"]]}
+    return fingerprint(leaf)
+
+
+def _keep_leaves(shapes, keep, refs):
+    parts = []
+    for part in shapes["parts"]:
+        if part.get("parts") is not None:
+            parts.append(_keep_leaves(part, keep, refs))
+        elif part["id"] in keep:
+            stub = {"id": part["id"], "keep": True}
+            if refs.get(part["id"]) is not None:
+                stub["ref"] = refs[part["id"]]
+            parts.append(stub)
+        else:
+            parts.append(part)
+    return {**shapes, "parts": parts}
+
+
+def create_delta(port, instances, shapes, base=None, scene_id=None):
+    """Fingerprint the scene and diff it against the last scene sent to port.
+
+    The new scene is remembered as the last scene of port. If the viewer still
+    shows the last scene (its id equals base), only the changes are returned:
+    unchanged instances are replaced by {"keep": index in the last scene} and
+    unchanged leaves by {"id": id, "keep": True, "ref": instance index}. The
+    backend mapping is diffed against the scene the backend acknowledged when
+    it is sent, see brep.BackendShapes.
+
+    scene_id keeps the id of the scene, e.g. when only its meshes are refined
+    and the backend mapping is still valid.
+
+    Returns the scene id, the delta ({"base", "add", "update", "remove"} or None
+    for a full scene), the instances and the shapes to send.
+    """
+    fingerprints = [fingerprint(instance) for instance in instances]
+    leaves = {
+        leaf["id"]: _leaf_fingerprint(leaf, fingerprints) for leaf in _leaves(shapes)
+    }
+    scene = Scene(scene_id or uuid.uuid4().hex, fingerprints, leaves)
+    previous = SCENES.get(port)
+    SCENES[port] = scene
+
+    if previous is None or base is None or previous.id != base:
+        return scene.id, None, instances, shapes
+
+    indexes = {fp: i for i, fp in enumerate(previous.instances)}
+    delta_instances = [
+        {"keep": indexes[fp]} if fp in indexes else instance
+        for instance, fp in zip(instances, fingerprints)
+    ]
+
+    keep = {id_ for id_, fp in leaves.items() if previous.leaves.get(id_) == fp}
+    refs = {
+        leaf["id"]: leaf["shape"].get("ref")
+        for leaf in _leaves(shapes)
+        if leaf["id"] in keep and isinstance(leaf.get("shape"), dict)
+    }
+    delta_shapes = _keep_leaves(shapes, keep, refs)
+
+    METRICS.record("delta_kept", len(keep))
+    delta = {
+        "base": previous.id,
+        "add": [id_ for id_ in leaves if id_ not in previous.leaves],
+        "update": [id_ for id_ in leaves if id_ in previous.leaves and id_ not in keep],
+        "remove": [id_ for id_ in previous.leaves if id_ not in leaves],
+    }
+    return scene.id, delta, delta_instances, delta_shapes
+
+
+def forget_scene(port):
+    """The next show on port sends the full scene"""
+    SCENES.pop(port, None)
+
+
+def keep_full_scene(port, scene_id, full):
+    """Keep full() -> the full data message of the scene scene_id sent as delta"""
+    scene = SCENES.get(port)
+    if scene is not None and scene.id == scene_id:
+        scene.full = full
+
+
+def full_scene(port, scene_id):
+    """The full data message of the last scene of port, once, if it has the id
+    scene_id and was sent as delta. The viewer reports the id of a scene it
+    cannot apply as delta, e.g. after a reload."""
+    scene = SCENES.get(port)
+    if scene is None or scene.id != scene_id or scene.full is None:
+        return None
+    full, scene.full = scene.full, None
+    return full()
@@ -0,0 +1,310 @@
+"""Instancing of geometrically identical shapes that do not share a TShape"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from OCP.BRep import BRep_Tool
+from OCP.BRepAdaptor import BRepAdaptor_Curve, BRepAdaptor_Surface
+from OCP.GeomAbs import (
+    GeomAbs_BezierCurve,
+    GeomAbs_BezierSurface,
+    GeomAbs_BSplineCurve,
+    GeomAbs_BSplineSurface,
+    GeomAbs_Circle,
+    GeomAbs_Cone,
+    GeomAbs_Cylinder,
+    GeomAbs_Ellipse,
+    GeomAbs_Hyperbola,
+    GeomAbs_Parabola,
+    GeomAbs_Sphere,
+    GeomAbs_Torus,
+)
+from OCP.gp import gp_Trsf
+from OCP.TopAbs import TopAbs_EDGE, TopAbs_FACE, TopAbs_VERTEX
+from OCP.TopExp import TopExp
+from OCP.TopLoc import TopLoc_Location
+from OCP.TopoDS import TopoDS, TopoDS_Shape
+from OCP.TopTools import TopTools_IndexedMapOfShape
+from ocp_tessellate import OcpGroup
+
+from ocp_vscode.metrics import METRICS
+
+# Points of two shapes may differ by this share of the shape size
+TOLERANCE = 1e-6
+
+# The fingerprint rounds the distances to the center to this many digits of
+# the shape size
+DIGITS = 4
+
+MAX_FINGERPRINTS = 10000
+
+
+# Interior points sampled on every edge and, per direction, on every face
+SAMPLES = 3
+
+
+def _samples(first, last):
+    return [first + (last - first) * (i + 1) / (SAMPLES + 1) for i in range(SAMPLES)]
+
+
+def _knots(sequence):
+    return [sequence.Value(i) for i in range(sequence.Lower(), sequence.Upper() + 1)]
+
+
+def _curve_geometry(curve, kind):
+    """Poles, lengths and dimensionless values that define the curve"""
+    if kind == GeomAbs_Circle:
+        return [], [curve.Circle().Radius()], []
+    if kind == GeomAbs_Ellipse:
+        ellipse = curve.Ellipse()
+        return [], [ellipse.MajorRadius(), ellipse.MinorRadius()], []
+    if kind == GeomAbs_Hyperbola:
+        hyperbola = curve.Hyperbola()
+        return [], [hyperbola.MajorRadius(), hyperbola.MinorRadius()], []
+    if kind == GeomAbs_Parabola:
+        return [], [curve.Parabola().Focal()], []
+    if kind == GeomAbs_BezierCurve:
+        bezier = curve.Bezier()
+        indexes = range(1, bezier.NbPoles() + 1)
+        weights = [bezier.Weight(i) for i in indexes]
+        return [bezier.Pole(i) for i in indexes], [], [bezier.Degree(), *weights]
+    if kind == GeomAbs_BSplineCurve:
+        spline = curve.BSpline()
+        indexes = range(1, spline.NbPoles() + 1)
+        weights = [spline.Weight(i) for i in indexes]
+        values = [spline.Degree(), spline.IsPeriodic(), *weights]
+        return (
+            [spline.Pole(i) for i in indexes],
+            [],
+            values + _knots(spline.KnotSequence()),
+        )
+    return [], [], []
+
+
+def _surface_geometry(surface, kind):
+    """Poles, lengths and dimensionless values that define the surface"""
+    if kind == GeomAbs_Cylinder:
+        return [], [surface.Cylinder().Radius()], []
+    if kind == GeomAbs_Cone:
+        cone = surface.Cone()
+        return [], [cone.RefRadius()], [cone.SemiAngle()]
+    if kind == GeomAbs_Sphere:
+        return [], [surface.Sphere().Radius()], []
+    if kind == GeomAbs_Torus:
+        torus = surface.Torus()
+        return [], [torus.MajorRadius(), torus.MinorRadius()], []
+    if kind in (GeomAbs_BezierSurface, GeomAbs_BSplineSurface):
+        spline = (
+            surface.Bezier() if kind == GeomAbs_BezierSurface else surface.BSpline()
+        )
+        indexes = [
+            (i, j)
+            for i in range(1, spline.NbUPoles() + 1)
+            for j in range(1, spline.NbVPoles() + 1)
+        ]
+        values = [spline.UDegree(), spline.VDegree()]
+        values += [spline.Weight(i, j) for i, j in indexes]
+        if kind == GeomAbs_BSplineSurface:
+            values += [spline.IsUPeriodic(), spline.IsVPeriodic()]
+            values += _knots(spline.UKnotSequence()) + _knots(spline.VKnotSequence())
+        return [spline.Pole(i, j) for i, j in indexes], [], values
+    return [], [], []
+
+
+class Fingerprint:
+    """A geometric fingerprint of a shape, independent of its location.
+
+    The points are the vertices, SAMPLES points on every edge, a grid of
+    SAMPLES x SAMPLES points on every face and the poles of Bezier and BSpline
+    geometry in the order of the topology, relative to their center. `key`
+    hashes the shape type, the curve and surface types, their radii, angles,
+    degrees, knots and weights and the distances of the points to their
+    center, so shapes that are identical up to a rigid motion have the same key.
+    `transform` finds the motion of the points of two shapes with the same key.
+    """
+
+    def __init__(self, shape):
+        vertices, edges, faces = (
+            _indexed(shape, kind) for kind in (TopAbs_VERTEX, TopAbs_EDGE, TopAbs_FACE)
+        )
+        points, types = [], [shape.ShapeType(), shape.Orientation()]
+        lengths, values = [], []
+        for vertex in vertices:
+            points.append(BRep_Tool.Pnt_s(TopoDS.Vertex_s(vertex)))
+        for edge in edges:
+            edge = TopoDS.Edge_s(edge)
+            if BRep_Tool.Degenerated_s(edge):
+                types.append(-1)
+                continue
+            curve = BRepAdaptor_Curve(edge)
+            kind = curve.GetType()
+            types.append(int(kind))
+            for t in _samples(curve.FirstParameter(), curve.LastParameter()):
+                points.append(curve.Value(t))
+            poles, curve_lengths, curve_values = _curve_geometry(curve, kind)
+            points += poles
+            lengths += curve_lengths
+            values += curve_values
+        for face in faces:
+            surface = BRepAdaptor_Surface(TopoDS.Face_s(face))
+            kind = surface.GetType()
+            types.append(100 + int(kind))
+            for u in _samples(surface.FirstUParameter(), surface.LastUParameter()):
+                for v in _samples(surface.FirstVParameter(), surface.LastVParameter()):
+                    points.append(surface.Value(u, v))
+            poles, surface_lengths, surface_values = _surface_geometry(surface, kind)
+            points += poles
+            lengths += surface_lengths
+            values += surface_values
+
+        points = np.array([p.Coord() for p in points]).reshape(-1, 3)
+        self.center = points.mean(axis=0) if len(points) > 0 else np.zeros(3)
+        self.points = points - self.center
+        distances = np.linalg.norm(self.points, axis=1)
+        self.size = float(distances.max()) if len(points) > 0 else 0.0
+
+        sha = hashlib.sha256(np.array(types, dtype=np.int32).tobytes())
+        sha.update(f"{len(vertices)},{len(edges)},{len(faces)}".encode())
+        sha.update(np.round(np.array(values, dtype=float), 2 * DIGITS).tobytes())
+        if self.size > 0:
+            sha.update(f"{self.size:.{DIGITS}g}".encode())
+            sha.update(np.round(distances / self.size, DIGITS).tobytes())
+            sha.update(np.round(np.array(lengths) / self.size, DIGITS).tobytes())
+        self.key = sha.hexdigest()
+
+        # A rotation is only determined by points that are not on a line
+        singular = np.linalg.svd(self.points, compute_uv=False)
+        self.rigid = len(singular) > 1 and singular[1] > TOLERANCE * self.size
+
+    def transform(self, other):
+        """The rotation and translation that move the points of self onto the
+        points of other or None"""
+        if not (self.rigid and other.rigid) or self.key != other.key:
+            return None
+        if self.points.shape != other.points.shape:
+            return None
+
+        u, _, vt = np.linalg.svd(self.points.T @ other.points)
+        d = np.sign(np.linalg.det(vt.T @ u.T))
+        rotation = vt.T @ np.diag([1.0, 1.0, d]) @ u.T
+        residual = np.abs(self.points @ rotation.T - other.points).max()
+        if residual > TOLERANCE * max(1.0, self.size):
+            return None
+        return rotation, other.center - rotation @ self.center
+
+
+def _indexed(shape, kind):
+    shapes = TopTools_IndexedMapOfShape()
+    TopExp.MapShapes_s(shape, kind, shapes)
+    return [shapes.FindKey(i) for i in range(1, shapes.Extent() + 1)]
+
+
+def _location(rotation, translation):
+    trsf = gp_Trsf()
+    trsf.SetValues(*[v for row, t in zip(rotation, translation) for v in (*row, t)])
+    return TopLoc_Location(trsf)
+
+
+class FingerprintCache:
+    """Fingerprints of the last MAX_FINGERPRINTS shapes by the identity of
+    their TShape, so shapes of repeated shows are not explored again"""
+
+    def __init__(self, maxsize=MAX_FINGERPRINTS):
+        self.maxsize = maxsize
+        # (TShape hash, orientation) -> (TShape, Fingerprint)
+        self.fingerprints = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, shape):
+        tshape = shape.TShape()
+        identity = (hash(tshape), shape.Orientation())
+        with self._lock:
+            entry = self.fingerprints.get(identity)
+            if entry is not None and entry[0] == tshape:
+                self.fingerprints.move_to_end(identity)
+                return entry[1]
+
+        fingerprint = Fingerprint(shape)
+        with self._lock:
+            self.fingerprints[identity] = (tshape, fingerprint)
+            while len(self.fingerprints) > self.maxsize:
+                self.fingerprints.popitem(last=False)
+        return fingerprint
+
+    def clear(self):
+        with self._lock:
+            self.fingerprints.clear()
+
+
+FINGERPRINTS = FingerprintCache()
+
+
+def _objects(group):
+    for obj in group.objects:
+        if isinstance(obj, OcpGroup):
+            yield from _objects(obj)
+        else:
+            yield obj
+
+
+def share_instances(part_group, instances):
+    """Replace instances that are identical to an earlier instance up to a
+    rigid motion by a reference to the earlier one. The objects of part_group
+    that referenced a replaced instance get the motion added to their location.
+
+    Returns the remaining instances, part_group is changed in place.
+    """
+    # fingerprint key -> [(index, fingerprint)]
+    candidates = {}
+    # replaced index -> (index, location)
+    shared = {}
+    for i, instance in enumerate(instances):
+        shape = instance["obj"]
+        if not isinstance(shape, TopoDS_Shape) or shape.IsNull():
+            continue
+        fingerprint = FINGERPRINTS.get(shape)
+        for j, other in candidates.get(fingerprint.key, []):
+            motion = other.transform(fingerprint)
+            if motion is not None:
+                shared[i] = (j, _location(*motion))
+                break
+        else:
+            candidates.setdefault(fingerprint.key, []).append((i, fingerprint))
+
+    if not shared:
+        return instances
+
+    refs, result = {}, []
+    for i, instance in enumerate(instances):
+        if i not in shared:
+            refs[i] = len(result)
+            result.append(instance)
+
+    for obj in _objects(part_group):
+        if obj.ref is None:
+            continue
+        if obj.ref in shared:
+            ref, location = shared[obj.ref]
+            obj.loc = location if obj.loc is None else obj.loc * location
+            obj.ref = ref
+        obj.ref = refs[obj.ref]
+
+    METRICS.record("shared_instances", len(shared))
+    return result
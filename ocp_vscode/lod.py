@@ -0,0 +1,109 @@
+"""Levels of detail: coarser meshes for objects that are small in the scene"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from ocp_tessellate.convert import combined_bb
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import bounding_box
+from ocp_tessellate.tessellator import compute_quality
+
+from ocp_vscode.cache import fresh_meshes, prefetched, tessellate_group
+from ocp_vscode.parallel import tessellate_parallel
+
+# deviation and angular tolerance factors of the coarser levels
+LOD_LEVELS = ((10, 3), (100, 5))
+MAX_ANGULAR_TOLERANCE = 1.0
+
+# a level is only used if it has at most this share of the triangles of the
+# next finer level
+MAX_TRIANGLE_SHARE = 0.5
+
+# the size of the viewer in pixels the whole scene is fitted into and the
+# deflection of a level on screen that is still invisible
+LOD_VIEWPORT = 1000
+LOD_PIXELS = 1.0
+
+
+def level_params(params, deviation_factor, angular_tolerance_factor):
+    """The tessellation parameters of a coarser level of detail"""
+    deviation = preset("deviation", params.get("deviation"))
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    return {
+        **params,
+        "deviation": deviation * deviation_factor,
+        "angular_tolerance": min(
+            angular_tolerance * angular_tolerance_factor, MAX_ANGULAR_TOLERANCE
+        ),
+    }
+
+
+def pixels_per_unit(shapes, zoom=None):
+    """Pixels of a model unit when the scene is fitted into the LOD_VIEWPORT
+    and zoomed by zoom"""
+    bb = combined_bb(shapes)
+    size = 0 if bb is None else 2 * bb.max_dist_from_center()
+    if not 1e-6 < size < 1e50:
+        return None
+    return LOD_VIEWPORT * (zoom or 1.0) / size
+
+
+def select_levels(part_group, instances, meshes, shapes, params, workers=0):
+    """Replace the meshes of the instances that are small on screen by a
+    coarser level of detail (see LOD_LEVELS): the coarsest level whose
+    deflection is below LOD_PIXELS for the camera that shows the whole scene.
+    The camera the user moves to later is not known, the levels are chosen
+    when the scene is shown.
+
+    Only the levels that are used are tessellated. Returns a new list, the
+    cached meshes are not changed.
+    """
+    ppu = pixels_per_unit(shapes, params.get("zoom"))
+    if ppu is None:
+        return meshes
+
+    deviation = preset("deviation", params.get("deviation"))
+    # index -> the level of detail each instance gets, 0 is the mesh itself
+    chosen = {}
+    for i, instance in enumerate(instances):
+        bb = bounding_box(instance["obj"], loc=None, optimal=False)
+        level = 0
+        for k, (factor, _) in enumerate(LOD_LEVELS):
+            if compute_quality(bb, deviation=deviation * factor) * ppu <= LOD_PIXELS:
+                level = k + 1
+        if level > 0:
+            chosen[i] = level
+
+    result = list(meshes)
+    for k in range(len(LOD_LEVELS), 0, -1):
+        if k not in chosen.values():
+            continue
+        coarse = level_params(params, *LOD_LEVELS[k - 1])
+        prefetch = {}
+        if workers > 1:
+            prefetch = tessellate_parallel(part_group, instances, coarse, workers)
+        with prefetched(prefetch), fresh_meshes():
+            level, _, _ = tessellate_group(part_group, instances, coarse)
+        if len(level) != len(meshes):
+            # empty meshes are dropped by tessellate_group
+            return meshes
+        for i in [i for i, chosen_level in chosen.items() if chosen_level == k]:
+            triangles = len(meshes[i]["triangles"])
+            if len(level[i]["triangles"]) <= triangles * MAX_TRIANGLE_SHARE:
+                result[i] = level[i]
+            else:
+                # the level saves too few triangles, try the next finer one
+                chosen[i] = k - 1
+    return result
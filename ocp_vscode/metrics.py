@@ -0,0 +1,193 @@
+"""Performance metrics of show() and the viewer communication"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import contextvars
+import json
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from ocp_tessellate.utils import Timer as _Timer
+
+__all__ = ["get_metrics", "reset_metrics", "set_metrics_file"]
+
+HISTOGRAM_SIZE = 1000
+
+_CURRENT_SHOW = contextvars.ContextVar("ocp_vscode_show_metrics", default=None)
+
+
+class Histogram:
+    """Rolling window of the last `size` observed values"""
+
+    def __init__(self, size=HISTOGRAM_SIZE):
+        self.values = deque(maxlen=size)
+        self.count = 0
+
+    def observe(self, value):
+        self.values.append(value)
+        self.count += 1
+
+    def summary(self):
+        values = sorted(self.values)
+        n = len(values)
+
+        def quantile(q):
+            return values[round(q * (n - 1))]
+
+        return {
+            "count": self.count,
+            "last": self.values[-1],
+            "mean": sum(values) / n,
+            "min": values[0],
+            "max": values[-1],
+            "p50": quantile(0.5),
+            "p90": quantile(0.9),
+            "p99": quantile(0.99),
+        }
+
+
+class MetricsRegistry:
+    """Collects the metrics of every show() call.
+
+    Values recorded while a show is active (see `show`) are summed up per show
+    and observed once the show has finished, all other values are observed
+    immediately.
+    """
+
+    def __init__(self, size=HISTOGRAM_SIZE):
+        self.size = size
+        self.histograms = {}
+        self.shows = 0
+        self.last_show = None
+        self.path = None
+        self._lock = threading.Lock()
+
+    def _observe(self, name, value):
+        if name not in self.histograms:
+            self.histograms[name] = Histogram(self.size)
+        self.histograms[name].observe(value)
+
+    def record(self, name, value=1):
+        """Record a duration in seconds or a count"""
+        current = _CURRENT_SHOW.get()
+        with self._lock:
+            if current is None:
+                self._observe(name, value)
+            else:
+                current[name] = current.get(name, 0) + value
+
+    @contextmanager
+    def show(self):
+        """Collect the metrics of one show() call"""
+        if _CURRENT_SHOW.get() is not None:
+            # nested, e.g. show_object calls show
+            yield
+            return
+
+        current = {}
+        token = _CURRENT_SHOW.set(current)
+        start = time.time()
+        try:
+            yield
+        finally:
+            _CURRENT_SHOW.reset(token)
+            current["show"] = time.time() - start
+            with self._lock:
+                for name, value in current.items():
+                    self._observe(name, value)
+                self.shows += 1
+                self.last_show = current
+                path = self.path
+            if path is not None:
+                with open(path, "a", encoding="utf-8") as fd:
+                    fd.write(json.dumps({"time": start, **current}) + "\n")
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "shows": self.shows,
+                "last_show": None if self.last_show is None else dict(self.last_show),
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in sorted(self.histograms.items())
+                },
+            }
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.shows = 0
+            self.last_show = None
+
+
+METRICS = MetricsRegistry()
+
+
+class Timer(_Timer):
+    """ocp_tessellate's Timer that also records its duration as `metric`"""
+
+    def __init__(self, timeit, name, activity, level=0, newline=False, metric=None):
+        super().__init__(timeit, name, activity, level, newline)
+        self.metric = metric
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        if self.metric is not None:
+            METRICS.record(self.metric, time.time() - self.start)
+        super().__exit__(exc_type, exc_value, exc_traceback)
+
+
+def get_metrics(reset=False):
+    """Get the performance metrics of the last show() calls.
+
+    Returns a dict with
+    - shows:      the number of show() calls so far
+    - last_show:  the metrics of the last show() call
+    - histograms: per metric count, last, mean, min, max, p50, p90 and p99 of the
+                  last 1000 show() calls (or messages sent outside of show())
+
+    Durations are in seconds: to_ocpgroup, instancing, tessellate (including
+    workers, the parallel tessellation, and lod, the levels of detail), bb,
+    create_data_obj, json_dumps, compress, shared_memory, connect, send and show
+    (overall).
+    Counts: bytes (sent), messages, round_trips, shapes, triangles, cache_hits,
+    disk_cache_hits and cache_misses (of the tessellation cache), shared_instances
+    (objects instanced by their geometry) and delta_kept (unchanged objects of a
+    delta update).
+    The background refinement of progressive shows is recorded as refine.
+
+    Parameters:
+        reset: Clear the metrics after reading them (default=False)
+    """
+    result = METRICS.snapshot()
+    if reset:
+        METRICS.reset()
+    return result
+
+
+def reset_metrics():
+    """Clear all collected performance metrics"""
+    METRICS.reset()
+
+
+def set_metrics_file(path=None):
+    """Append the metrics of every show() call as JSON line to path.
+
+    Parameters:
+        path: The JSON-lines file, None to stop writing (default=None)
+    """
+    METRICS.path = None if path is None else str(path)
@@ -0,0 +1,196 @@
+"""Tessellation of the instances of a show() in a pool of worker processes"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import multiprocessing
+import re
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from ocp_tessellate import OcpGroup
+from ocp_tessellate.defaults import preset
+from ocp_tessellate.ocp_utils import bounding_box, deserialize, serialize
+from ocp_tessellate.tessellator import compute_quality
+
+from ocp_vscode import cache
+
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+_WARNED = False
+
+
+def _context():
+    # a fork of this process, which runs the mirror, websocket and refinement
+    # threads, can deadlock on locks held at fork time. The fork server is
+    # started single threaded, the workers are forked from it.
+    if sys.platform == "linux":
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+_GUARD = re.compile(
+    r"""^if\s+(__name__\s*==\s*['"]__main__['"]|['"]__main__['"]\s*==\s*__name__)\s*:""",
+    re.MULTILINE,
+)
+
+
+def main_is_guarded():
+    """Spawned and fork server workers import the __main__ module of the user
+    as __mp_main__. A script without an `if __name__ == "__main__":` guard would
+    run again, including its show() calls, in every worker."""
+    main = sys.modules.get("__main__")
+    spec = getattr(main, "__spec__", None)
+    path = spec.origin if spec is not None else getattr(main, "__file__", None)
+    if path is None:
+        # interactive sessions and notebooks, nothing is imported again
+        return True
+    try:
+        with open(path, encoding="utf-8") as f:
+            return _GUARD.search(f.read()) is not None
+    except (OSError, UnicodeDecodeError):
+        return False
+
+
+def get_pool(workers):
+    """Get the warm process pool, it is kept until the number of workers changes"""
+    global _POOL, _POOL_WORKERS  # pylint: disable=global-statement
+
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = ProcessPoolExecutor(max_workers=workers, mp_context=_context())
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def shutdown_pool():
+    """Stop the worker processes"""
+    global _POOL, _POOL_WORKERS  # pylint: disable=global-statement
+
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+        _POOL_WORKERS = 0
+
+
+def _tessellate_brep(task):
+    """Worker: tessellate a serialized shape, None if it fails"""
+    brep, cache_id, quality, params = task
+    deviation, angular_tolerance, compute_faces, compute_edges, uvs, normalize = params
+    try:
+        return cache._tessellate(  # pylint: disable=protected-access
+            deserialize(brep),
+            cache_id,
+            deviation,
+            quality,
+            angular_tolerance,
+            compute_faces=compute_faces,
+            compute_edges=compute_edges,
+            compute_uvs=uvs,
+            normalize_uvs=normalize,
+        )
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def _material_refs(group, refs=None):
+    """Instance refs with a material -> normalize_uvs, as in tessellate_group"""
+    if refs is None:
+        refs = {}
+    for obj in group.objects:
+        if isinstance(obj, OcpGroup):
+            _material_refs(obj, refs)
+        elif obj.kind in ("solid", "face", "shell") and obj.material:
+            refs[obj.ref] = obj.normalize_uvs
+    return refs
+
+
+def tessellate_parallel(part_group, instances, params, workers):
+    """Tessellate the instances of part_group that are not cached in a pool of
+    `workers` processes. The shapes are sent as binary BREP.
+
+    Returns {(cache_id, tessellation params): (mesh, disk cache key)} to be
+    used by the serial tessellate_group via cache.prefetched(). Instances that
+    fail in a worker are left to tessellate_group, all of them if the script
+    of the user has no __main__ guard (see main_is_guarded).
+    """
+    deviation = preset("deviation", params.get("deviation"))
+    angular_tolerance = preset("angular_tolerance", params.get("angular_tolerance"))
+    render_edges = preset("render_edges", params.get("render_edges"))
+    material_refs = _material_refs(part_group)
+    disk_cache = cache.DISK_CACHE
+
+    keys = []
+    tasks = []
+    for i, instance in enumerate(instances):
+        shape = instance["obj"]
+        if isinstance(shape, (list, tuple)):
+            shape = shape[0]
+        key_params = cache.tessellation_params(
+            deviation,
+            angular_tolerance,
+            True,
+            render_edges,
+            i in material_refs,
+            material_refs.get(i, True),
+        )
+        if cache.TESSELLATION_CACHE.contains(shape, instance["cache_id"], key_params):
+            continue
+
+        brep = serialize(shape)
+        disk_key = None
+        if disk_cache is not None:
+            disk_key = disk_cache.key(shape, key_params, brep)
+            if disk_cache.contains(disk_key):
+                continue
+
+        # the same quality as tessellate_group computes
+        bb = bounding_box(shape, loc=None, optimal=False)
+        quality = compute_quality(bb, deviation=deviation)
+        keys.append((instance["cache_id"], key_params, disk_key))
+        tasks.append((brep, instance["cache_id"], quality, key_params))
+
+    if len(tasks) < 2:
+        return {}
+
+    if not main_is_guarded():
+        global _WARNED  # pylint: disable=global-statement
+        if not _WARNED:
+            print(
+                'show(..., workers=N) needs an `if __name__ == "__main__":` guard '
+                "in the script, tessellating in this process"
+            )
+            _WARNED = True
+        return {}
+
+    try:
+        pool = get_pool(workers)
+        chunksize = max(1, len(tasks) // (4 * workers))
+        meshes = list(pool.map(_tessellate_brep, tasks, chunksize=chunksize))
+    except BrokenProcessPool:
+        shutdown_pool()
+        return {}
+
+    return {
+        (cache_id, key_params): (mesh, disk_key)
+        for (cache_id, key_params, disk_key), mesh in zip(keys, meshes)
+        if mesh is not None
+    }
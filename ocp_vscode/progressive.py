@@ -0,0 +1,115 @@
+"""Progressive shows: a coarse tessellation first, refined in the background"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import threading
+
+from ocp_vscode.lod import level_params
+from ocp_vscode.metrics import Timer
+
+# The coarse tessellation uses deviation and angular tolerance times these factors
+COARSE_DEVIATION = 10
+COARSE_ANGULAR_TOLERANCE = 3
+
+# port -> Refinement created by the last show, started after its scene was sent
+PENDING = {}
+# port -> running Refinement
+RUNNING = {}
+_LOCK = threading.Lock()
+
+
+def coarse_params(params):
+    """The tessellation parameters of the first, coarse pass"""
+    return level_params(params, COARSE_DEVIATION, COARSE_ANGULAR_TOLERANCE)
+
+
+def replace_leaves(shapes, leaves):
+    """A copy of the shapes tree with the leaves of the same id replaced"""
+    if not leaves:
+        return shapes
+    parts = []
+    for part in shapes["parts"]:
+        if part.get("parts") is not None:
+            parts.append(replace_leaves(part, leaves))
+        else:
+            parts.append(leaves.get(part["id"], part))
+    return {**shapes, "parts": parts}
+
+
+class Refinement(threading.Thread):
+    """Replace the coarse meshes of a scene by the refined meshes of `batches`
+    and call send(instances, shapes) with the refined scene after every batch.
+
+    batches yields for every batch {instance index: mesh} and {leaf id: leaf}.
+    It is consumed in the thread, so the tessellation runs in the background.
+    """
+
+    def __init__(self, instances, shapes, batches, send):
+        super().__init__(daemon=True)
+        self.instances = list(instances)
+        self.shapes = shapes
+        self.batches = batches
+        self.send = send
+        self.cancelled = False
+        self._lock = threading.Lock()
+
+    def run(self):
+        try:
+            with Timer(False, "", "refine", 1, metric="refine"):
+                for meshes, leaves in self.batches:
+                    if self.cancelled:
+                        return
+                    self.instances = [
+                        meshes.get(i, mesh) for i, mesh in enumerate(self.instances)
+                    ]
+                    self.shapes = replace_leaves(self.shapes, leaves)
+                    with self._lock:
+                        if self.cancelled:
+                            return
+                        self.send(self.instances, self.shapes)
+        except Exception as ex:  # pylint: disable=broad-except
+            print(f"Refinement of the progressive show failed: {ex}")
+
+    def cancel(self):
+        """Stop refining, no batch is sent after cancel() returned"""
+        with self._lock:
+            self.cancelled = True
+
+
+def schedule_refinement(port, refinement):
+    """Remember the refinement of the scene that is about to be sent to port"""
+    with _LOCK:
+        PENDING[port] = refinement
+
+
+def start_refinement(port):
+    """Start the pending refinement of port, after its coarse scene was sent"""
+    with _LOCK:
+        refinement = PENDING.pop(port, None)
+        if refinement is not None:
+            RUNNING[port] = refinement
+    if refinement is not None:
+        refinement.start()
+    return refinement
+
+
+def cancel_refinement(port):
+    """Stop the refinement of port, e.g. because a new scene will be shown"""
+    with _LOCK:
+        refinements = [PENDING.pop(port, None), RUNNING.pop(port, None)]
+    for refinement in refinements:
+        if refinement is not None:
+            refinement.cancel()
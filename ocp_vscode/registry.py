@@ -0,0 +1,294 @@
+"""The registry of objects shown incrementally with show_object and push_object"""
+
+#
+# Copyright 2025 Bernhard Walter
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import itertools
+
+from OCP.TopoDS import TopoDS_Shape
+from ocp_tessellate import OcpGroup
+from ocp_tessellate.convert import OcpConverter, to_ocpgroup
+from ocp_tessellate.ocp_utils import identity_location, is_identity
+from ocp_tessellate.utils import Color
+
+
+class Entry:
+    """An object of the registry with its viewer attributes and the result of
+    its last conversion to an OcpGroup"""
+
+    def __init__(self, obj, name, color, alpha, mode, material):
+        self.obj = obj
+        self.name = name
+        self.color = color
+        self.alpha = alpha
+        self.mode = mode
+        self.material = material
+        # (shape state, key, top level objects, instances)
+        self.converted = None
+
+
+def _value(value):
+    if isinstance(value, Color):
+        return (value.web_color, value.a)
+    if isinstance(value, (list, tuple)):
+        return tuple(_value(v) for v in value)
+    return value
+
+
+def _same(value):
+    """Materials are compared by identity, unless they are names"""
+    return value if value is None or isinstance(value, str) else id(value)
+
+
+class _ShapeState:
+    """TShape, location and orientation of the shape of an object and the state
+    of its children. Shapes can be moved in place, so the shape itself cannot be
+    compared. The children of an assembly can be moved, colored or renamed
+    without changing the TShape of the assembly."""
+
+    def __init__(self, shape, attributes, children):
+        self.tshape = shape.TShape()
+        self.location = shape.Location()
+        self.orientation = shape.Orientation()
+        self.attributes = attributes
+        self.children = children
+
+    def __eq__(self, other):
+        return (
+            self.tshape == other.tshape
+            and self.location.IsEqual(other.location)
+            and self.orientation == other.orientation
+            and self.attributes == other.attributes
+            and self.children == other.children
+        )
+
+
+def _state(obj, child=False):
+    """The state of the shape of obj or None if its conversion cannot be reused"""
+    shape = obj if isinstance(obj, TopoDS_Shape) else getattr(obj, "wrapped", None)
+    if not isinstance(shape, TopoDS_Shape):
+        return None
+
+    children = [_state(c, True) for c in getattr(obj, "children", None) or ()]
+    if any(state is None for state in children):
+        return None
+    # the attributes of the top level object are part of the key
+    attributes = (
+        (
+            getattr(obj, "label", None),
+            getattr(obj, "name", None),
+            _value(getattr(obj, "color", None)),
+            _same(getattr(obj, "material", None)),
+        )
+        if child
+        else None
+    )
+    return _ShapeState(shape, attributes, children)
+
+
+def _copy(node, refs):
+    """A copy of the converted tree of an entry with the instance references
+    mapped by refs. The conversion of a show changes names, ids, locations and
+    colors of the nodes, so no node or list of the cached tree must be used."""
+    result = copy.copy(node)
+    for name, value in vars(node).items():
+        if isinstance(value, (list, dict)):
+            setattr(result, name, copy.copy(value))
+    if isinstance(node, OcpGroup):
+        result.objects = [_copy(obj, refs) for obj in node.objects]
+    elif result.ref is not None:
+        result.ref = refs[result.ref]
+    return result
+
+
+def _add_instances(instances, tshapes, entry_instances):
+    """Add the instances of an entry, instances with the TShape of an earlier
+    one are shared as in OcpConverter.get_instance. Returns the new indexes."""
+    refs = []
+    for instance in entry_instances:
+        shape = instance["obj"]
+        tshape = shape.TShape() if isinstance(shape, TopoDS_Shape) else None
+        ref = None if tshape is None else tshapes.get(hash(tshape))
+        if ref is None or instances[ref]["obj"].TShape() != tshape:
+            ref = len(instances)
+            instances.append(instance)
+            if tshape is not None:
+                tshapes[hash(tshape)] = ref
+        refs.append(ref)
+    return refs
+
+
+class ObjectRegistry:
+    """The objects of show_object and push_object in the order they were added.
+
+    Entries are indexed by name, so updating and removing them does not search
+    the list. The conversion of every entry to an OcpGroup is kept, a show of
+    the registry only converts new and changed entries and combines the others
+    from their last conversion. The meshes of unchanged entries come from the
+    tessellation cache and only changed objects are sent with delta updates.
+    """
+
+    def __init__(self):
+        self._ids = itertools.count()
+        # id -> Entry, in the order of the registry
+        self.entries = {}
+        # name -> ids of the entries with this name
+        self.names = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.names.clear()
+
+    def _append(self, entry):
+        key = next(self._ids)
+        self.entries[key] = entry
+        self.names.setdefault(entry.name, []).append(key)
+
+    def add(self, obj, name=None, color=None, alpha=None, mode=None, material=None):
+        """Append a new entry"""
+        self._append(Entry(obj, name, color, alpha, mode, material))
+
+    def assign(self, objs, names):
+        """Replace all entries by objs with names. An entry is kept together
+        with its conversion if its name still holds the same object."""
+        previous = {entry.name: entry for entry in self.entries.values()}
+        self.clear()
+        for obj, name in zip(objs, names):
+            entry = previous.get(name)
+            if entry is None or entry.obj is not obj:
+                entry = Entry(obj, name, None, None, None, None)
+            self._append(entry)
+
+    def update(self, obj, name, color=None, alpha=None, mode=None, material=None):
+        """Replace the first entry with this name in place"""
+        ids = self.names.get(name)
+        if not ids:
+            raise ValueError(f"No object with name '{name}'")
+        self.entries[ids[0]] = Entry(obj, name, color, alpha, mode, material)
+
+    def remove(self, name):
+        """Remove the first entry with this name, returns False if there is none"""
+        ids = self.names.get(name)
+        if not ids:
+            return False
+        del self.entries[ids.pop(0)]
+        if not ids:
+            del self.names[name]
+        return True
+
+    def show_args(self):
+        """The objects and the names, colors, alphas, modes and materials lists
+        for show()"""
+        entries = list(self.entries.values())
+        return [e.obj for e in entries], dict(
+            names=[e.name for e in entries],
+            colors=[e.color for e in entries],
+            alphas=[e.alpha for e in entries],
+            modes=[e.mode for e in entries],
+            materials=[e.material for e in entries],
+        )
+
+    def to_ocpgroup(
+        self, *cad_objs, names, colors, alphas, materials, modes, progress, **kwargs
+    ):
+        """to_ocpgroup for the objects of the registry (as returned by
+        show_args) that reuses the conversion of unchanged entries.
+
+        The names, colors, ... are the final attributes of show(), after
+        colormaps and object colors were applied.
+        """
+        entries = list(self.entries.values())
+        if (
+            len(entries) != len(cad_objs)
+            or any(e.obj is not obj for e, obj in zip(entries, cad_objs))
+            or kwargs.get("render_joints")
+            or kwargs.get("show_parent")
+        ):
+            return to_ocpgroup(
+                *cad_objs,
+                names=names,
+                colors=colors,
+                alphas=alphas,
+                materials=materials,
+                modes=modes,
+                progress=progress,
+                **kwargs,
+            )
+
+        default_color = kwargs.pop("default_color", None)
+        settings = tuple(sorted((k, _value(v)) for k, v in kwargs.items()))
+
+        group = OcpGroup(name=None, loc=identity_location())
+        instances = []
+        # TShape hash -> index in instances
+        tshapes = {}
+        for entry, name, color, alpha, material, mode in zip(
+            entries, names, colors, alphas, materials, modes
+        ):
+            obj = entry.obj
+            state = _state(obj)
+            key = (
+                name,
+                _value(color),
+                alpha,
+                _same(material),
+                _value(mode),
+                _value(default_color),
+                settings,
+                getattr(obj, "label", None),
+                getattr(obj, "name", None),
+                _value(getattr(obj, "color", None)),
+                _same(getattr(obj, "material", None)),
+            )
+            converted = entry.converted
+            if (
+                state is None
+                or converted is None
+                or converted[1] != key
+                or converted[0] != state
+            ):
+                converter = OcpConverter(progress=progress, **kwargs)
+                converted_group = converter.to_ocp(
+                    obj,
+                    names=[name],
+                    colors=[color],
+                    alphas=[alpha],
+                    materials=[material],
+                    modes=[mode],
+                    default_color=default_color,
+                )
+                if converted_group.name is None and is_identity(converted_group.loc):
+                    objects = converted_group.objects
+                else:
+                    objects = [converted_group]
+                converted = (state, key, objects, converter.instances)
+                if state is not None:
+                    entry.converted = converted
+
+            _, _, objects, entry_instances = converted
+            refs = _add_instances(instances, tshapes, entry_instances)
+            group.add(*[_copy(obj, refs) for obj in objects])
+
+        group.make_unique_names()
+        if group.length == 1 and isinstance(group.objects[0], OcpGroup):
+            group = group.cleanup()
+        if group.name is None:
+            group.name = "Group"
+
+        return group, instances
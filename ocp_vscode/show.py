@@ -16,16 +16,21 @@
 # limitations under the License.
 #
 
+import functools
 import os
 import pathlib
 import re
+import threading
 import time
 import traceback
 import types
+from contextlib import nullcontext
 from enum import Enum
 from logging import Logger
 
 import ocp_tessellate.convert as oc
+from OCP.BRepBuilderAPI import BRepBuilderAPI_Copy
+from OCP.TopoDS import TopoDS_Shape
 from ocp_tessellate import OcpGroup
 from ocp_tessellate.cad_objects import (
     OCP_Edges,
@@ -38,10 +43,10 @@ from ocp_tessellate.cad_objects import (
 from ocp_tessellate.convert import (
     combined_bb,
     get_normal_len,
-    tessellate_group,
     to_ocpgroup,
 )
 from ocp_tessellate.ocp_utils import (
+    bounding_box,
     is_build123d,
     is_cadquery,
     is_cadquery_assembly,
@@ -56,10 +61,25 @@ from ocp_tessellate.ocp_utils import (
     is_vector,
     nested_bounding_box,
 )
-from ocp_tessellate.utils import Color, Timer, numpy_to_buffer_json
+from ocp_tessellate.utils import Color, numpy_to_buffer_json
 from threejs_materials import PbrProperties
 
+from ocp_vscode.cache import fresh_meshes, prefetched, tessellate_group
 from ocp_vscode.colors import BaseColorMap, get_colormap
+from ocp_vscode.deferred import DEFERRED
+from ocp_vscode.delta import create_delta, forget_scene, full_scene, keep_full_scene
+from ocp_vscode.instancing import share_instances
+from ocp_vscode.lod import select_levels
+from ocp_vscode.metrics import METRICS, Timer
+from ocp_vscode.parallel import tessellate_parallel
+from ocp_vscode.progressive import (
+    Refinement,
+    cancel_refinement,
+    coarse_params,
+    schedule_refinement,
+    start_refinement,
+)
+from ocp_vscode.registry import ObjectRegistry
 from ocp_vscode.utils import is_pymat_material, is_build123d_material
 
 if os.environ.get("JUPYTER_CADQUERY") == "1":
@@ -76,7 +96,7 @@ else:
 
     is_jupyter_cadquery = False
 
-from ocp_vscode.comms import is_pytest
+from ocp_vscode.comms import MIRRORS, get_comms_default, get_port, is_pytest
 from ocp_vscode.utils import (
     check_camera_warnings,
     camera_keep_warning,
@@ -110,14 +130,7 @@ __all__ = [
     "none_filter",
 ]
 
-OBJECTS = {
-    "objs": [],
-    "names": [],
-    "colors": [],
-    "alphas": [],
-    "modes": [],
-    "materials": [],
-}
+OBJECTS = ObjectRegistry()
 
 LAST_CALL = "other"
 
@@ -211,6 +224,210 @@ def _extract_material_objects(part_group):
     return extracted if extracted else None
 
 
+def _group_leaves(part_group):
+    """The leaves of the part_group tree in tree order"""
+    if isinstance(part_group, OcpGroup):
+        return [leaf for obj in part_group.objects for leaf in _group_leaves(obj)]
+    return [part_group]
+
+
+def _prune(node, selected):
+    """A copy of the group tree with the leaves whose id() is in selected, the
+    groups keep their names, hence the ids stay the same"""
+    if isinstance(node, OcpGroup):
+        objs = [_prune(obj, selected) for obj in node.objects]
+        objs = [obj for obj in objs if obj is not None]
+        return OcpGroup(objs, name=node.name, loc=node.loc) if objs else None
+    return node if id(node) in selected else None
+
+
+def _stream_batches(part_group, size):
+    """Split the leaves of part_group into batches, starting with `size` leaves
+    and doubling the batch size afterwards. Yields for every batch a pruned copy
+    of the group tree (same names, hence same ids) and the leaves of the batch.
+    """
+    leaves = _group_leaves(part_group)
+    start = 0
+    while start < len(leaves):
+        batch = leaves[start : start + size]
+        yield _prune(part_group, {id(leaf) for leaf in batch}), batch
+        start += size
+        size *= 2
+
+
+def _merge_parts(target, source):
+    """Merge the parts tree source into target, groups with the same id are joined"""
+    groups = {part["id"]: part for part in target["parts"] if "parts" in part}
+    for part in source["parts"]:
+        if "parts" in part and part["id"] in groups:
+            _merge_parts(groups[part["id"]], part)
+        else:
+            target["parts"].append(part)
+    return target
+
+
+def _remap_refs(shapes, refs):
+    """Replace the instance refs in shapes by refs[ref]"""
+    for part in shapes["parts"]:
+        if "parts" in part:
+            _remap_refs(part, refs)
+        elif part.get("type") == "shapes":
+            part["shape"]["ref"] = refs[part["shape"]["ref"]]
+
+
+def _union_bb(bb1, bb2):
+    if bb1 is None:
+        return bb2
+    if bb2 is None:
+        return bb1
+    return {
+        k: (min if k.endswith("min") else max)(bb1[k], bb2[k])
+        for k in ("xmin", "xmax", "ymin", "ymax", "zmin", "zmax")
+    }
+
+
+def _tessellate_leaves(group, leaves, instances, params, progress):
+    """Tessellate the pruned group that holds leaves. While tessellating, the
+    instance refs of the leaves index into the instances of the batch.
+
+    Returns the indexes of the batch instances in instances, their meshes and
+    the shapes (with batch refs) and the mapping of the group.
+    """
+    refs = list(dict.fromkeys(leaf.ref for leaf in leaves if leaf.ref is not None))
+    local = {ref: i for i, ref in enumerate(refs)}
+    for leaf in leaves:
+        if leaf.ref is not None:
+            leaf.ref = local[leaf.ref]
+    try:
+        meshed, shapes, mapping = tessellate_group(
+            group,
+            [instances[ref] for ref in refs],
+            params,
+            progress,
+            params.get("timeit"),
+        )
+    finally:
+        for leaf in leaves:
+            if leaf.ref is not None:
+                leaf.ref = refs[leaf.ref]
+    return refs, meshed, shapes, mapping
+
+
+def _tessellate_stream(part_group, instances, params, progress, size, on_batch):
+    """Tessellate part_group in batches of growing size (see _stream_batches) and
+    hand every batch but the last to on_batch(instances, shapes). Each instance
+    is sent once, with the first batch that references it, and the refs of all
+    batches index into the concatenation of the sent instances.
+
+    Returns the instances and shapes of the last batch and the mapping of the
+    whole group. The bounding box of the last shapes covers the whole group.
+    """
+    sent = {}  # index in instances -> index in the sent instances
+    mapping = None
+    bb = None
+    normal_len = 0
+    batches = _stream_batches(part_group, size)
+    group, leaves = next(batches, (None, None))
+    if group is None:
+        return tessellate_group(
+            part_group, instances, params, progress, params.get("timeit")
+        )
+
+    while group is not None:
+        refs, meshed, shapes, batch_mapping = _tessellate_leaves(
+            group, leaves, instances, params, progress
+        )
+
+        new_instances = []
+        global_refs = []
+        for ref, mesh in zip(refs, meshed):
+            if ref not in sent:
+                sent[ref] = len(sent)
+                new_instances.append(mesh)
+            global_refs.append(sent[ref])
+        _remap_refs(shapes, global_refs)
+
+        mapping = (
+            batch_mapping if mapping is None else _merge_parts(mapping, batch_mapping)
+        )
+        bb = _union_bb(bb, shapes["bb"])
+        normal_len = max(normal_len, shapes["normal_len"])
+
+        group, leaves = next(batches, (None, None))
+        if group is not None:
+            on_batch(new_instances, shapes)
+
+    shapes["bb"] = bb
+    shapes["normal_len"] = normal_len
+    return new_instances, shapes, mapping
+
+
+def _detached(instances):
+    """The instances with copies of their shapes, topology and geometry. OCCT
+    keeps the triangulation on the faces, so the refinement in the background
+    must not mesh the shapes of the user, the next show or the code of the user
+    may use them at the same time. Copied in the calling thread."""
+
+    def copy(shape):
+        if isinstance(shape, (list, tuple)):
+            return [copy(s) for s in shape]
+        if isinstance(shape, TopoDS_Shape) and not shape.IsNull():
+            return BRepBuilderAPI_Copy(shape, True, False).Shape()
+        return shape
+
+    return [{**instance, "obj": copy(instance["obj"])} for instance in instances]
+
+
+def _refine_batches(part_group, instances, params):
+    """Tessellate part_group again with params for a progressive show. The
+    instances are refined largest first (by the size of their bounding box, the
+    camera is not known here) in batches of 1, 2, 4, ... instances, the leaves
+    without instance (edges, vertices) in a last batch.
+
+    Yields for every batch {instance index: mesh} and {leaf id: leaf}.
+    """
+    params = {**params, "timeit": False}
+    leaves = {}
+    loose = []
+    for leaf in _group_leaves(part_group):
+        if leaf.ref is None:
+            loose.append(leaf)
+        else:
+            leaves.setdefault(leaf.ref, []).append(leaf)
+
+    refs = sorted(
+        leaves,
+        key=lambda ref: bounding_box(
+            instances[ref]["obj"], loc=None, optimal=False
+        ).max_dist_from_center(),
+        reverse=True,
+    )
+    start = 0
+    size = 1
+    while start < len(refs):
+        batch = [leaf for ref in refs[start : start + size] for leaf in leaves[ref]]
+        group = _prune(part_group, {id(leaf) for leaf in batch})
+        batch_refs, meshed, _, _ = _tessellate_leaves(
+            group, batch, instances, params, None
+        )
+        yield dict(zip(batch_refs, meshed)), {}
+        start += size
+        size *= 2
+
+    if loose:
+        group = _prune(part_group, {id(leaf) for leaf in loose})
+        _, _, shapes, _ = _tessellate_leaves(group, loose, instances, params, None)
+        yield {}, {leaf["id"]: leaf for leaf in _shape_leaves(shapes)}
+
+
+def _shape_leaves(shapes):
+    for part in shapes["parts"]:
+        if "parts" in part:
+            yield from _shape_leaves(part)
+        else:
+            yield part
+
+
 def _tessellate(
     *cad_objs,
     names=None,
@@ -219,6 +436,11 @@ def _tessellate(
     modes=None,
     materials=None,
     progress=None,
+    stream=None,
+    on_batch=None,
+    progressive=None,
+    on_refine=None,
+    registry=None,
     **kwargs,
 ):
     viewer = kwargs.get("viewer")
@@ -322,7 +544,7 @@ def _tessellate(
     if progress is None:
         progress = Progress([c for c in "-+c"])
 
-    with Timer(timeit, "", "to_ocpgroup", 1):
+    with Timer(timeit, "", "to_ocpgroup", 1, metric="to_ocpgroup"):
         changed_config = get_changed_config(port=port)
 
         if (
@@ -349,7 +571,9 @@ def _tessellate(
                 "helper_scale", changed_config.get("helper_scale")
             )
 
-        part_group, instances = to_ocpgroup(
+        # objects of show_object reuse the conversion of the unchanged objects
+        convert = to_ocpgroup if registry is None else registry.to_ocpgroup
+        part_group, instances = convert(
             *cad_objs,
             names=names,
             colors=colors,
@@ -438,10 +662,67 @@ def _tessellate(
     if kwargs.get("debug") is not None and kwargs["debug"]:
         print("\ntessellation parameters:\n", params)
 
-    with Timer(timeit, "", "tessellate", 1):
-        instances, shapes, mapping = tessellate_group(
-            part_group, instances, params, progress, params.get("timeit")
-        )
+    if params.get("instancing", False):
+        with Timer(timeit, "", "instancing", 1, metric="instancing"):
+            instances = share_instances(part_group, instances)
+
+    with Timer(timeit, "", "tessellate", 1, metric="tessellate"):
+        if stream and on_batch is not None:
+            # The overall bounding box lets the viewer place the camera for the
+            # whole scene when the first batch arrives
+            skeleton_bb = nested_bounding_box(cad_objs)
+            if 1e-6 < skeleton_bb.max_dist_from_center() < 1e50:
+                skeleton_bb = skeleton_bb.to_dict()
+            else:
+                skeleton_bb = None
+            count_shapes = part_group.count_shapes()
+
+            def send_batch(batch_instances, batch_shapes):
+                if skeleton_bb is not None:
+                    batch_shapes["bb"] = skeleton_bb
+                if extracted_materials:
+                    batch_shapes["materials"] = extracted_materials
+                batch_params = {k: v for k, v in params.items() if k != "states"}
+                batch_params["normal_len"] = batch_shapes["normal_len"]
+                on_batch(batch_instances, batch_shapes, batch_params, count_shapes)
+
+            instances, shapes, mapping = _tessellate_stream(
+                part_group,
+                instances,
+                params,
+                progress,
+                16 if stream is True else int(stream),
+                send_batch,
+            )
+        else:
+            coarse = progressive and on_refine is not None
+            tessellation_params = coarse_params(params) if coarse else params
+            if coarse:
+                # the refinement tessellates the instances again with params
+                on_refine(part_group, instances, params)
+
+            meshes = {}
+            workers = params.get("workers") or 0
+            if workers > 1:
+                with Timer(timeit, "", "parallel tessellation", 2, metric="workers"):
+                    meshes = tessellate_parallel(
+                        part_group, instances, tessellation_params, workers
+                    )
+            shape_instances = instances
+            with prefetched(meshes), fresh_meshes() if coarse else nullcontext():
+                instances, shapes, mapping = tessellate_group(
+                    part_group,
+                    instances,
+                    tessellation_params,
+                    progress,
+                    params.get("timeit"),
+                )
+
+            if params.get("lod") and not coarse:
+                with Timer(timeit, "", "levels of detail", 2, metric="lod"):
+                    instances = select_levels(
+                        part_group, shape_instances, instances, shapes, params, workers
+                    )
 
     # `params["states"]` is normally populated from `conf["states"]` (the
     # user's current tree selections, pulled from status() via combined_config
@@ -462,7 +743,7 @@ def _tessellate(
         preset("deviation", params.get("deviation")),
     )
 
-    with Timer(timeit, "", "bb", 1):
+    with Timer(timeit, "", "bb", 1, metric="bb"):
         bb = combined_bb(shapes)
         if bb is None:
             bb = dict(
@@ -500,6 +781,10 @@ def _convert(
     modes=None,
     materials=None,
     progress=None,
+    stream=None,
+    progressive=None,
+    registry=None,
+    send_batch=None,
     **kwargs,
 ):
     timeit = preset("timeit", kwargs.get("timeit"), port=kwargs.get("port"))
@@ -507,6 +792,25 @@ def _convert(
     if progress is None:
         progress = Progress([c for c in "-+c"])
 
+    batches = []
+
+    def on_batch(instances, shapes, config, count_shapes):
+        config = _viewer_config(config, kwargs)
+        if batches:
+            # do not move the camera the user might already have changed
+            config["reset_camera"] = Camera.KEEP.value
+        _record_triangles(instances)
+        message = _data_message(instances, shapes, config, count_shapes)
+        message["stream"] = {"batch": len(batches), "final": False}
+        batches.append(message["stream"])
+        with Timer(timeit, "", f"send batch {len(batches)}", 1):
+            send_batch(message, timeit)
+
+    refine = []
+
+    def on_refine(part_group, instances, params):
+        refine.append((part_group, instances, params))
+
     instances, shapes, config, count_shapes, mapping, extracted_materials = _tessellate(
         *cad_objs,
         names=names,
@@ -515,38 +819,147 @@ def _convert(
         modes=modes,
         materials=materials,
         progress=progress,
+        stream=stream,
+        on_batch=None if send_batch is None else on_batch,
+        progressive=progressive,
+        on_refine=None if send_batch is None else on_refine,
+        registry=registry,
         **kwargs,
     )
 
+    _record_triangles(instances)
+    METRICS.record("shapes", count_shapes)
+
     if extracted_materials:
         shapes["materials"] = extracted_materials
 
+    config = _viewer_config(config, kwargs)
+    base = config.pop("_scene", None)
+
+    if config.get("debug") is not None and config["debug"]:
+        print("\nconfig:\n", config)
+
+    if batches:
+        config["reset_camera"] = Camera.KEEP.value
+
+    with Timer(timeit, "", "create data obj", 1, metric="create_data_obj"):
+        port = None if is_jupyter_cadquery else kwargs.get("port") or get_port()
+        full = (instances, shapes)
+        scene = delta = None
+        if port is not None and not is_pytest():
+            if batches or not get_comms_default("delta"):
+                forget_scene(port)
+            else:
+                scene, delta, instances, shapes = create_delta(
+                    port, instances, shapes, base
+                )
+
+        if refine:
+            part_group, shape_instances, params = refine[0]
+            refinement = Refinement(
+                full[0],
+                full[1],
+                _refine_batches(part_group, _detached(shape_instances), params),
+                _refinement_sender(port, config, count_shapes, scene, send_batch),
+            )
+            schedule_refinement(port, refinement)
+
+        if is_pytest():
+            return (instances, shapes, config, count_shapes), mapping
+
+        message = _data_message(instances, shapes, config, count_shapes)
+        if batches:
+            message["stream"] = {"batch": len(batches), "final": True}
+        if scene is not None:
+            message["scene"] = scene
+            mapping["scene"] = scene
+        if delta is not None:
+            message["delta"] = delta
+            _keep_full_scene(
+                port, scene, lambda: _data_message(*full, config, count_shapes)
+            )
+        return message, mapping
+
+
+def _keep_full_scene(port, scene, full):
+    """Send the full scene again if the viewer reports that it cannot apply
+    the delta, e.g. after a reload or with a stale mirrored status"""
+
+    def missing(status):
+        if status is None or status.get("missingScene") is None:
+            return
+        message = full_scene(port, status["missingScene"])
+        if message is not None:
+            message["scene"] = status["missingScene"]
+            threading.Thread(
+                target=send_data, args=(message,), kwargs={"port": port}, daemon=True
+            ).start()
+
+    keep_full_scene(port, scene, full)
+    if get_comms_default("mirror"):
+        MIRRORS.listen(port, "scenes", missing)
+
+
+def _refinement_sender(port, config, count_shapes, scene, send_batch):
+    """send(instances, shapes) for a Refinement: the refined scene keeps its id,
+    so the viewer applies it as delta and the backend mapping stays valid"""
+    config = {k: v for k, v in config.items() if k != "states"}
+    # do not move the camera or reset the states the user might have changed
+    config["reset_camera"] = Camera.KEEP.value
+
+    def send(instances, shapes):
+        delta = None
+        if scene is not None:
+            _, delta, instances, shapes = create_delta(
+                port, instances, shapes, base=scene, scene_id=scene
+            )
+        message = _data_message(instances, shapes, config, count_shapes)
+        if scene is not None:
+            message["scene"] = scene
+        if delta is not None:
+            message["delta"] = delta
+        send_batch(message, False)
+
+    return send
+
+
+def _record_triangles(instances):
+    METRICS.record(
+        "triangles",
+        sum(len(instance["triangles"]) // 3 for instance in instances if instance),
+    )
+
+
+def _viewer_config(config, kwargs):
+    """Adapt the tessellation parameters to the config the viewer expects"""
     if config.get("dark") is not None:
         config["theme"] = "dark"
     elif config.get("orbit_control") is not None:
         config["control"] = "orbit" if config["orbit_control"] else "trackball"
 
-    if config.get("debug") is not None and config["debug"]:
-        print("\nconfig:\n", config)
-
     if kwargs.get("explode") is not None:
         config["explode"] = kwargs["explode"]
     if kwargs.get("analysis_tool") is not None:
         val = kwargs["analysis_tool"]
         config["analysis_tool"] = val.value if isinstance(val, Enum) else val
 
-    with Timer(timeit, "", "create data obj", 1):
-        if is_pytest():
-            return (instances, shapes, config, count_shapes), mapping
+    return config
+
+
+def _data_message(instances, shapes, config, count_shapes):
+    if not is_jupyter_cadquery and get_comms_default("binary"):
+        # numpy buffers will be sent as raw binary frames by comms
+        data = dict(instances=instances, shapes=shapes)
+    else:
         data = numpy_to_buffer_json(
             dict(instances=instances, shapes=shapes),
         )
-        return {
-            "data": data,
-            "type": "data",
-            "config": config,
-            "count": count_shapes,
-        }, mapping
+    return {
+        "data": data,
+        "type": "data",
+        "config": config,
+        "count": count_shapes,
+    }
 
 
 class Progress:
@@ -598,6 +1011,11 @@ def show(
     materials=None,
     port=None,
     progress="-+*c",
+    stream=None,
+    progressive=None,
+    workers=None,
+    lod=None,
+    instancing=None,
     glass=None,
     tools=None,
     tree_width=None,
@@ -674,6 +1092,7 @@ def show(
     debug=None,
     timeit=None,
     _force_in_debug=False,
+    _registry=None,
 ):
     # pylint: disable=line-too-long
     """Show CAD objects in Visual Studio Code
@@ -695,6 +1114,20 @@ def show(
                                              "+": gets tessellated with Python code,
                                              "*": gets tessellated with native code,
                                              "c": from cache
+        stream:                  Send the tessellated objects in batches while tessellating, starting with
+                                 'stream' objects (True: 16) and doubling the batch size. The viewer renders
+                                 each batch when it arrives (default=None, i.e. send everything at once)
+        progressive:             Send a coarse tessellation first and refine it in the background, the
+                                 largest objects first. The viewer replaces the coarse meshes when the
+                                 refined ones arrive (default=None, i.e. tessellate with the final quality)
+        workers:                 Tessellate the objects in a pool of 'workers' processes, 0 or 1 tessellates
+                                 in this process (default=None, i.e. set_defaults(workers=...) or 0)
+        lod:                     Send a coarser level of detail for objects that are small in the whole
+                                 scene, the coarsest level whose deviation is below a pixel (default=None,
+                                 i.e. set_defaults(lod=...) or False)
+        instancing:              Tessellate and send objects that are identical up to a rigid motion only once,
+                                 also when they do not share their topology (default=None, i.e.
+                                 set_defaults(instancing=...) or False)
         port:                    The port the viewer listens to. Typically use 'set_port(port)' instead
 
     Valid keywords to configure the viewer (**kwargs):
@@ -810,10 +1243,42 @@ def show(
     """
 
     validate_tool_args(explode, analysis_tool)
-    return _show(*cad_objs, **none_filter(locals(), ["cad_objs"]))
+    kwargs = none_filter(locals(), ["cad_objs"])
+    with METRICS.show():
+        return _show(*cad_objs, **kwargs)
 
 
 def _show(*cad_objs, **kwargs):
+    port = kwargs.get("port")
+
+    def send_batch(message, timeit):
+        send_data(message, port=port, timeit=timeit)
+
+    result = _create_message(*cad_objs, send_batch=send_batch, **kwargs)
+    if result is None:
+        return None
+    t, mapping, timeit = result
+
+    if is_pytest():
+        return t, mapping
+
+    with Timer(timeit, "", "send"):
+        viewer = send_data(t, port=port, timeit=timeit)
+
+    if is_jupyter_cadquery:
+        send_backend({"model": mapping}, jcv_id=viewer.widget.id, timeit=timeit)
+        return viewer
+    else:
+        port = port or get_port()
+        DEFERRED.send(mapping, port, timeit=timeit)
+        start_refinement(port)
+
+
+def _create_message(*cad_objs, send_batch=None, **kwargs):
+    """Tessellate the objects and create the data message and backend mapping.
+    send_batch(message, timeit) is called for every batch of a streamed show.
+    Returns the message, the mapping and the timeit setting.
+    """
     global LAST_CALL  # pylint: disable=global-statement
 
     port = kwargs.get("port")
@@ -825,7 +1290,10 @@ def _show(*cad_objs, **kwargs):
     modes = kwargs.get("modes")
     default_edgecolor = kwargs.get("default_edgecolor")
     progress = kwargs.get("progress")
+    stream = kwargs.get("stream")
+    progressive = kwargs.get("progressive")
     _force_in_debug = kwargs.get("_force_in_debug")
+    registry = kwargs.get("_registry")
 
     if (
         cad_objs is None
@@ -842,7 +1310,11 @@ def _show(*cad_objs, **kwargs):
         )
     ):
         print("show: No CAD objects to show")
-        return
+        return None
+
+    if not is_jupyter_cadquery:
+        # the refinement of the last scene must not overwrite the new one
+        cancel_refinement(port or get_port())
 
     kwargs = {
         k: v
@@ -857,6 +1329,9 @@ def _show(*cad_objs, **kwargs):
             "materials",
             "modes",
             "progress",
+            "stream",
+            "progressive",
+            "_registry",
             "LAST_CALL",
         ]
     }
@@ -922,6 +1397,10 @@ def _show(*cad_objs, **kwargs):
             modes=modes,
             materials=materials,
             progress=progress,
+            stream=stream,
+            progressive=progressive,
+            registry=registry,
+            send_batch=None if is_pytest() or is_jupyter_cadquery else send_batch,
             **kwargs,
         )
 
@@ -933,31 +1412,12 @@ def _show(*cad_objs, **kwargs):
     if progress is not None:
         print()
 
-    if is_pytest():
-        return t, mapping
-
-    with Timer(timeit, "", "send"):
-        viewer = send_data(t, port=port, timeit=timeit)
-
-    if is_jupyter_cadquery:
-        send_backend({"model": mapping}, jcv_id=viewer.widget.id, timeit=timeit)
-        return viewer
-    else:
-        send_backend({"model": mapping}, port=port, timeit=timeit)
+    return t, mapping, timeit
 
 
 def reset_show():
     """Reset the stack of objects to be shown"""
-    global OBJECTS  # pylint: disable=global-statement
-
-    OBJECTS = {
-        "objs": [],
-        "names": [],
-        "colors": [],
-        "alphas": [],
-        "modes": [],
-        "materials": [],
-    }
+    OBJECTS.clear()
 
 
 # pylint: disable=too-many-locals,too-many-arguments
@@ -1193,27 +1653,20 @@ def show_object(
 
 def remove_object(name, call_show=False, port=None, progress="-+*c"):
     """Remove object from the stack of objects by name"""
-    try:
-        index = OBJECTS["names"].index(name)
-        for key in ["objs", "names", "colors", "alphas", "modes", "materials"]:
-            del OBJECTS[key][index]
-    except ValueError:
-        pass  # Name not found; silently do nothing
+    OBJECTS.remove(name)  # silently do nothing if the name is not found
 
     if call_show:
-        return show(
-            *OBJECTS["objs"],
-            names=OBJECTS["names"],
-            colors=OBJECTS["colors"],
-            alphas=OBJECTS["alphas"],
-            modes=OBJECTS["modes"],
-            materials=OBJECTS["materials"],
-            port=port,
-            progress=progress,
-        )
+        cad_objs, args = OBJECTS.show_args()
+        return show(*cad_objs, **args, port=port, progress=progress, _registry=OBJECTS)
 
 
 def _show_object(obj, **kwargs):
+    cad_objs, kwargs = _stack_object(obj, **kwargs)
+    return show(*cad_objs, **kwargs)
+
+
+def _stack_object(obj, **kwargs):
+    """Add obj to the stack of objects, returns the arguments for show()"""
     port = kwargs.get("port")
     name = kwargs.get("name")
     clear = kwargs.get("clear")
@@ -1250,19 +1703,14 @@ def _show_object(obj, **kwargs):
         remove_object(name)
 
     if parent is not None:
-        OBJECTS["objs"].append(parent)
-        OBJECTS["names"].append("parent")
-        OBJECTS["colors"].append(None)
-        OBJECTS["alphas"].append(None)
-        OBJECTS["modes"].append(None)
-        OBJECTS["materials"].append(None)
+        OBJECTS.add(parent, "parent")
 
     color = None
     alpha = None
     if options is None:
         colormap = get_colormap()
         if colormap is not None:
-            for _ in range(len(OBJECTS["names"]) + 1):
+            for _ in range(len(OBJECTS) + 1):
                 *color, alpha = next(colormap)
     else:
         color = options.get("color")
@@ -1270,23 +1718,11 @@ def _show_object(obj, **kwargs):
         if options.get("material") is not None:
             material = options.get("material")
 
-    OBJECTS["objs"].append(obj)
-    OBJECTS["names"].append(name)
-    OBJECTS["colors"].append(color)
-    OBJECTS["alphas"].append(alpha)
-    OBJECTS["modes"].append(mode)
-    OBJECTS["materials"].append(material)
-
-    return show(
-        *OBJECTS["objs"],
-        names=OBJECTS["names"],
-        colors=OBJECTS["colors"],
-        alphas=OBJECTS["alphas"],
-        modes=OBJECTS["modes"],
-        materials=OBJECTS["materials"],
-        port=port,
-        progress=progress,
-        **kwargs,
+    OBJECTS.add(obj, name, color, alpha, mode, material)
+
+    cad_objs, args = OBJECTS.show_args()
+    return cad_objs, dict(
+        **args, port=port, progress=progress, _registry=OBJECTS, **kwargs
     )
 
 
@@ -1342,19 +1778,9 @@ def push_object(
             alpha = 1.0
 
     if update:
-        index = OBJECTS["names"].index(name)
-        OBJECTS["objs"][index] = obj
-        OBJECTS["colors"][index] = color
-        OBJECTS["alphas"][index] = alpha
-        OBJECTS["modes"][index] = mode
-        OBJECTS["materials"][index] = material
+        OBJECTS.update(obj, name, color, alpha, mode, material)
     else:
-        OBJECTS["objs"].append(obj)
-        OBJECTS["names"].append(name)
-        OBJECTS["colors"].append(color)
-        OBJECTS["alphas"].append(alpha)
-        OBJECTS["modes"].append(mode)
-        OBJECTS["materials"].append(material)
+        OBJECTS.add(obj, name, color, alpha, mode, material)
 
 
 def show_objects(
@@ -1561,18 +1987,12 @@ def show_objects(
     """
     validate_tool_args(explode, analysis_tool)
     kwargs = none_filter(locals())
+    cad_objs, args = OBJECTS.show_args()
     # Use per-object modes stored in OBJECTS
-    stored_modes = OBJECTS["modes"]
+    stored_modes = args.pop("modes")
     if any(m is not None for m in stored_modes):
         kwargs["modes"] = stored_modes
-    return show(
-        *OBJECTS["objs"],
-        names=OBJECTS["names"],
-        colors=OBJECTS["colors"],
-        alphas=OBJECTS["alphas"],
-        materials=OBJECTS["materials"],
-        **kwargs,
-    )
+    return show(*cad_objs, **args, _registry=OBJECTS, **kwargs)
 
 
 def show_clear():
@@ -1580,9 +2000,84 @@ def show_clear():
     data = {
         "type": "clear",
     }
+    if not is_jupyter_cadquery:
+        cancel_refinement(get_port())
     send_data(data)
 
 
+# ipython and jupyter variables
+_IPYTHON_NAMES = {"_", "__", "___", "_ih", "_oh", "_dh", "Out", "In"}
+_IPYTHON_NAME = re.compile(r"_i?\d+")
+
+# the number of types whose show_all kind is cached
+MAX_SHOW_ALL_KINDS = 256
+
+# the variables shown by the last show_all
+_SHOW_ALL_OBJECTS = ObjectRegistry()
+
+
+@functools.lru_cache(maxsize=MAX_SHOW_ALL_KINDS)
+def _type_kind(cls):
+    """The show_all kind of all instances of cls, or None if it depends on the
+    attributes of the instance"""
+    if (
+        # ignore classes
+        issubclass(cls, type)
+        # callable instances
+        or any("__call__" in vars(base) for base in cls.__mro__)
+        or issubclass(cls, (int, float, str, bool, types.ModuleType, Enum, Logger))
+        or cls is type(None)
+        or (cls.__name__ == "_Feature" and cls.__module__ == "__future__")
+        or "cad_viewer_widget.widget" in str(cls)
+    ):
+        return "ignore"
+
+    if issubclass(cls, (list, tuple, dict, OcpWrapper)):
+        return "object"
+
+    return None
+
+
+def _show_all_kind(obj):
+    """How show_all handles obj: "object", "named" (the object gets the name of
+    its variable), "ignore" or None (cannot be visualized). The checks that only
+    depend on the type of obj are cached, the attribute checks run per object."""
+    kind = _type_kind(type(obj))
+    if kind is not None:
+        return kind
+
+    if (
+        (
+            hasattr(obj, "wrapped")
+            and (
+                is_topods_shape(obj.wrapped)
+                or is_topods_compound(obj.wrapped)
+                or is_toploc_location(obj.wrapped)
+            )
+        )
+        or is_build123d_plane(obj)
+        or is_build123d_location(obj)
+        or is_build123d_axis(obj)
+        or is_build123d_locationlist(obj)
+        or is_vector(obj)  # Vector
+        or is_cadquery(obj)
+        or is_cadquery_sketch(obj)
+        or is_build123d(obj)
+        or is_cadquery_assembly(obj)
+        or (
+            hasattr(obj, "wrapped")
+            and hasattr(obj, "position")
+            and hasattr(obj, "direction")
+        )
+    ):
+        return "object"
+
+    if isinstance(obj, (OCP_PartGroup, OCP_Edges, OCP_Faces, OCP_Part, OCP_Vertices)):
+        return "named"
+
+    return None
+
+
 def show_all(
     variables=None,
     exclude=None,
@@ -1624,76 +2119,35 @@ def show_all(
     if exclude is None:
         exclude = []
 
+    excluded = set(exclude) | _IPYTHON_NAMES
+    if classes is not None:
+        classes = tuple(classes)
+
     objects = []
     names = []
     for name, obj in variables.items():
         if (
-            # ignore classes and ipython and jupyter variables
-            isinstance(obj, type)
-            or name in exclude + ["_", "__", "___", "_ih", "_oh", "_dh", "Out", "In"]
+            name in excluded
             or name.startswith("__")
-            or re.search("^_i\\d+", name) is not None
-            or re.search("^_\\d+", name) is not None
+            or _IPYTHON_NAME.match(name) is not None
             # pylint: disable=protected-access
             or (hasattr(obj, "_obj") and obj._obj is None)
             or (hasattr(obj, "_wrapped") and obj._wrapped is None)
-            or callable(obj)
-            or isinstance(obj, (int, float, str, bool, types.ModuleType))
-            or obj is None
-            or isinstance(obj, Enum)
-            or (
-                obj.__class__.__name__ == "_Feature"
-                and obj.__class__.__module__ == "__future__"
-            )
-            or isinstance(obj, Logger)
-            or "cad_viewer_widget.widget" in str(obj.__class__)
         ):
             continue
 
-        if classes is None or isinstance(obj, tuple(classes)):
-            if (
-                (
-                    hasattr(obj, "wrapped")
-                    and (
-                        is_topods_shape(obj.wrapped)
-                        or is_topods_compound(obj.wrapped)
-                        or is_toploc_location(obj.wrapped)
-                    )
-                )
-                or is_build123d_plane(obj)
-                or is_build123d_location(obj)
-                or is_build123d_plane(obj)
-                or is_build123d_axis(obj)
-                or is_build123d_locationlist(obj)
-                or is_vector(obj)  # Vector
-                or is_cadquery(obj)
-                or is_build123d(obj)
-                or is_cadquery_assembly(obj)
-                or (
-                    hasattr(obj, "wrapped")
-                    and hasattr(obj, "position")
-                    and hasattr(obj, "direction")
-                )
-                or isinstance(obj, (list, tuple, dict))
-            ):
-                objects.append(obj)
-                names.append(name)
+        kind = _show_all_kind(obj)
+        if kind == "ignore":
+            continue
 
-            elif isinstance(
-                obj, (OCP_PartGroup, OCP_Edges, OCP_Faces, OCP_Part, OCP_Vertices)
-            ):
+        if classes is None or isinstance(obj, classes):
+            if kind == "object":
                 objects.append(obj)
-                obj.name = name
                 names.append(name)
 
-            elif is_cadquery_sketch(obj):
-                pg, instances = to_ocpgroup([obj], names=[name])
-                pg.name = name
-                objects.append(instances)
-                names.append(name)
-
-            elif isinstance(obj, OcpWrapper):
+            elif kind == "named":
                 objects.append(obj)
+                obj.name = name
                 names.append(name)
 
             else:
@@ -1713,11 +2167,14 @@ def show_all(
 
     if len(objects) > 0:
         try:
+            # unchanged variables keep their conversion of the last show_all
+            _SHOW_ALL_OBJECTS.assign(objects, names)
             result = show(
                 *objects,
                 names=names,
                 collapse=Collapse.ROOT,
                 _force_in_debug=_visual_debug,
+                _registry=_SHOW_ALL_OBJECTS,
                 **kwargs,
             )
 
@@ -1732,8 +2189,9 @@ def show_all(
         show_clear()
 
 
-def save_screenshot(filename, port=None, polling=True, progress_only=False):
-    """Save a screenshot of the current view"""
+def _screenshot_command(filename):
+    """The screenshot command for filename and the modification time of the
+    file before the screenshot"""
     if not filename.startswith(os.sep):
         prefix = pathlib.Path(".").absolute()
         full_path = str(prefix / filename)
@@ -1741,20 +2199,31 @@ def save_screenshot(filename, port=None, polling=True, progress_only=False):
         full_path = filename
     p = pathlib.Path(full_path)
     mtime = p.stat().st_mtime if p.exists() else 0
+    return {"type": "screenshot", "filename": f"{full_path}"}, mtime
+
 
-    send_command({"type": "screenshot", "filename": f"{full_path}"}, port=port)
+def _screenshot_polls(command, mtime, progress_only):
+    """Yield the seconds to wait until the viewer saved the screenshot of
+    command, at most 2 seconds in total"""
+    full_path = command["filename"]
+    p = pathlib.Path(full_path)
+    for _ in range(20):
+        if p.exists() and p.stat().st_mtime > mtime:
+            if progress_only:
+                print(".", end="")
+            else:
+                print("Screenshot saved to ", full_path)
+            return
+        yield 0.1
+
+    print("Warning: Screenshot not found in 2 seconds, aborting")
+
+
+def save_screenshot(filename, port=None, polling=True, progress_only=False):
+    """Save a screenshot of the current view"""
+    command, mtime = _screenshot_command(filename)
+    send_command(command, port=port)
 
     if polling:
-        done = False
-        for i in range(20):
-            if p.exists() and p.stat().st_mtime > mtime:
-                if progress_only:
-                    print(".", end="")
-                else:
-                    print("Screenshot saved to ", full_path)
-                done = True
-                break
-            time.sleep(0.1)
-
-        if not done:
-            print("Warning: Screenshot not found in 2 seconds, aborting")
+        for delay in _screenshot_polls(command, mtime, progress_only):
+            time.sleep(delay)
@@ -17,19 +17,35 @@ import atexit
 import base64
 import logging
 import orjson
+import os
 import shutil
 import socket
 import sys
+import threading
 import time
 import yaml
 from pathlib import Path
 from flask import Flask, render_template, request, redirect
 from flask_sock import Sock
 from flask import cli
-from ocp_vscode.comms import MessageType
+from werkzeug.serving import make_server
+from ocp_vscode.comms import (
+    HAS_ZSTD,
+    Defragmenter,
+    MessageType,
+    decompress,
+    from_shared_memory,
+    parse_fragment,
+    port_check,
+)
 from ocp_vscode.backend import ViewerBackend
 from ocp_vscode.backend_logo import logo
-from ocp_vscode.state import add_port, del_port
+from ocp_vscode.state import (
+    add_port,
+    del_port,
+    release_shared_memory,
+    shared_memory_prefix,
+)
 from ocp_vscode.standalone_defaults import DEFAULTS
 import pyperclip
 
@@ -50,11 +66,14 @@ STATIC = """
 """
 
 PORT = 0
+UNIX_SOCKET = None
 
 
 def cleanup():
     print(f"Cleaning up with port {PORT}...")
     del_port(PORT)
+    if UNIX_SOCKET is not None:
+        release_shared_memory(UNIX_SOCKET)
 
 
 atexit.register(cleanup)
@@ -207,6 +226,7 @@ class Viewer:
         self.host = params.get("host", "127.0.0.1")
         self.port = params.get("port", 3939)
         self.max_reconnect_attempts = params.get("max_reconnect_attempts", None)
+        self.unix_socket = params.get("unix_socket")
 
         self.last_changes = {}
         self.last_config = {}
@@ -225,6 +245,9 @@ class Viewer:
         self.python_client = None
         self.javascript_client = None
         self.splash = True
+        # python clients that mirror config and status, see comms.ViewerMirror
+        self.subscribers = set()
+        self.subscribers_lock = threading.Lock()
 
         self.sock.route("/")(self.handle_message)
         self.app.add_url_rule("/viewer", "viewer", self.index)
@@ -272,6 +295,8 @@ class Viewer:
                 self.port = v
             elif k == "host":
                 self.host = v
+            elif k == "unix_socket":
+                self.unix_socket = v
             elif k not in ["create_configfile"]:
                 if v != local_config.get(k):
                     if k == "grid_xy":
@@ -309,6 +334,9 @@ class Viewer:
         ):
             self.config["modifier_keys"]["alt"] = "altKey"
 
+        # the compression codecs of the messages the viewer decodes
+        self.config["_codecs"] = ["zlib", "zstd"] if HAS_ZSTD else ["zlib"]
+
         diff_config = Viewer._dict_diff(self.last_config, self.config)
         if len(diff_config) > 0:
             self.debug_print("\nConfig:", self.config)
@@ -330,10 +358,38 @@ class Viewer:
 
         print(f"Info: OCP CAD Viewer runs at http://{self.host}:{self.port}")
 
+        if self.unix_socket is not None:
+            self.start_unix_server()
+
         self.app.run(
             port=self.port, host=self.host, debug=self.debug, use_reloader=False
         )
 
+    def start_unix_server(self):
+        """Serve the websocket also on a unix domain socket for local Python clients"""
+        global UNIX_SOCKET
+        path = UNIX_SOCKET = self.unix_socket
+        if os.path.exists(path):
+            if port_check(path):
+                print(
+                    f"Unix socket {path} is already in use. "
+                    "Please choose a different path or stop the other viewer."
+                )
+                sys.exit(1)
+            # left over from a viewer that was killed
+            os.unlink(path)
+
+        server = make_server(f"unix://{path}", 0, self.app, threaded=True)
+
+        def remove_socket():
+            if os.path.exists(path):
+                os.unlink(path)
+
+        atexit.register(remove_socket)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        print(f"Info: OCP CAD Viewer listens on unix socket {path}")
+
     def index(self):
         # The browser will connect with an ip/hostname that is reachable from remote.
         # Use this ip/hostname for the websocket connection
@@ -342,7 +398,9 @@ class Viewer:
             "viewer.html",
             standalone_scripts=SCRIPTS,
             standalone_imports=STATIC,
-            standalone_comms=COMMS(address, port, max_retries=self.max_reconnect_attempts),
+            standalone_comms=COMMS(
+                address, port, max_retries=self.max_reconnect_attempts
+            ),
             standalone_init=INIT,
             styleSrc=CSS,
             scriptSrc=JS,
@@ -355,10 +413,117 @@ class Viewer:
             "\nNo browser registered. Please open the viewer in a browser or refresh the viewer page\n"
         )
 
+    def subscribe(self, ws):
+        """Send config and status to a python client and push all status changes"""
+        self.configure(self.params)
+        self.config["_splash"] = self.splash
+        ws.send(
+            orjson.dumps(
+                {"command": "mirror", "config": self.config, "status": self.status}
+            )
+        )
+        with self.subscribers_lock:
+            self.subscribers.add(ws)
+
+    def push_status(self):
+        """Push the status to all subscribed python clients"""
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        if not subscribers:
+            return
+        message = orjson.dumps(
+            {"command": "mirror", "status": self.status, "splash": self.splash}
+        )
+        for ws in subscribers:
+            try:
+                ws.send(message)
+            except Exception:  # pylint: disable=broad-except
+                with self.subscribers_lock:
+                    self.subscribers.discard(ws)
+
+    def forward_fragment(self, ws, data):
+        """Forward a fragment of a model or backend response to the viewer, which
+        reassembles it. Returns False for fragments that need to be reassembled
+        here."""
+        typ, _, seq, count, _ = parse_fragment(data)
+        if typ not in ("D", "X", "R"):
+            return False
+
+        self.python_client = ws
+        if self.javascript_client is None:
+            if seq == 0:
+                self.not_registered()
+            return True
+
+        self.javascript_client.send(data)
+        if seq + 1 == count:
+            self.debug_print(f"[{typ}] Forwarded a message in {count} fragments")
+            if typ != "R" and self.splash:
+                self.splash = False
+        return True
+
+    def shared_memory_prefixes(self):
+        """Name prefixes of the shared memory segments local clients send"""
+        return tuple(
+            shared_memory_prefix(port)
+            for port in (self.port, self.unix_socket)
+            if port is not None
+        )
+
     def handle_message(self, ws):
+        try:
+            self.receive_messages(ws)
+        finally:
+            # the connection is closed, e.g. a python client that mirrored the status exited
+            with self.subscribers_lock:
+                self.subscribers.discard(ws)
+
+    def receive_messages(self, ws):
+        fragments = Defragmenter()
         while True:
             data = ws.receive()
             if isinstance(data, bytes):
+                if data[:2] == b"F:":
+                    # fragment of a large message
+                    if self.forward_fragment(ws, data):
+                        continue
+                    data = fragments.add(data)
+                    if data is None:
+                        continue
+
+                if data[:2] == b"M:":
+                    # large message of a local client in shared memory
+                    try:
+                        handle = orjson.loads(data[2:])
+                    except orjson.JSONDecodeError as ex:
+                        handle = ex
+                    if not isinstance(handle, dict):
+                        print(f"Cannot read shared memory handle: {handle}")
+                        continue
+                    try:
+                        data = from_shared_memory(handle, self.shared_memory_prefixes())
+                    except Exception as ex:  # pylint: disable=broad-except
+                        print(f"Cannot read shared memory message: {ex}")
+                        if handle.get("type") == "B":
+                            # the client waits for the backend acknowledgement
+                            ws.send(orjson.dumps({"ok": False}))
+                        continue
+
+                if data[:2] == b"Z:":
+                    data = decompress(data)
+
+                if data[:2] == b"X:":
+                    # binary model, forward as is, the viewer decodes the buffers
+                    self.python_client = ws
+                    self.debug_print("[X] Received a new binary model")
+                    if self.javascript_client is None:
+                        self.not_registered()
+                        continue
+                    self.javascript_client.send(data)
+                    if self.splash:
+                        self.splash = False
+                    continue
+
                 data = data.decode("utf-8")
 
             message_type = data[0]
@@ -369,15 +534,17 @@ class Viewer:
                 cmd = orjson.loads(data)
                 if cmd == "status":
                     self.debug_print("Received status command")
-                    self.python_client.send(
-                        orjson.dumps({"command": "status", "text": self.status})
-                    )
+                    ws.send(orjson.dumps({"command": "status", "text": self.status}))
+
+                elif cmd == "subscribe":
+                    self.debug_print(f"[{message_type}] Received subscribe command")
+                    self.subscribe(ws)
 
                 elif cmd == "config":
                     self.debug_print(f"[{message_type}] Received config command")
                     self.configure(self.params)
                     self.config["_splash"] = self.splash
-                    self.python_client.send(orjson.dumps(self.config))
+                    ws.send(orjson.dumps(self.config))
 
                 elif cmd.get("type") == "screenshot":
                     self.debug_print(f"[{message_type}] Received screenshot command")
@@ -437,6 +604,7 @@ class Viewer:
                             pyperclip.copy((",").join(changes.get("selected", [])))
 
                         self.status[key] = value
+                    self.push_status()
                     self.backend.handle_event(changes, MessageType.UPDATES)
 
             elif message_type == "S":
@@ -450,12 +618,16 @@ class Viewer:
 
             elif message_type == "L":
                 self.javascript_client = ws
+                # a new browser page does not know the last scene
+                self.status.pop("scene", None)
+                self.push_status()
                 print("Info: Browser as viewer client registered")
 
             elif message_type == "B":
                 model = orjson.loads(data)["model"]
-                self.backend.handle_event(model, MessageType.DATA)
-                ws.send(orjson.dumps({"ok": True}))
+                # with the shapes the backend holds, see brep.BackendShapes
+                shapes = self.backend.handle_event(model, MessageType.DATA)
+                ws.send(orjson.dumps({"ok": True, **(shapes or {})}))
                 self.debug_print(f"[{message_type}] Model data sent to the backend")
 
             elif message_type == "R":
@@ -17,11 +17,18 @@ import errno
 import json
 import os
 import time
+import zlib
 
 from pathlib import Path
 
 CONFIG_FILE = Path.home() / ".ocpvscode"
 
+# the port cache of the python clients, CONFIG_FILE belongs to the VS Code extension
+PORT_CACHE_FILE = Path.home() / ".ocpvscode_port"
+
+# seconds a validated port is reused by other processes without probing all ports
+PORT_CACHE_TTL = 30
+
 
 class ProperLockfile:
     def __init__(self, filepath, stale_timeout=5):
@@ -109,8 +116,29 @@ def add_port(port):
     return atomic_operation(callback)
 
 
+def shared_memory_prefix(port):
+    """Name prefix of the shared memory segments sent to the viewer on port"""
+    if isinstance(port, int) or str(port).isdigit():
+        return f"ocp_{port}_"
+    # unix domain socket path, keep the name short (macOS allows 31 chars)
+    return f"ocp_{zlib.crc32(str(port).encode()):08x}_"
+
+
+def release_shared_memory(port):
+    """Unlink the shared memory segments the viewer on port did not consume"""
+    shm_dir = Path("/dev/shm")
+    if not shm_dir.is_dir():
+        return
+    for path in shm_dir.glob(f"{shared_memory_prefix(port)}*"):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
 def del_port(port):
-    """Add standalone port to config file"""
+    """Remove standalone port from config file and release its shared memory"""
+    release_shared_memory(port)
 
     def callback(config):
         if config.get("services") is None:
@@ -139,3 +167,32 @@ def get_ports():
             return list(services.keys())
 
     return atomic_operation(callback)
+
+
+def get_cached_port(ttl=PORT_CACHE_TTL):
+    """Get the port validated by any process during the last ttl seconds"""
+    try:
+        with open(PORT_CACHE_FILE, "r") as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (
+        not isinstance(cached, dict)
+        or time.time() - cached.get("time", 0) > ttl
+        or cached.get("port") not in get_ports()
+    ):
+        return None
+    return cached["port"]
+
+
+def set_cached_port(port):
+    """Remember the validated port for other processes"""
+    tmp = PORT_CACHE_FILE.with_name(f"{PORT_CACHE_FILE.name}.{os.getpid()}")
+    try:
+        with open(tmp, "w") as f:
+            json.dump({"port": str(port), "time": time.time()}, f)
+        # readers see the old or the new file, never a partial one
+        os.replace(tmp, PORT_CACHE_FILE)
+    except OSError:
+        pass
@@ -1,6 +1,11 @@
 function handleMessage(message) {
     console.log("Handling message");
-    window.postMessage(message, window.location.origin);
+    if (message instanceof ArrayBuffer) {
+        // binary model, transfer the buffer instead of copying it
+        window.postMessage(message, window.location.origin, [message]);
+    } else {
+        window.postMessage(message, window.location.origin);
+    }
 }
 
 class Comms {
@@ -14,6 +19,7 @@ class Comms {
 
     createWebsocket() {
         this.socket = new WebSocket(`ws://${this.host}:${this.port}`);
+        this.socket.binaryType = "arraybuffer";
         this.ready = false;
         this.retry++;
 
@@ -27,7 +33,11 @@ class Comms {
         };
 
         this.socket.onmessage = (event) => {
-            console.log("Message received from server:", event.data.substring(0, 200) + "...");
+            if (event.data instanceof ArrayBuffer) {
+                console.log(`Binary message received from server: ${event.data.byteLength} bytes`);
+            } else {
+                console.log("Message received from server:", event.data.substring(0, 200) + "...");
+            }
             handleMessage(event.data);
         };
 
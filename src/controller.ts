@@ -16,6 +16,7 @@
 */
 
 import * as os from "os";
+import * as zlib from "zlib";
 import * as vscode from "vscode";
 import { OCPCADViewer } from "./viewer";
 import { template } from "./display";
@@ -36,6 +37,17 @@ interface Message {
     data: string | undefined;
 }
 
+/**
+ * Header of a "F:<type>:<id>:<seq>:<count>:<payload>" fragment of a large message
+ */
+interface Fragment {
+    type: string;
+    id: string;
+    seq: number;
+    count: number;
+    start: number;
+}
+
 export class OCPCADController {
     server: Server | undefined;
     wss: WebSocketServer | undefined;
@@ -48,6 +60,11 @@ export class OCPCADController {
     viewer_message = "{}";
     splash: boolean = true;
     private backendHasRegistered = false;
+    // content hashes of the shapes the backend holds and the BREP formats it
+    // reads, see brep.BackendShapes
+    private backendShapes: Record<string, any> | undefined;
+    // python clients that mirror config and status, see comms.ViewerMirror
+    private subscribers = new Set<WebSocket>();
 
     constructor(
         private context: vscode.ExtensionContext,
@@ -124,6 +141,9 @@ export class OCPCADController {
         c["metalness"] = options.get("metalness");
         c["roughness"] = options.get("roughness");
         c["_splash"] = this.splash;
+        // zstd needs Node.js >= 22.15
+        c["_codecs"] =
+            typeof (zlib as any).zstdDecompressSync === "function" ? ["zlib", "zstd"] : ["zlib"];
         return c;
     }
 
@@ -164,6 +184,7 @@ export class OCPCADController {
                         const msg = message;
                         if (msg.command === "status") {
                             this.viewer_message = message;
+                            this.pushMirror({ status: msg.text, splash: this.splash });
                         } else if (msg.command === "log") {
                             output.debug("Viewer.log: " + (msg.text ? msg.text : ""));
                         } else if (msg.command === "started") {
@@ -198,19 +219,62 @@ export class OCPCADController {
 
             wss.on("connection", (socket) => {
                 // output.info("OCPCADController.connection: Client connected");
+                const fragments = new Map<string, Buffer[]>();
 
                 socket.on("message", (message) => {
                     try {
-                        const raw_data = message.toString();
+                        let buffer = message as Buffer;
+                        if (buffer[0] === 0x46 && buffer[1] === 0x3a) {
+                            // "F:" fragment of a large message
+                            const fragment = this.parseFragment(buffer);
+                            if (this.forwardFragment(socket, buffer, fragment)) {
+                                return;
+                            }
+                            const complete = this.reassemble(fragments, buffer, fragment);
+                            if (complete === undefined) {
+                                return;
+                            }
+                            buffer = complete;
+                        }
+                        if (buffer[0] === 0x5a && buffer[1] === 0x3a) {
+                            // "Z:<codec>:" compressed message
+                            buffer = this.decompress(buffer);
+                        }
+                        if (buffer[0] === 0x58 && buffer[1] === 0x3a) {
+                            // "X:" binary model, the viewer decodes the raw buffers
+                            output.debug("OCPCADController.messages: Received a new binary model");
+                            this.view?.postMessage(
+                                new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+                            );
+                            output.debug("OCPCADController.messages: Posted model to view");
+                            if (this.splash) {
+                                this.splash = false;
+                            }
+                            return;
+                        }
+                        const raw_data = buffer.toString();
                         const messageType = raw_data.substring(0, 1);
                         output.debug(`OCPCADController.messages: message ${messageType} received`);
-                        var data = message.toString().substring(2);
+                        var data = raw_data.substring(2);
                         if (messageType === "C") {
                             var cmd = JSON.parse(data);
                             if (cmd === "status") {
                                 socket.send(JSON.stringify(this.viewer_message));
                             } else if (cmd === "config") {
                                 socket.send(JSON.stringify(this.config()));
+                            } else if (cmd === "subscribe") {
+                                const status =
+                                    typeof this.viewer_message === "string"
+                                        ? {}
+                                        : (this.viewer_message as any).text;
+                                socket.send(
+                                    JSON.stringify({
+                                        command: "mirror",
+                                        config: this.config(),
+                                        status: status
+                                    })
+                                );
+                                this.subscribers.add(socket);
                             } else if (cmd.type === "screenshot") {
                                 this.view?.postMessage(JSON.stringify(cmd));
                             } else if (cmd.type === "set_relative_time") {
@@ -232,12 +296,18 @@ export class OCPCADController {
                             output.debug("OCPCADController.messages: Posted config to view");
                         } else if (messageType === "L") {
                             this.pythonListener = socket;
+                            this.backendShapes = undefined;
                             this.backendHasRegistered = true;
                             output.debug(`OCPCADController.messages: ${data} registered`);
+                        } else if (messageType === "H") {
+                            this.backendShapes = JSON.parse(data);
+                            output.debug(
+                                `OCPCADController.messages: Backend holds ${this.backendShapes?.shapes?.length} shapes`
+                            );
                         } else if (messageType === "B") {
                             if (this.pythonListener !== undefined) {
                                 this.pythonListener.send(data);
-                                socket.send(JSON.stringify({ ok: true }));
+                                socket.send(this.backendAck());
                                 output.debug(
                                     "OCPCADController.messages: Model data sent to the backend"
                                 );
@@ -262,8 +332,10 @@ export class OCPCADController {
                     // );
                     if (this.pythonListener === socket) {
                         this.pythonListener = undefined;
+                        this.backendShapes = undefined;
                         output.debug("Listener deregistered");
                     }
+                    this.subscribers.delete(socket);
                 });
             });
 
@@ -290,6 +362,140 @@ export class OCPCADController {
         });
     }
 
+    /**
+     * Push config and/or status changes to all python clients that mirror them
+     */
+    public pushMirror(changes: Record<string, any>) {
+        if (this.subscribers.size === 0) {
+            return;
+        }
+        const message = JSON.stringify({ command: "mirror", ...changes });
+        for (const socket of this.subscribers) {
+            if (socket.readyState !== WebSocket.OPEN) {
+                this.subscribers.delete(socket);
+                continue;
+            }
+            socket.send(message, (error) => {
+                if (error) {
+                    this.subscribers.delete(socket);
+                }
+            });
+        }
+    }
+
+    /**
+     * Acknowledge a backend message with the shapes and formats the backend reported
+     * last, the python client then only sends the content hash of these shapes. If
+     * the backend rejected the last delta model, the python client sends in full.
+     */
+    private backendAck(): string {
+        if (this.backendShapes === undefined) {
+            return JSON.stringify({ ok: true });
+        }
+        const rejected = this.backendShapes.reason === "unknown_base";
+        return JSON.stringify({
+            ok: !rejected,
+            ...(rejected ? { reason: this.backendShapes.reason } : {}),
+            shapes: this.backendShapes.shapes,
+            formats: this.backendShapes.formats
+        });
+    }
+
+    /**
+     * Parse the header of a "F:<type>:<id>:<seq>:<count>:<payload>" fragment
+     */
+    private parseFragment(buffer: Buffer): Fragment {
+        const fields: string[] = [];
+        let start = 2;
+        for (let i = 0; i < 4; i++) {
+            const end = buffer.indexOf(0x3a, start);
+            fields.push(buffer.subarray(start, end).toString());
+            start = end + 1;
+        }
+        return {
+            type: fields[0],
+            id: fields[1],
+            seq: Number(fields[2]),
+            count: Number(fields[3]),
+            start: start
+        };
+    }
+
+    /**
+     * Forward fragments of models and backend responses to the view and of backend
+     * messages to the python listener as they arrive, so that large messages are
+     * never held in memory here. Returns false for fragments that need to be
+     * reassembled first.
+     */
+    private forwardFragment(socket: WebSocket, buffer: Buffer, fragment: Fragment): boolean {
+        const last = fragment.seq + 1 === fragment.count;
+        if (fragment.type === "D" || fragment.type === "X" || fragment.type === "R") {
+            this.view?.postMessage(
+                new Uint8Array(buffer.buffer, buffer.byteOffset, buffer.byteLength)
+            );
+            if (last) {
+                output.debug(
+                    `OCPCADController.messages: Posted ${fragment.count} fragments to view`
+                );
+                if (fragment.type !== "R" && this.splash) {
+                    this.splash = false;
+                }
+            }
+            return true;
+        } else if (fragment.type === "B") {
+            if (this.pythonListener !== undefined) {
+                this.pythonListener.send(buffer);
+                if (last) {
+                    socket.send(this.backendAck());
+                    output.debug("OCPCADController.messages: Model data sent to the backend");
+                }
+            } else if (last) {
+                socket.send(JSON.stringify({ ok: false, reason: "no_backend" }));
+                output.debug(
+                    "OCPCADController.messages: B-message dropped — no backend listener"
+                );
+            }
+            return true;
+        }
+        return false;
+    }
+
+    /**
+     * Collect the fragments of a message, returns the message when it is complete
+     */
+    private reassemble(
+        fragments: Map<string, Buffer[]>,
+        buffer: Buffer,
+        fragment: Fragment
+    ): Buffer | undefined {
+        const chunks = fragment.seq === 0 ? [] : fragments.get(fragment.id);
+        if (chunks === undefined) {
+            throw new Error(`Fragment ${fragment.seq} of unknown message ${fragment.id}`);
+        }
+        chunks.push(buffer.subarray(fragment.start));
+        if (fragment.seq + 1 < fragment.count) {
+            fragments.set(fragment.id, chunks);
+            return undefined;
+        }
+        fragments.delete(fragment.id);
+        return Buffer.concat(chunks);
+    }
+
+    /**
+     * Decompress a "Z:<codec>:<compressed message>" message
+     */
+    private decompress(buffer: Buffer): Buffer {
+        const separator = buffer.indexOf(0x3a, 2);
+        const codec = buffer.subarray(2, separator).toString();
+        const payload = buffer.subarray(separator + 1);
+        if (codec === "zlib") {
+            return zlib.inflateSync(payload);
+        } else if (codec === "zstd" && typeof (zlib as any).zstdDecompressSync === "function") {
+            return (zlib as any).zstdDecompressSync(payload);
+        }
+        throw new Error(`Unsupported compression codec '${codec}'`);
+    }
+
     /**
      * Starts the python backend server
      */
@@ -290,6 +290,9 @@ export async function activate(context: vscode.ExtensionContext) {
     });
 
     vscode.workspace.onDidChangeConfiguration(async (event: any) => {
+        if (event.affectsConfiguration("OcpCadViewer") && controller?.isStarted()) {
+            controller.pushMirror({ config: controller.config() });
+        }
         let affected = event.affectsConfiguration("python.defaultInterpreterPath");
         if (affected) {
             let pythonPath = await getPythonPath();
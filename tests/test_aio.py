@@ -0,0 +1,177 @@
+"""Tests for the asyncio API in `ocp_vscode.aio` — run against a tiny local
+websocket server instead of a real viewer.
+"""
+
+import asyncio
+import json
+import socket
+import threading
+
+import pytest
+from build123d import Box
+from websockets.sync.server import serve
+
+import ocp_vscode.comms as comms
+from ocp_vscode import save_screenshot
+from ocp_vscode.aio import (
+    CONNECTIONS,
+    AsyncConnectionManager,
+    asave_screenshot,
+    asend_command,
+    aset_viewer_config,
+    ashow,
+    astatus,
+)
+from ocp_vscode.config import Collapse
+from ocp_vscode.metrics import get_metrics, reset_metrics
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class FakeViewer:
+    """Answer status commands and record all other messages."""
+
+    def __init__(self, port):
+        self.connections = 0
+        self.messages = []
+        self.sockets = []
+        self.server = serve(self.handler, "127.0.0.1", port)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def handler(self, ws):
+        self.connections += 1
+        self.sockets.append(ws)
+        for message in ws:
+            message = message.decode() if isinstance(message, bytes) else message
+            self.messages.append(message)
+            if message == 'C:"status"':
+                ws.send(json.dumps({"command": "status", "text": {"collapse": 0}}))
+            elif message == 'C:"config"':
+                ws.send(json.dumps({"theme": "light", "_codecs": ["zlib", "zstd"]}))
+            elif message.startswith('C:{"type":"screenshot"'):
+                with open(json.loads(message[2:])["filename"], "wb") as f:
+                    f.write(b"png")
+            elif message.startswith("B:"):
+                ws.send(json.dumps({"ok": True}))
+            elif message.startswith("C:"):
+                ws.send(message[2:])
+
+    def stop(self):
+        for ws in self.sockets:
+            ws.close()
+        self.server.shutdown()
+        self.thread.join()
+
+
+def _run(coro):
+    """Run coro and close the connections of its event loop afterwards"""
+
+    async def run():
+        try:
+            return await coro
+        finally:
+            await CONNECTIONS.close()
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def port():
+    return _free_port()
+
+
+@pytest.fixture
+def viewer(port, monkeypatch):
+    monkeypatch.delenv("OCP_VSCODE_PYTEST", raising=False)
+    srv = FakeViewer(port)
+    yield srv
+    srv.stop()
+
+
+def test_connection_is_reused(viewer, port):
+    async def run():
+        manager = AsyncConnectionManager()
+        try:
+            results = await asyncio.gather(
+                *[
+                    manager.send("127.0.0.1", port, f'C:"msg {i}"', receive=True)
+                    for i in range(5)
+                ]
+            )
+            assert sorted(results) == sorted(f'"msg {i}"' for i in range(5))
+        finally:
+            await manager.close()
+
+    asyncio.run(run())
+    assert viewer.connections == 1
+
+
+def test_connection_refused(port):
+    async def run():
+        manager = AsyncConnectionManager()
+        await manager.send("127.0.0.1", port, "nobody listening")
+
+    with pytest.raises(OSError):
+        asyncio.run(run())
+
+
+def test_astatus(viewer, port):
+    result = _run(astatus(port=port))
+    assert result == {"collapse": Collapse.ALL}
+
+
+def test_aset_viewer_config(viewer, port):
+    _run(aset_viewer_config(axes=True, collapse=Collapse.LEAVES, port=port))
+
+    assert viewer.messages[-1].startswith("S:")
+    message = json.loads(viewer.messages[-1][2:])
+    assert message["type"] == "ui"
+    assert message["config"]["axes"] is True
+    assert message["config"]["collapse"] == Collapse.LEAVES.value
+
+
+def test_aconfig_keeps_the_codecs_of_the_viewer(viewer, port, monkeypatch):
+    monkeypatch.setattr(comms, "VIEWER_CODECS", {})
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "mirror", False)
+    assert _run(asend_command("config", port=port)) == {"theme": "light"}
+    assert comms.VIEWER_CODECS[port] == ["zlib", "zstd"]
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_save_screenshot(viewer, port, tmp_path, capsys, asynchronous):
+    filename = str(tmp_path / "view.png")
+    if asynchronous:
+        _run(asave_screenshot(filename, port=port))
+    else:
+        save_screenshot(filename, port=port)
+        comms.CONNECTIONS.close()
+    assert capsys.readouterr().out == f"Screenshot saved to  {filename}\n"
+
+
+def test_ashow_sends_the_backend_model(viewer, port):
+    _run(ashow(Box(1, 2, 3), port=port))
+    models = [m for m in viewer.messages if m.startswith("B:")]
+    assert len(models) == 1
+
+
+def test_ashow_tessellates_concurrently():
+    from build123d import Box, Sphere
+
+    reset_metrics()
+
+    async def run():
+        return await asyncio.gather(ashow(Box(1, 2, 3)), ashow(Sphere(1)))
+
+    (box, _), (sphere, _) = asyncio.run(run())
+    assert box[1]["bb"]["zmax"] == pytest.approx(1.5)
+    assert sphere[1]["bb"]["zmax"] == pytest.approx(1.0)
+
+    # every show collects its own metrics, although tessellated in the executor
+    metrics = get_metrics()
+    assert metrics["shows"] == 2
+    assert metrics["histograms"]["tessellate"]["count"] == 2
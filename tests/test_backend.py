@@ -0,0 +1,227 @@
+"""Tests for the model of `ocp_vscode.backend` and its transfer in `ocp_vscode.brep`"""
+
+import orjson
+import pytest
+from build123d import Box, Edge, Face, Pos, Rot, Solid, Sphere, Vertex
+from ocp_tessellate.tessellator import get_edges, get_faces, get_vertices
+
+import ocp_vscode.comms as comms
+from ocp_vscode import brep, clear_tessellation_cache, show
+from ocp_vscode.backend import ViewerBackend
+from ocp_vscode.brep import BackendShapes
+from ocp_vscode.comms import default
+
+PORT = 3939
+
+
+def _transfer(data):
+    return orjson.loads(orjson.dumps(data, default=default))
+
+
+@pytest.fixture(autouse=True)
+def port(monkeypatch):
+    # ViewerBackend sets the global port
+    for name in ("CMD_PORT", "CMD_URL", "INIT_DONE"):
+        monkeypatch.setattr(comms, name, getattr(comms, name))
+    clear_tessellation_cache()
+
+
+@pytest.fixture
+def deserialized(monkeypatch):
+    shapes = []
+
+    def deserialize(buffer):
+        shapes.append(buffer)
+        return brep_deserialize(buffer)
+
+    brep_deserialize = brep.deserialize
+    monkeypatch.setattr(brep, "deserialize", deserialize)
+    return shapes
+
+
+@pytest.fixture
+def backend():
+    backend = ViewerBackend(PORT, workers=0)
+    box = Pos(5, 0, 0) * Rot(0, 0, 45) * Box(1, 2, 3)
+    _, mapping = show(box, names=["box"])
+    backend.load_model(_transfer(mapping))
+    return backend, box
+
+
+def test_sub_shapes_are_resolved_on_demand(backend):
+    backend, box = backend
+    part = backend.parts["/Group/box"]
+    assert part.shape is None and part.maps == {} and part.shapes == {}
+
+    face = backend.get_shape("/Group/box/faces/faces_3")
+    assert list(part.maps) == ["faces"]
+    assert backend.get_shape("/Group/box/faces/faces_3") is face
+
+    expected = list(get_faces(box.wrapped))[3]
+    assert Face(face).center().to_tuple() == pytest.approx(
+        Face(expected).center().to_tuple()
+    )
+    edge = backend.get_shape("/Group/box/edges/edges_11")
+    expected = list(get_edges(box.wrapped))[11]
+    assert Edge(edge).center().to_tuple() == pytest.approx(
+        Edge(expected).center().to_tuple()
+    )
+    vertex = backend.get_shape("/Group/box/vertices/vertices_7")
+    expected = list(get_vertices(box.wrapped))[7]
+    assert Vertex(vertex).to_tuple() == pytest.approx(Vertex(expected).to_tuple())
+    assert backend.get_shape("/Group/box").IsEqual(part.shape)
+
+
+@pytest.mark.parametrize(
+    "shape_id",
+    [
+        "/Group/other/faces/faces_0",
+        "/Group/box/faces/faces_6",
+        "/Group/box/faces/edges_0",
+        "/Group/box/solids/solids_0",
+        "box",
+    ],
+)
+def test_unknown_ids(backend, shape_id):
+    backend, _ = backend
+    with pytest.raises(KeyError):
+        backend.get_shape(shape_id)
+
+
+def test_shapes_are_only_sent_if_the_backend_misses_them(deserialized):
+    backend, shapes = ViewerBackend(PORT, workers=0), BackendShapes()
+    box = Box(1, 2, 3)
+    objs = [box, Pos(3, 0, 0) * box, Pos(0, 5, 0) * Box(2, 2, 2)]
+    _, mapping = show(*objs)
+
+    model, sent = shapes.encode(mapping, PORT)
+    parts = [part["shape"]["obj"] for part in model["parts"]]
+    # both boxes share their TShape, the second one is only referenced
+    assert ["brep" in part for part in parts] == [True, False, True]
+    assert parts[0]["hash"] == parts[1]["hash"]
+    assert sent == {parts[0]["hash"], parts[2]["hash"]}
+
+    ack = backend.load_model(_transfer(model))
+    assert deserialized == []
+    for id_ in backend.parts:
+        backend.get_shape(id_)
+    assert len(deserialized) == 2
+    shapes.acknowledge(PORT, {"ok": True, **ack}, sent)
+
+    objs.append(Pos(0, 0, 5) * Sphere(1))
+    _, mapping = show(*objs)
+    model, _ = shapes.encode(mapping, PORT)
+    assert ["brep" in part["shape"]["obj"] for part in model["parts"]] == [
+        False,
+        False,
+        False,
+        True,
+    ]
+    backend.load_model(_transfer(model))
+    for id_ in backend.parts:
+        backend.get_shape(id_)
+    assert len(deserialized) == 3
+    assert len(backend.parts) == 4
+    face = Face(backend.get_shape("/Group/Solid(2)/faces/faces_0"))
+    assert face.center().X == pytest.approx(2.5)
+
+    # a viewer without content addressing support
+    shapes.acknowledge(PORT, {"ok": True}, sent)
+    model, _ = shapes.encode(mapping, PORT)
+    assert all("brep" in part["shape"]["obj"] for part in model["parts"][2:])
+
+
+def test_placements_of_a_shape_are_serialized_once(monkeypatch):
+    serialized = []
+    serialize = brep.serialize
+    monkeypatch.setattr(
+        brep, "serialize", lambda shape: serialized.append(shape) or serialize(shape)
+    )
+    box = Box(1, 2, 3)
+    objs = [Pos(3 * i, 0, 0) * box for i in range(3)]
+    hashes = [brep.HASHES.get(obj.wrapped)[0] for obj in objs]
+    assert len(set(hashes)) == 3
+
+    # an equal placement built again
+    objs.append(Pos(3, 0, 0) * box)
+    assert [brep.HASHES.get(obj.wrapped) for obj in objs] == [
+        (h, None) for h in hashes + hashes[1:2]
+    ]
+    assert len(serialized) == 3
+
+
+def test_unknown_shapes_are_missing():
+    backend, shapes = ViewerBackend(PORT), BackendShapes()
+    _, mapping = show(Box(1, 1, 1), Pos(3, 0, 0) * Sphere(1), names=["box", "sphere"])
+    shapes.held[PORT] = {brep.HASHES.get(mapping["parts"][0]["shape"]["obj"])[0]}
+
+    model, _ = shapes.encode(mapping, PORT)
+    ack = backend.load_model(_transfer(model))
+    assert list(backend.parts) == ["/Group/sphere"]
+    assert ack["shapes"] == [model["parts"][1]["shape"]["obj"]["hash"]]
+    with pytest.raises(KeyError):
+        backend.get_shape("/Group/box")
+
+
+def test_parts_are_loaded_in_the_background():
+    backend = ViewerBackend(PORT, workers=2)
+    objs = [Pos(3 * i, 0, 0) * Sphere(1) for i in range(4)]
+    _, mapping = show(*objs, names=[f"sphere{i}" for i in range(4)])
+    backend.load_model(_transfer(mapping))
+    assert len(backend.loading) == 4
+
+    # a measurement does not wait for the pool
+    sphere = Solid(backend.get_shape("/Group/sphere3"))
+    assert sphere.center().X == pytest.approx(9)
+
+    for future in backend.loading:
+        future.result()
+    for part in backend.parts.values():
+        assert part.breps is None and list(part.maps) == ["faces", "edges", "vertices"]
+
+
+def test_least_recently_used_shapes_are_evicted():
+    shapes = BackendShapes()
+    _, mapping = show(Box(1, 1, 1), Sphere(1), Pos(3, 0, 0) * Box(1, 2, 3))
+    model, _ = shapes.encode(mapping, PORT)
+    a, b, c = (_transfer(part["shape"]["obj"]) for part in model["parts"])
+
+    store = brep.ShapeStore()
+    for obj in (a, b, c):
+        store.get(obj)
+    store.get({"hash": a["hash"]})
+    store.maxsize = sum(b.size for b in store.shapes.values()) - 1
+    store.evict()
+    assert store.hashes() == [c["hash"], a["hash"]]
+
+
+@pytest.mark.parametrize("compression", ["zlib", "zstd"])
+def test_compressed_breps(compression):
+    if f"bin+{compression}" not in brep.FORMATS:
+        pytest.skip(f"{compression} is not available")
+    backend, shapes = ViewerBackend(PORT), BackendShapes()
+    _, mapping = show(Box(1, 1, 1), Pos(3, 0, 0) * Sphere(1))
+
+    # the backend did not report its formats yet
+    model, sent = shapes.encode(mapping, PORT, compression)
+    assert {part["shape"]["obj"]["format"] for part in model["parts"]} == {"bin"}
+    shapes.acknowledge(PORT, {"ok": True, **backend.load_model(_transfer(model))}, sent)
+
+    backend = ViewerBackend(PORT)
+    shapes.held[PORT] = set()
+    model, _ = shapes.encode(mapping, PORT, compression)
+    objs = [part["shape"]["obj"] for part in model["parts"]]
+    assert {obj["format"] for obj in objs} == {f"bin+{compression}"}
+    backend.load_model(_transfer(model))
+    assert len(backend.parts) == 2
+    sphere = Solid(backend.get_shape("/Group/Solid(2)"))
+    assert sphere.center().X == pytest.approx(3)
+
+
+def test_unknown_formats_are_missing():
+    backend = ViewerBackend(PORT)
+    _, mapping = show(Box(1, 1, 1))
+    model, _ = BackendShapes().encode(mapping, PORT)
+    model["parts"][0]["shape"]["obj"]["format"] = "text"
+    backend.load_model(_transfer(model))
+    assert backend.parts == {}
@@ -0,0 +1,159 @@
+"""Tests for the tessellation cache in `ocp_vscode.cache`"""
+
+import os
+
+import numpy as np
+import ocp_tessellate.convert as oc
+import pytest
+from build123d import Box, Pos, Sphere
+from ocp_tessellate.tessellator import get_size
+
+from ocp_vscode import (
+    clear_tessellation_cache,
+    disable_disk_cache,
+    enable_disk_cache,
+    get_metrics,
+    get_tessellation_cache_stats,
+    set_tessellation_cache_size,
+    show,
+)
+from ocp_vscode.cache import DiskCache, TessellationCache
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    clear_tessellation_cache()
+    yield
+    set_tessellation_cache_size(256)
+    clear_tessellation_cache()
+
+
+def _misses():
+    return get_metrics()["last_show"].get("cache_misses", 0)
+
+
+def test_reshow_only_tessellates_changed_parts():
+    parts = [Pos(3 * i, 0, 0) * Box(1, 1, 1 + i / 10) for i in range(5)]
+    show(*parts)
+    assert _misses() == 5
+
+    show(*parts)
+    assert _misses() == 0
+
+    parts[2] = Pos(6, 0, 0) * Sphere(1)
+    show(*parts)
+    assert _misses() == 1
+    assert get_tessellation_cache_stats()["entries"] == 6
+
+
+def test_cache_is_location_independent():
+    box = Box(1, 2, 3)
+    show(box)
+    show(Pos(10, 0, 0) * box)
+    assert _misses() == 0
+
+    # a new, but equal shape is found by its content
+    show(Box(1, 2, 3))
+    assert _misses() == 0
+
+
+def test_tessellation_parameters_are_part_of_the_key():
+    sphere = Sphere(1)
+    show(sphere)
+    show(sphere, deviation=0.01)
+    assert _misses() == 1
+
+
+def test_lru_eviction():
+    mesh = {"vertices": np.zeros(1000, dtype=np.float32)}
+    shapes = [Box(1, 1, i + 1).wrapped for i in range(3)]
+    params = (0.1, 0.2)
+
+    cache = TessellationCache(maxsize=2.5 * get_size(mesh))
+    cache.put(shapes[0], "a", params, mesh)
+    cache.put(shapes[1], "b", params, mesh)
+    assert cache.get(shapes[0], "a", params) is mesh  # "b" is now the oldest
+    cache.put(shapes[2], "c", params, mesh)
+
+    assert cache.get(shapes[1], "b", params) is None
+    assert cache.get(shapes[0], "other content hash", params) is mesh
+    assert cache.get(shapes[2], "c", (0.01, 0.2)) is None
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["hits"] == 2
+    assert cache.stats()["misses"] == 2
+    assert len(cache.shapes) == 2
+
+
+def test_cache_can_be_switched_off():
+    set_tessellation_cache_size(0)
+    box = Box(1, 1, 1)
+    show(box)
+    show(box)
+    assert _misses() == 1
+    assert get_tessellation_cache_stats()["entries"] == 0
+
+
+def test_disk_cache(tmp_path):
+    enable_disk_cache(tmp_path)
+    try:
+        show(Sphere(1))
+        assert _misses() == 1
+        assert len(list(tmp_path.glob("*.npz"))) == 1
+
+        # a new session only has the disk cache
+        clear_tessellation_cache()
+        result = show(Pos(1, 2, 3) * Sphere(1))
+        assert _misses() == 0
+        assert get_metrics()["last_show"]["disk_cache_hits"] == 1
+        assert get_tessellation_cache_stats()["disk"]["hits"] == 1
+
+        instance = result[0][0][0]
+        assert instance["vertices"].dtype == np.float32
+    finally:
+        disable_disk_cache()
+
+
+def test_disk_cache_eviction(tmp_path):
+    cache = DiskCache(tmp_path, maxsize=14_000)
+    mesh = {"vertices": np.zeros(1000, dtype=np.float32)}
+    for i, key in enumerate(["a", "b", "c"]):
+        cache.put(key, mesh)
+        os.utime(tmp_path / f"{key}.npz", (i, i))
+    assert cache.get("a") is not None  # "b" is now the oldest
+    cache.put("d", mesh)
+
+    assert sorted(f.stem for f in tmp_path.glob("*.npz")) == ["a", "c", "d"]
+    assert cache.get("b") is None
+    np.testing.assert_array_equal(cache.get("d")["vertices"], mesh["vertices"])
+
+
+def test_disk_cache_is_only_scanned_when_full(tmp_path, monkeypatch):
+    cache = DiskCache(tmp_path, maxsize=14_000)
+    cache.evict()
+    scans = []
+    files = cache._files
+    monkeypatch.setattr(cache, "_files", lambda: scans.append(1) or files())
+
+    mesh = {"vertices": np.zeros(1000, dtype=np.float32)}
+    for key in ["a", "b", "c", "b"]:
+        cache.put(key, mesh)
+    assert scans == []
+    assert cache.size == sum(f.stat().st_size for f in tmp_path.glob("*.npz"))
+
+    cache.put("d", mesh)
+    assert scans == [1]
+    assert len(list(tmp_path.glob("*.npz"))) == 3
+
+
+def test_ocp_tessellate_is_only_patched_during_show(monkeypatch):
+    original, seen = oc.tessellate, []
+    tessellate_group = oc.tessellate_group
+
+    def spy(*args, **kwargs):
+        seen.append(oc.tessellate)
+        return tessellate_group(*args, **kwargs)
+
+    monkeypatch.setattr(oc, "tessellate_group", spy)
+    show(Box(1, 2, 3))
+    assert seen and seen[0] is not original
+    assert oc.tessellate is original
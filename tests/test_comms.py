@@ -0,0 +1,441 @@
+"""Tests for the transport layer in `ocp_vscode.comms` — run against a tiny local
+websocket server instead of a real viewer.
+"""
+
+import json
+import os
+import socket
+import struct
+import threading
+import time
+
+import numpy as np
+import pytest
+from websockets.sync.server import serve, unix_serve
+
+import ocp_vscode.comms as comms
+from ocp_vscode.comms import (
+    HAS_ZSTD,
+    ConnectionManager,
+    Defragmenter,
+    Fragments,
+    MessageType,
+    compress,
+    decompress,
+    encode_binary,
+    from_shared_memory,
+    port_check,
+    unix_socket_path,
+)
+from ocp_vscode.state import release_shared_memory, shared_memory_prefix
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class EchoServer:
+    """Echo every message back and count the accepted connections."""
+
+    def __init__(self, port):
+        self.port = port
+        self.connections = 0
+        self.sockets = []
+        self.messages = []
+        path = unix_socket_path(port)
+        if path is None:
+            self.server = serve(self.handler, "127.0.0.1", port)
+        else:
+            self.server = unix_serve(self.handler, path)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def handler(self, ws):
+        self.connections += 1
+        self.sockets.append(ws)
+        for message in ws:
+            self.messages.append(message)
+            ws.send(message)
+
+    def stop(self):
+        for ws in self.sockets:
+            ws.close()
+        self.server.shutdown()
+        self.thread.join()
+
+
+@pytest.fixture
+def port():
+    return _free_port()
+
+
+@pytest.fixture
+def server(port):
+    srv = EchoServer(port)
+    yield srv
+    srv.stop()
+
+
+def test_connection_is_reused(server, port):
+    manager = ConnectionManager()
+    try:
+        for i in range(5):
+            result = manager.send("127.0.0.1", port, f"msg {i}", receive=True)
+            assert result == f"msg {i}"
+        assert server.connections == 1
+    finally:
+        manager.close()
+
+
+def test_reconnect_after_server_restart(port):
+    manager = ConnectionManager()
+    server = EchoServer(port)
+    try:
+        assert manager.send("127.0.0.1", port, "first", receive=True) == "first"
+        server.stop()
+
+        server = EchoServer(port)
+        assert manager.send("127.0.0.1", port, "second", receive=True) == "second"
+        assert server.connections == 1
+    finally:
+        manager.close()
+        server.stop()
+
+
+def test_connection_refused(port):
+    manager = ConnectionManager()
+    with pytest.raises(OSError):
+        manager.send("127.0.0.1", port, "nobody listening")
+
+
+@pytest.mark.parametrize("spec", ["{}", "unix://{}"])
+def test_unix_socket(tmp_path, spec):
+    path = str(tmp_path / "ocp.sock")
+    port = spec.format(path)
+    assert unix_socket_path(port) == path
+    assert not port_check(port)
+
+    server = EchoServer(port)
+    manager = ConnectionManager()
+    try:
+        assert port_check(port)
+        for i in range(3):
+            assert (
+                manager.send("127.0.0.1", port, f"msg {i}", receive=True) == f"msg {i}"
+            )
+        assert server.connections == 1
+    finally:
+        manager.close()
+        server.stop()
+
+
+def _decode_binary(message):
+    """Python version of decodeBinaryMessage in viewer.html"""
+    assert message[:2] == b"X:"
+    header_length = struct.unpack("<I", message[2:6])[0]
+    start = 6 + header_length
+    assert start % 8 == 0
+    header = json.loads(message[6:start])
+
+    def walk(obj):
+        if isinstance(obj, list):
+            return [walk(el) for el in obj]
+        elif isinstance(obj, dict):
+            if obj.get("codec") == "raw":
+                offset, size = header["buffers"][obj["buffer"]]
+                assert offset % 8 == 0
+                return np.frombuffer(
+                    message[start + offset : start + offset + size], dtype=obj["dtype"]
+                )
+            return {k: walk(v) for k, v in obj.items()}
+        return obj
+
+    return header["type"], walk(header["message"])
+
+
+def test_binary_roundtrip():
+    vertices = np.arange(3 * 100_000, dtype=np.float32)  # larger than coalesce size
+    triangles = np.arange(7, dtype=np.uint32)  # not 8 byte aligned
+    normals = np.ones((5, 3), dtype=np.float32)
+    data = {
+        "type": "data",
+        "data": {
+            "instances": [{"vertices": vertices, "triangles": triangles}],
+            "shapes": {"parts": [{"normals": normals, "name": "box"}]},
+        },
+    }
+    chunks = encode_binary("D", data)
+    message = b"".join(bytes(c) for c in chunks)
+    typ, decoded = _decode_binary(message)
+
+    assert typ == "D"
+    assert decoded["type"] == "data"
+    instance = decoded["data"]["instances"][0]
+    np.testing.assert_array_equal(instance["vertices"], vertices)
+    np.testing.assert_array_equal(instance["triangles"], triangles)
+    part = decoded["data"]["shapes"]["parts"][0]
+    np.testing.assert_array_equal(part["normals"], normals.ravel())
+    assert part["name"] == "box"
+
+
+@pytest.mark.parametrize("codec", ["zlib", "zstd"])
+def test_compression_roundtrip(codec):
+    if codec == "zstd" and not HAS_ZSTD:
+        pytest.skip("zstandard not installed")
+
+    message = b'D:{"type":"data"}' * 10_000
+    compressed = b"".join(bytes(c) for c in compress(message, codec))
+    assert compressed.startswith(f"Z:{codec}:".encode())
+    assert len(compressed) < len(message)
+    assert decompress(compressed) == message
+
+    chunks = encode_binary("D", {"vertices": np.zeros(100_000, dtype=np.float32)})
+    compressed = b"".join(bytes(c) for c in compress(chunks, codec))
+    assert decompress(compressed) == b"".join(bytes(c) for c in chunks)
+
+
+def test_zstd_is_only_sent_to_viewers_that_decode_it(monkeypatch):
+    if not HAS_ZSTD:
+        pytest.skip("zstandard not installed")
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "compression", "zstd")
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "compression_threshold", 0)
+    monkeypatch.setattr(comms, "VIEWER_CODECS", {})
+    data = {"type": "data", "vertices": list(range(1000))}
+
+    for codecs, codec in (
+        (None, "zlib"),
+        (["zlib"], "zlib"),
+        (["zlib", "zstd"], "zstd"),
+    ):
+        config = {"theme": "light"} if codecs is None else {"_codecs": codecs}
+        assert "_codecs" not in comms._viewer_config("config", 3939, config)
+        message, _ = comms._encode(data, MessageType.DATA, port=3939)
+        assert bytes(message[0]).startswith(f"Z:{codec}:".encode())
+
+
+def test_shared_memory_roundtrip(monkeypatch):
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "shared_memory", True)
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "shared_memory_threshold", 1000)
+
+    small, _ = comms._encode({"type": "data"}, MessageType.DATA, port=3939)
+    assert small.startswith(b"D:")
+
+    for binary in (False, True):
+        vertices = np.arange(1000.0)
+        data = {"type": "data", "vertices": vertices if binary else vertices.tolist()}
+        monkeypatch.setitem(comms.COMMS_DEFAULTS, "binary", binary)
+        monkeypatch.setitem(comms.COMMS_DEFAULTS, "shared_memory", False)
+        expected, _ = comms._encode(data, MessageType.DATA, port=3939)
+        expected = b"".join(bytes(c) for c in expected) if binary else expected
+
+        monkeypatch.setitem(comms.COMMS_DEFAULTS, "shared_memory", True)
+        handle, size = comms._encode(data, MessageType.DATA, port=3939)
+        assert handle.startswith(b"M:")
+        assert json.loads(handle[2:])["type"] == ("X" if binary else "D")
+        assert size == len(expected)
+        prefixes = [shared_memory_prefix(3939)]
+        assert from_shared_memory(json.loads(handle[2:]), prefixes) == expected
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs /dev/shm")
+def test_foreign_shared_memory_is_not_read():
+    handle = json.loads(comms.to_shared_memory(b"D:{}", 4, 39990)[2:])
+    name = handle["name"]
+    prefixes = [shared_memory_prefix(3939)]
+    for foreign in (handle, {"name": "/" + name, "size": 4}, {"size": 4}):
+        with pytest.raises(ValueError):
+            from_shared_memory(foreign, prefixes)
+    assert os.path.exists(f"/dev/shm/{name}")
+
+    # the size is capped at the segment size, the segment is released anyway
+    prefixes = [shared_memory_prefix(39990)]
+    with pytest.raises(ValueError):
+        from_shared_memory({**handle, "size": 1 << 30}, prefixes)
+    assert not os.path.exists(f"/dev/shm/{name}")
+
+
+def test_unix_socket_segments_use_the_socket_path():
+    handle = json.loads(comms.to_shared_memory(b"D:{}", 4, "unix:///tmp/ocp.sock")[2:])
+    assert (
+        from_shared_memory(handle, [shared_memory_prefix("/tmp/ocp.sock")]) == b"D:{}"
+    )
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="needs /dev/shm")
+def test_unread_shared_memory_is_released():
+    handle = comms.to_shared_memory(b"D:{}", 4, 39990)
+    name = json.loads(handle[2:])["name"]
+    assert os.path.exists(f"/dev/shm/{name}")
+
+    release_shared_memory(39990)
+    assert not os.path.exists(f"/dev/shm/{name}")
+
+
+def test_fragments_roundtrip():
+    chunks = encode_binary("D", {"vertices": np.arange(100_000, dtype=np.float32)})
+    message = b"".join(bytes(c) for c in chunks)
+
+    fragments = Fragments(chunks, len(message), 64 * 1024)
+    sent = list(fragments)
+    assert len(sent) == len(fragments) == -(-len(message) // (64 * 1024))
+    assert all(f.startswith(f"F:X:{fragments.id}:".encode()) for f in sent)
+    assert max(len(f) for f in sent) < 64 * 1024 + 64
+
+    defragmenter = Defragmenter()
+    results = [defragmenter.add(bytes(f)) for f in sent]
+    assert results[:-1] == [None] * (len(sent) - 1)
+    assert results[-1] == message
+    assert defragmenter.messages == {}
+
+    # fragments are created lazily and can be sent again
+    assert [bytes(f) for f in fragments] == [bytes(f) for f in sent]
+
+
+def test_fragments_are_sent_as_messages(port):
+    def handler(ws):
+        defragmenter = Defragmenter()
+        for message in ws:
+            message = defragmenter.add(message)
+            if message is not None:
+                ws.send(f"{len(message)}")
+
+    server = serve(handler, "127.0.0.1", port, max_size=2048)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    manager = ConnectionManager()
+    try:
+        message = b"B:" + b"x" * 10_000
+        fragments = Fragments(message, len(message), 1024)
+        assert manager.send("127.0.0.1", port, fragments, receive=True) == "10002"
+    finally:
+        manager.close()
+        server.shutdown()
+        thread.join()
+
+
+def test_large_messages_are_fragmented(monkeypatch):
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "chunk_size", 1000)
+
+    small, _ = comms._encode({"model": {}}, MessageType.BACKEND)
+    assert small.startswith(b"B:")
+    command, _ = comms._encode("x" * 2000, MessageType.COMMAND)
+    assert command.startswith(b"C:")
+
+    data = {"model": {"vertices": list(range(1000))}}
+    fragments, size = comms._encode(data, MessageType.BACKEND)
+    assert isinstance(fragments, Fragments) and len(fragments) == -(-size // 1000)
+
+
+class ViewerServer(EchoServer):
+    """Answer "config" and "status" like the viewer and push status changes to
+    the subscribers. Count the "config" and "status" round trips."""
+
+    def __init__(self, port, subscribe=True):
+        self.subscribe = subscribe
+        self.config = {"theme": "dark", "_splash": True}
+        self.status = {"scene": "a"}
+        self.commands = []
+        self.subscribers = []
+        super().__init__(port)
+
+    def handler(self, ws):
+        self.sockets.append(ws)
+        for message in ws:
+            command = json.loads(message[2:])
+            if command == "subscribe":
+                if self.subscribe:
+                    self.subscribers.append(ws)
+                    ws.send(
+                        json.dumps(
+                            {
+                                "command": "mirror",
+                                "config": self.config,
+                                "status": self.status,
+                            }
+                        )
+                    )
+                continue
+            self.commands.append(command)
+            if command == "config":
+                ws.send(json.dumps(self.config))
+            elif command == "status":
+                ws.send(json.dumps({"command": "status", "text": self.status}))
+
+    def push(self, status):
+        self.status = status
+        for ws in self.subscribers:
+            ws.send(
+                json.dumps({"command": "mirror", "status": status, "splash": False})
+            )
+
+
+def _wait_for(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def mirrors(monkeypatch):
+    manager = comms.MirrorManager()
+    monkeypatch.setattr(comms, "MIRRORS", manager)
+    monkeypatch.setattr(comms, "CONNECTIONS", ConnectionManager())
+    yield manager
+    manager.close()
+    comms.CONNECTIONS.close()
+
+
+def test_config_and_status_are_mirrored(port, mirrors):
+    server = ViewerServer(port)
+    try:
+        # the first command starts the subscription
+        assert comms.send_command("status", port=port) == {"scene": "a"}
+        _wait_for(lambda: mirrors.get("config", port) is not None)
+
+        server.commands.clear()
+        assert comms.send_command("config", port=port) == server.config
+        assert comms.send_command("status", port=port) == {"scene": "a"}
+        assert server.commands == []
+
+        server.push({"scene": "b"})
+        _wait_for(lambda: comms.send_command("status", port=port) == {"scene": "b"})
+        assert comms.send_command("config", port=port)["_splash"] is False
+        assert server.commands == []
+
+        comms.invalidate_mirror(port)
+        comms.send_command("status", port=port)
+        comms.send_command("status", port=port)
+        assert server.commands == ["status"]
+    finally:
+        server.stop()
+
+
+def test_mirror_can_be_disabled(port, mirrors, monkeypatch):
+    monkeypatch.setitem(comms.COMMS_DEFAULTS, "mirror", False)
+    server = ViewerServer(port)
+    try:
+        for _ in range(3):
+            comms.send_command("config", port=port)
+        assert server.commands == ["config"] * 3
+        assert server.subscribers == []
+    finally:
+        server.stop()
+
+
+def test_viewer_without_subscriptions(port, mirrors, monkeypatch):
+    monkeypatch.setattr(comms, "MIRROR_TIMEOUT", 0.1)
+    server = ViewerServer(port, subscribe=False)
+    try:
+        comms.send_command("config", port=port)
+        mirror = mirrors.get_mirror(comms.get_host(), port)
+        _wait_for(lambda: not mirror.alive)
+
+        assert not mirror.supported
+        comms.send_command("config", port=port)
+        assert server.commands == ["config"] * 2
+        assert mirrors.get_mirror(comms.get_host(), port) is mirror
+    finally:
+        server.stop()
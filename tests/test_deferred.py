@@ -0,0 +1,104 @@
+"""Tests for the deferred backend models in `ocp_vscode.deferred`"""
+
+import pytest
+
+from ocp_vscode import deferred
+from ocp_vscode.deferred import DeferredModels
+
+PORT = 3939
+
+
+class Mirror:
+    def __init__(self):
+        self.supported = True
+        self.tool = None
+        self.listeners = {}
+
+    def active_tool(self):
+        return self.tool
+
+
+class Thread:
+    def __init__(self, target, args, daemon):
+        self.target, self.args = target, args
+
+    def start(self):
+        self.target(*self.args)
+
+
+@pytest.fixture
+def mirror(monkeypatch):
+    mirror = Mirror()
+
+    def listen(port, name, callback):
+        mirror.listeners[name] = callback
+        return mirror
+
+    monkeypatch.setattr(deferred.MIRRORS, "listen", listen)
+    monkeypatch.setattr(deferred.threading, "Thread", Thread)
+    return mirror
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    sent = []
+    monkeypatch.setattr(
+        deferred, "send_model", lambda mapping, port, timeit=False: sent.append(mapping)
+    )
+    monkeypatch.setattr(deferred, "get_comms_default", lambda key: True)
+    return sent
+
+
+def _part(id_, shape="brep"):
+    return {"id": id_, "loc": None, "shape": {"obj": shape}}
+
+
+def _model(scene, *parts):
+    return {"id": "/Group", "parts": list(parts), "scene": scene}
+
+
+def test_models_are_sent_when_a_tool_is_activated(mirror, sent):
+    models = DeferredModels()
+    first = _model("s1", _part("/Group/a"), _part("/Group/b"))
+    models.send(first, PORT)
+    assert sent == []
+
+    # a newer model replaces the pending one
+    second = _model("s2", _part("/Group/a"), _part("/Group/b", "new"))
+    models.send(second, PORT)
+    assert sent == []
+    assert models.pending[PORT] is second
+
+    mirror.listeners["deferred"]({"activeTool": "None"})
+    assert sent == []
+    mirror.listeners["deferred"]({"activeTool": "DistanceMeasurement"})
+    assert sent == [second]
+    assert PORT not in models.pending
+
+    # with an active tool, models are sent right away
+    mirror.tool = "DistanceMeasurement"
+    third = _model("s3", _part("/Group/a"), _part("/Group/b"))
+    models.send(third, PORT)
+    assert sent[-1] is third
+
+
+def test_viewers_without_subscriptions_get_the_model(mirror, sent):
+    models = DeferredModels()
+    models.send(_model("s1", _part("/Group/a")), PORT)
+    mirror.listeners["deferred"](None)
+    assert len(sent) == 1
+
+    mirror.supported = False
+    models.send(_model("s2", _part("/Group/a")), PORT)
+    assert len(sent) == 2
+
+
+def test_pending_models_are_dropped_at_exit(mirror, sent):
+    models = DeferredModels()
+    models.send(_model("s1", _part("/Group/a")), PORT)
+    models.send(_model("s2", _part("/Group/a")), PORT + 1)
+    models.close()
+    # the mirrors end their subscriptions at exit
+    mirror.listeners["deferred"](None)
+    assert sent == []
+    assert models.pending == {}
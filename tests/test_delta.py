@@ -0,0 +1,164 @@
+"""Tests for the delta scene updates in `ocp_vscode.delta`"""
+
+import orjson
+import pytest
+from build123d import Box, Pos, Sphere
+
+import ocp_vscode.comms as comms
+from ocp_vscode import show
+from ocp_vscode.backend import ViewerBackend
+from ocp_vscode.brep import BackendShapes
+from ocp_vscode.comms import default
+from ocp_vscode.delta import SCENES, create_delta, full_scene, keep_full_scene
+
+PORT = 3939
+
+
+@pytest.fixture(autouse=True)
+def scenes(monkeypatch):
+    # ViewerBackend sets the global port
+    for name in ("CMD_PORT", "CMD_URL", "INIT_DONE"):
+        monkeypatch.setattr(comms, name, getattr(comms, name))
+    SCENES.clear()
+    yield
+    SCENES.clear()
+
+
+def _scene(*objs, **kwargs):
+    (instances, shapes, _, _), _ = show(*objs, **kwargs)
+    return instances, shapes
+
+
+def _transfer(mapping):
+    return orjson.loads(orjson.dumps(mapping, default=default))
+
+
+def _parts():
+    return [Box(1, 1, 1), Pos(3, 0, 0) * Sphere(1), Pos(6, 0, 0) * Box(1, 2, 3)]
+
+
+def test_first_scene_is_sent_in_full():
+    instances, shapes = _scene(*_parts())
+    scene, delta, *data = create_delta(PORT, instances, shapes)
+
+    assert delta is None
+    assert data == [instances, shapes]
+    assert SCENES[PORT].id == scene
+
+
+def test_delta_only_contains_changes():
+    names = ["a", "b", "c"]
+    first, _, _, _ = create_delta(PORT, *_scene(*_parts(), names=names))
+
+    box, sphere, _ = _parts()
+    objs = [box, Pos(0, 5, 0) * sphere, Pos(9, 0, 0) * Sphere(2)]
+    instances, shapes = _scene(*objs, names=["a", "b", "d"], colors=["red", None, None])
+    _, delta, instances, shapes = create_delta(PORT, instances, shapes, base=first)
+
+    assert delta == {
+        "base": first,
+        "add": ["/Group/d"],
+        "update": ["/Group/a", "/Group/b"],
+        "remove": ["/Group/c"],
+    }
+    # box and sphere meshes are location independent and kept
+    assert instances[0] == {"keep": 0}
+    assert instances[1] == {"keep": 1}
+    assert "vertices" in instances[2]
+    assert all("keep" not in part for part in shapes["parts"])
+
+
+def test_unchanged_objects_are_stubs():
+    first, _, _, _ = create_delta(PORT, *_scene(*_parts()))
+
+    parts = _parts()
+    parts[1] = Pos(3, 0, 0) * Box(2, 2, 2)
+    _, delta, instances, shapes = create_delta(PORT, *_scene(*parts), base=first)
+
+    assert delta["update"] == ["/Group/Solid(2)"]
+    assert shapes["parts"][0] == {"id": "/Group/Solid", "keep": True, "ref": 0}
+    assert shapes["parts"][2] == {"id": "/Group/Solid(3)", "keep": True, "ref": 2}
+    assert instances[0] == {"keep": 0}
+
+
+def test_unknown_base_sends_full_scene():
+    create_delta(PORT, *_scene(*_parts()))
+    instances, shapes = _scene(*_parts())
+    _, delta, *data = create_delta(PORT, instances, shapes, base="other")
+
+    assert delta is None
+    assert data == [instances, shapes]
+
+
+def test_missing_scene_is_sent_in_full_once():
+    first, _, _, _ = create_delta(PORT, *_scene(*_parts()))
+    instances, shapes = _scene(*_parts())
+    scene, delta, _, _ = create_delta(PORT, instances, shapes, base=first)
+    assert delta is not None
+    keep_full_scene(PORT, scene, lambda: (instances, shapes))
+
+    # the viewer reports a scene it cannot resolve
+    assert full_scene(PORT, first) is None
+    assert full_scene(PORT, scene) == (instances, shapes)
+    assert full_scene(PORT, scene) is None
+
+
+def _mapping(scene, objs):
+    _, mapping = show(*objs)
+    return {**mapping, "scene": scene}
+
+
+def test_backend_applies_delta():
+    backend, shapes = ViewerBackend(PORT, workers=0), BackendShapes()
+    model, sent = shapes.encode(_mapping("s1", _parts()), PORT)
+    assert "base" not in model
+    ack = backend.load_model(_transfer(model))
+    assert shapes.acknowledge(PORT, {"ok": True, **ack}, sent)
+    faces = backend.get_shape("/Group/Solid/faces/faces_0")
+
+    parts = _parts()
+    parts[2] = Pos(6, 0, 0) * Sphere(1)
+    full_mapping = _mapping("s2", parts)
+    model, sent = shapes.encode(full_mapping, PORT)
+    assert model["base"] == "s1"
+    assert model["parts"][0] == {"id": "/Group/Solid", "keep": True}
+    assert model["parts"][1] == {"id": "/Group/Solid(2)", "keep": True}
+    assert "obj" in model["parts"][2]["shape"]
+    ack = backend.load_model(_transfer(model))
+    assert shapes.acknowledge(PORT, {"ok": True, **ack}, sent)
+
+    assert backend.scene == "s2"
+    assert backend.get_shape("/Group/Solid/faces/faces_0") is faces
+
+    expected = ViewerBackend(PORT, workers=0)
+    expected.load_model(_transfer(shapes.encode(full_mapping, PORT + 1)[0]))
+    assert backend.parts.keys() == expected.parts.keys()
+
+
+def test_backend_rejects_delta_of_unknown_scene():
+    backend, shapes = ViewerBackend(PORT, workers=0), BackendShapes()
+    model, sent = shapes.encode(_mapping("s1", _parts()), PORT)
+    shapes.acknowledge(PORT, {"ok": True, **backend.load_model(_transfer(model))}, sent)
+
+    # the backend was restarted and does not know s1
+    backend = ViewerBackend(PORT, workers=0)
+    mapping = _mapping("s2", _parts())
+    model, sent = shapes.encode(mapping, PORT)
+    assert model["base"] == "s1"
+    ack = backend.load_model(_transfer(model))
+    assert ack["ok"] is False and ack["reason"] == "unknown_base"
+    assert backend.scene is None and backend.parts == {}
+    assert not shapes.acknowledge(PORT, ack, sent)
+
+    # the model is sent again in full
+    model, sent = shapes.encode(mapping, PORT)
+    assert "base" not in model
+    ack = backend.load_model(_transfer(model))
+    assert shapes.acknowledge(PORT, {"ok": True, **ack}, sent)
+    assert backend.scene == "s2" and len(backend.parts) == 3
+
+    # a backend without its acknowledgement of the scene, e.g. a new viewer
+    model, sent = shapes.encode(_mapping("s3", _parts()), PORT)
+    assert model["base"] == "s2"
+    assert not shapes.acknowledge(PORT, {"ok": True}, sent)
+    assert "base" not in shapes.encode(_mapping("s3", _parts()), PORT)[0]
@@ -0,0 +1,100 @@
+"""Tests for the geometric instancing in `ocp_vscode.instancing`"""
+
+import copy
+
+import numpy as np
+import pytest
+from build123d import Axis, Box, Cylinder, Face, Plane, Pos, Rot, Solid
+from OCP.BRepBuilderAPI import BRepBuilderAPI_Transform
+
+from ocp_vscode import clear_tessellation_cache, get_metrics, show
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    clear_tessellation_cache()
+    yield
+    clear_tessellation_cache()
+
+
+def _part():
+    # a blind hole off the axes, so that the mirror image is no rotated copy
+    return Box(4, 2, 1) - Pos(1, 0.5, 0.5) * Cylinder(0.3, 0.6)
+
+
+def _baked(shape, location):
+    """A copy of shape with the location applied to its geometry"""
+    transform = BRepBuilderAPI_Transform(
+        shape.wrapped, location.wrapped.Transformation(), True
+    )
+    return Solid(transform.Shape())
+
+
+def _refs(shapes):
+    return [part["shape"]["ref"] for part in shapes["parts"]]
+
+
+def _assert_placed(objs, mapping):
+    for obj, part in zip(objs, mapping["parts"]):
+        shape = Solid(part["shape"]["obj"])
+        if part["loc"] is not None:
+            shape = Solid(shape.wrapped.Moved(part["loc"]))
+        expected, actual = obj.bounding_box(), shape.bounding_box()
+        np.testing.assert_allclose(tuple(actual.min), tuple(expected.min), atol=1e-6)
+        np.testing.assert_allclose(tuple(actual.max), tuple(expected.max), atol=1e-6)
+
+
+def test_identical_shapes_are_instanced():
+    part = _part()
+    objs = [
+        part,
+        copy.deepcopy(part),
+        _baked(part, Pos(10, 0, 0) * Rot(30, 45, 0)),
+        _baked(part, Pos(0, 10, 0) * Rot(0, 0, 90)),
+        Box(4, 2, 1),
+    ]
+    (instances, shapes, _, _), mapping = show(*objs, instancing=True)
+
+    assert len(instances) == 2
+    assert _refs(shapes) == [0, 0, 0, 0, 1]
+    assert get_metrics()["last_show"]["shared_instances"] == 3
+    _assert_placed(objs, mapping)
+
+
+def test_mirrored_shapes_are_not_instanced():
+    part = _part()
+    objs = [part, part.mirror(Plane.YZ), part.rotate(Axis.Z, 90)]
+    (instances, shapes, _, _), _ = show(*objs, instancing=True)
+
+    # the rotated part shares the topology of part
+    assert len(instances) == 2
+    assert _refs(shapes) == [0, 1, 0]
+
+
+def test_instancing_is_opt_in():
+    part = _part()
+    objs = [part, copy.deepcopy(part), part.moved(Pos(5, 0, 0))]
+    (instances, shapes, _, _), _ = show(*objs)
+    # shapes that share their TShape are still instanced
+    assert len(instances) == 2
+    assert _refs(shapes) == [0, 1, 0]
+
+    (instances, _, _, _), _ = show(*objs, instancing=True)
+    assert len(instances) == 1
+
+
+def _bezier(dz):
+    # the interior poles 1,1 and 2,2 have the same weight at the center, so
+    # the corners, the boundary and the center of both faces are the same
+    points = [[(i, j, 0.0) for j in range(4)] for i in range(4)]
+    points[1][1] = (1, 1, dz)
+    points[2][2] = (2, 2, -dz)
+    return Face.make_bezier_surface(points)
+
+
+def test_freeform_faces_are_compared_by_their_geometry():
+    objs = [_bezier(0.5), _bezier(-0.5), Pos(5, 0, 0) * _bezier(0.5)]
+    (instances, shapes, _, _), _ = show(*objs, instancing=True)
+
+    assert len(instances) == 2
+    assert _refs(shapes) == [0, 1, 0]
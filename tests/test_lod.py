@@ -0,0 +1,50 @@
+"""Tests for the levels of detail in `ocp_vscode.lod`"""
+
+import pytest
+from build123d import Box, Pos, Sphere
+
+from ocp_vscode import clear_tessellation_cache, show
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    clear_tessellation_cache()
+    yield
+    clear_tessellation_cache()
+
+
+def _objs():
+    # a small sphere next to a large one, in a scene of 400 units
+    return [Box(1, 2, 3), Pos(200, 0, 0) * Sphere(50), Pos(-200, 0, 0) * Sphere(0.5)]
+
+
+def _triangles(instances):
+    return [len(instance["triangles"]) for instance in instances]
+
+
+def test_small_objects_get_a_coarser_level():
+    objs = _objs()
+    (fine, _, _, _), _ = show(*objs)
+    (instances, _, _, _), _ = show(*objs, lod=True)
+
+    box, large, small = _triangles(instances)
+    # planar shapes keep their mesh, large objects are not coarsened
+    assert box == _triangles(fine)[0]
+    assert large == _triangles(fine)[1]
+    assert small <= _triangles(fine)[2] / 2
+    assert all("lod" not in instance for instance in instances)
+
+
+def test_zoom_keeps_the_finer_mesh():
+    objs = _objs()
+    (fine, _, _, _), _ = show(*objs)
+    (instances, _, _, _), _ = show(*objs, lod=True, zoom=1000)
+    assert _triangles(instances) == _triangles(fine)
+
+
+def test_cached_meshes_are_not_changed():
+    objs = _objs()
+    (fine, _, _, _), _ = show(*objs)
+    show(*objs, lod=True)
+    (instances, _, _, _), _ = show(*objs)
+    assert _triangles(instances) == _triangles(fine)
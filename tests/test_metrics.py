@@ -0,0 +1,63 @@
+"""Tests for the performance metrics in `ocp_vscode.metrics`"""
+
+import json
+
+import pytest
+from build123d import Box, Pos
+
+from ocp_vscode import get_metrics, reset_metrics, set_metrics_file, show
+from ocp_vscode.metrics import METRICS, Histogram
+
+
+@pytest.fixture(autouse=True)
+def metrics():
+    reset_metrics()
+    yield
+    set_metrics_file(None)
+    reset_metrics()
+
+
+def test_histogram():
+    histogram = Histogram(size=10)
+    for value in range(100):
+        histogram.observe(value)
+
+    summary = histogram.summary()
+    assert summary["count"] == 100
+    assert summary["last"] == 99
+    assert summary["min"] == 90
+    assert summary["max"] == 99
+    assert summary["mean"] == pytest.approx(94.5)
+    assert summary["p50"] in (94, 95)
+
+
+def test_show_metrics(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    set_metrics_file(path)
+
+    show(Box(1, 1, 1), Pos(2, 0, 0) * Box(1, 1, 1))
+    show(Box(1, 2, 3))
+
+    metrics = get_metrics()
+    assert metrics["shows"] == 2
+    assert metrics["last_show"]["shapes"] == 1
+    assert metrics["last_show"]["triangles"] == 12
+
+    histograms = metrics["histograms"]
+    for name in ("to_ocpgroup", "tessellate", "bb", "create_data_obj", "show"):
+        assert histograms[name]["count"] == 2
+    assert histograms["shapes"]["max"] == 2
+
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["shapes"] for line in lines] == [2, 1]
+    assert all(line["show"] > 0 for line in lines)
+
+
+def test_record_outside_show():
+    METRICS.record("round_trips")
+    METRICS.record("round_trips")
+
+    metrics = get_metrics(reset=True)
+    assert metrics["shows"] == 0
+    assert metrics["histograms"]["round_trips"]["count"] == 2
+    assert get_metrics()["histograms"] == {}
@@ -0,0 +1,108 @@
+"""Tests for the parallel tessellation in `ocp_vscode.parallel`"""
+
+import sys
+import types
+
+import numpy as np
+import pytest
+from build123d import Box, Cylinder, Pos, Sphere, Torus
+
+from ocp_vscode import clear_tessellation_cache, get_metrics, show
+from ocp_vscode import parallel
+from ocp_vscode.parallel import get_pool, main_is_guarded, shutdown_pool
+
+
+@pytest.fixture(autouse=True)
+def pool():
+    clear_tessellation_cache()
+    yield
+    shutdown_pool()
+    clear_tessellation_cache()
+
+
+def _parts():
+    parts = []
+    for i in range(2):
+        s = 1 + i / 2
+        parts += [Box(s, 2, 3), Sphere(s), Cylinder(s, 2), Torus(2 * s, 0.5)]
+    return [Pos(5 * i, 0, 0) * part for i, part in enumerate(parts)]
+
+
+def _assert_equal(a, b):
+    if isinstance(a, dict):
+        assert a.keys() == b.keys()
+        for key in a:
+            _assert_equal(a[key], b[key])
+    elif isinstance(a, (list, tuple)):
+        assert len(a) == len(b)
+        for x, y in zip(a, b):
+            _assert_equal(x, y)
+    elif isinstance(a, np.ndarray):
+        np.testing.assert_array_equal(a, b)
+    else:
+        assert a == b
+
+
+def test_parallel_equals_serial():
+    (serial, serial_shapes, _, _), _ = show(*_parts(), materials=["steel"] + [None] * 7)
+
+    clear_tessellation_cache()
+    (parallel, shapes, _, _), _ = show(
+        *_parts(), materials=["steel"] + [None] * 7, workers=2
+    )
+
+    assert get_metrics()["last_show"]["cache_misses"] == 8
+    assert "workers" in get_metrics()["last_show"]
+    _assert_equal(parallel, serial)
+    _assert_equal(shapes, serial_shapes)
+
+
+def test_cached_shapes_are_not_sent_to_workers():
+    parts = _parts()
+    show(*parts[:4])
+    show(*parts, workers=2)
+
+    metrics = get_metrics()["last_show"]
+    assert metrics["cache_hits"] == 4
+    assert metrics["cache_misses"] == 4
+
+
+def test_pool_is_kept_warm():
+    show(*_parts(), workers=2)
+    pool = get_pool(2)
+    clear_tessellation_cache()
+    show(*_parts(), workers=2)
+    assert get_pool(2) is pool
+
+
+def _main(monkeypatch, tmp_path, source):
+    main = types.ModuleType("__main__")
+    if source is not None:
+        main.__file__ = str(tmp_path / "script.py")
+        (tmp_path / "script.py").write_text(source)
+    monkeypatch.setitem(sys.modules, "__main__", main)
+
+
+@pytest.mark.parametrize(
+    "source, guarded",
+    [
+        ('show(box)\nif __name__ == "__main__":\n    main()\n', True),
+        ("if '__main__' == __name__:\n    main()\n", True),
+        ("show(box)\n", False),
+        ('def f():\n    if __name__ == "__main__":\n        pass\n', False),
+        (None, True),
+    ],
+)
+def test_main_guard(monkeypatch, tmp_path, source, guarded):
+    _main(monkeypatch, tmp_path, source)
+    assert main_is_guarded() is guarded
+
+
+def test_unguarded_scripts_are_tessellated_in_process(monkeypatch, tmp_path, capsys):
+    _main(monkeypatch, tmp_path, "show(box)\n")
+    monkeypatch.setattr(parallel, "_WARNED", False)
+    (instances, _, _, _), _ = show(*_parts(), workers=2)
+
+    assert len(instances) == 8
+    assert parallel._POOL is None
+    assert "guard" in capsys.readouterr().out
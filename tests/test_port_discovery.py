@@ -0,0 +1,93 @@
+"""Tests for port discovery in `comms.find_and_set_port` and the port registry
+in `ocp_vscode.state` — run against a temporary registry file and plain
+listening sockets instead of real viewers.
+"""
+
+import json
+import socket
+import time
+
+import pytest
+
+import ocp_vscode.comms as comms
+import ocp_vscode.state as state
+
+
+def _listening_socket():
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.bind(("127.0.0.1", 0))
+    s.listen()
+    return s
+
+
+def _dead_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture(autouse=True)
+def registry(tmp_path, monkeypatch):
+    """Use a temporary ~/.ocpvscode and restore the comms port globals"""
+    config_file = tmp_path / ".ocpvscode"
+    monkeypatch.setattr(state, "CONFIG_FILE", config_file)
+    monkeypatch.setattr(state, "PORT_CACHE_FILE", tmp_path / ".ocpvscode_port")
+    monkeypatch.delenv("OCP_PORT", raising=False)
+
+    saved = (comms.INIT_DONE, comms.CMD_PORT, comms.CMD_URL)
+    comms.CMD_URL = "ws://127.0.0.1"
+    yield config_file
+    comms.INIT_DONE, comms.CMD_PORT, comms.CMD_URL = saved
+
+
+def _services(config_file):
+    return json.loads(config_file.read_text())["services"]
+
+
+def test_dead_ports_are_skipped(registry):
+    with _listening_socket() as live:
+        live_port = live.getsockname()[1]
+        dead = [_dead_port() for _ in range(3)]
+        for port in dead + [live_port]:
+            state.add_port(port)
+
+        comms.find_and_set_port()
+
+        assert int(comms.CMD_PORT) == live_port
+        # the services belong to the extension, a failed probe does not remove them
+        assert list(_services(registry).keys()) == [str(p) for p in dead + [live_port]]
+        assert "cached_port" not in json.loads(registry.read_text())
+
+
+def test_validated_port_is_cached(registry, monkeypatch):
+    with _listening_socket() as s1, _listening_socket() as s2:
+        port1, port2 = s1.getsockname()[1], s2.getsockname()[1]
+        state.add_port(port1)
+        state.add_port(port2)
+        state.set_cached_port(port2)
+
+        # two viewers, but the cached port avoids asking the user
+        monkeypatch.setattr(comms, "get_ports", lambda: pytest.fail("probed"))
+        comms.find_and_set_port()
+
+        assert comms.CMD_PORT == port2
+
+
+def test_cached_port_expires(registry):
+    state.add_port(1234)
+    state.set_cached_port(1234)
+    assert state.get_cached_port() == "1234"
+
+    cached = json.loads(state.PORT_CACHE_FILE.read_text())
+    cached["time"] = time.time() - state.PORT_CACHE_TTL - 1
+    state.PORT_CACHE_FILE.write_text(json.dumps(cached))
+    assert state.get_cached_port() is None
+
+
+def test_cached_port_removed_with_registry_entry(registry):
+    state.add_port(1234)
+    state.set_cached_port(1234)
+    state.del_port(1234)
+
+    assert state.get_cached_port() is None
+    assert _services(registry) == {}
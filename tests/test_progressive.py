@@ -0,0 +1,132 @@
+"""Tests for the progressive shows in `ocp_vscode.progressive`"""
+
+import sys
+
+import numpy as np
+import pytest
+from build123d import Edge, Pos, Sphere
+from OCP.BRep import BRep_Tool
+from OCP.TopLoc import TopLoc_Location
+
+from ocp_vscode import clear_tessellation_cache, show
+from ocp_vscode.delta import SCENES
+from ocp_vscode.progressive import (
+    Refinement,
+    cancel_refinement,
+    schedule_refinement,
+    start_refinement,
+)
+
+# ocp_vscode.show is shadowed by the show function
+show_module = sys.modules["ocp_vscode.show"]
+
+PORT = 3939
+
+
+@pytest.fixture(autouse=True)
+def scenes():
+    clear_tessellation_cache()
+    SCENES.clear()
+    yield
+    cancel_refinement(PORT)
+    SCENES.clear()
+
+
+def _objs():
+    spheres = [Pos(4 * i, 0, 0) * Sphere(1 + i / 2) for i in range(4)]
+    return spheres + [Edge.make_circle(20)]
+
+
+def _refine(objs, messages):
+    result = show_module._convert(
+        *objs, progressive=True, send_batch=lambda m, _: messages.append(m)
+    )
+    refinement = start_refinement(PORT)
+    refinement.join()
+    return result, refinement
+
+
+def _triangles(instances):
+    return [len(instance["triangles"]) for instance in instances]
+
+
+def test_coarse_first_then_refined():
+    objs = _objs()
+    messages = []
+    ((coarse, _, _, _), _), refinement = _refine(objs, messages)
+    (fine, shapes, _, _), _ = show(*objs)
+
+    assert all(c < f for c, f in zip(_triangles(coarse), _triangles(fine)))
+    # 4 spheres in batches of 1, 2 and 1, the circle last
+    assert len(messages) == 4
+    assert all(m["config"]["reset_camera"] == "keep" for m in messages)
+    assert "states" not in messages[0]["config"]
+
+    for instance, expected in zip(refinement.instances, fine):
+        np.testing.assert_array_equal(instance["vertices"], expected["vertices"])
+    circle = refinement.shapes["parts"][-1]["shape"]["edges"]
+    np.testing.assert_array_equal(circle, shapes["parts"][-1]["shape"]["edges"])
+
+
+def _refined(message, coarse):
+    """Indexes of the refined instances of a message"""
+    return [
+        i
+        for i, instance in enumerate(message["data"]["instances"])
+        if instance["triangles"]["shape"][0] != len(coarse[i]["triangles"])
+    ]
+
+
+def test_largest_objects_are_refined_first():
+    messages = []
+    ((coarse, _, _, _), _), _ = _refine(_objs(), messages)
+    assert _refined(messages[0], coarse) == [3]
+    assert _refined(messages[1], coarse) == [1, 2, 3]
+
+
+def test_refinement_is_sent_as_delta_of_the_same_scene(monkeypatch):
+    monkeypatch.setattr(show_module, "is_pytest", lambda: False)
+    messages = []
+    (message, mapping), _ = _refine(_objs(), messages)
+
+    scene = message["scene"]
+    assert mapping["scene"] == scene
+    assert SCENES[PORT].id == scene
+    for refined in messages:
+        assert refined["scene"] == scene
+        assert refined["delta"]["base"] == scene
+
+    # the largest sphere was sent with the first batch and is kept afterwards
+    assert "vertices" in messages[0]["data"]["instances"][3]
+    assert messages[1]["data"]["instances"][3] == {"keep": 3}
+    assert messages[0]["data"]["instances"][0] == {"keep": 0}
+
+
+def test_cancelled_refinement_sends_nothing():
+    messages = []
+
+    def send(instances, shapes):
+        messages.append(shapes)
+
+    def batches():
+        yield {}, {}
+        cancel_refinement(PORT)
+        yield {}, {}
+
+    schedule_refinement(PORT, Refinement([], {"parts": []}, batches(), send))
+    start_refinement(PORT).join()
+    assert len(messages) == 1
+
+    schedule_refinement(PORT, Refinement([], {"parts": []}, batches(), send))
+    cancel_refinement(PORT)
+    assert start_refinement(PORT) is None
+
+
+def test_refinement_meshes_copies_of_the_shapes():
+    objs = _objs()
+    _refine(objs, [])
+    # neither the coarse pass nor the refinement left a triangulation on the
+    # shapes of the user
+    for sphere in objs[:4]:
+        for face in sphere.faces():
+            assert BRep_Tool.Triangulation_s(face.wrapped, TopLoc_Location()) is None
@@ -0,0 +1,127 @@
+"""Tests for the object registry of show_object and push_object in `ocp_vscode.registry`"""
+
+import json
+
+import pytest
+from build123d import Box, Compound, Cylinder, Location, Pos, Sphere
+
+from ocp_vscode import (
+    clear_tessellation_cache,
+    push_object,
+    registry,
+    remove_object,
+    reset_show,
+    show,
+    show_object,
+    show_objects,
+)
+
+
+@pytest.fixture(autouse=True)
+def objects():
+    clear_tessellation_cache()
+    reset_show()
+    yield
+    reset_show()
+
+
+@pytest.fixture
+def conversions(monkeypatch):
+    converted = []
+
+    class Converter(registry.OcpConverter):
+        def to_ocp(self, *cad_objs, **kwargs):
+            converted.extend(kwargs["names"])
+            return super().to_ocp(*cad_objs, **kwargs)
+
+    monkeypatch.setattr(registry, "OcpConverter", Converter)
+    return converted
+
+
+def _objs():
+    return [Pos(3 * i, 0, 0) * Sphere(1) for i in range(3)] + [
+        Box(1, 2, 3),
+        Pos(0, 5, 0) * Cylinder(1, 2),
+    ]
+
+
+def _json(shapes):
+    return json.dumps(shapes, default=lambda _: None, sort_keys=True)
+
+
+def test_show_object_equals_show():
+    objs = _objs()
+    names = ["a", "b", None, "a", "c"]
+    for obj, name in zip(objs, names):
+        result = show_object(obj, name=name)
+    (instances, shapes, _, _), _ = result
+
+    (expected_instances, expected, _, _), _ = show(*objs, names=names)
+    assert len(instances) == len(expected_instances) == 5
+    assert _json(shapes) == _json(expected)
+    assert [part["name"] for part in shapes["parts"]] == [
+        "a",
+        "b",
+        "Solid",
+        "a(2)",
+        "c",
+    ]
+
+
+def test_only_new_and_changed_objects_are_converted(conversions):
+    box = Box(1, 2, 3)
+    for i, obj in enumerate(_objs()):
+        show_object(obj, name=f"obj{i}")
+    show_object(box, name="box")
+    assert conversions == [f"obj{i}" for i in range(5)] + ["box"]
+
+    conversions.clear()
+    show_object(Sphere(2), name="sphere", options={"color": "red"})
+    assert conversions == ["sphere"]
+
+    conversions.clear()
+    box.locate(Location((0, 0, 10)))
+    show_objects()
+    assert conversions == ["box"]
+
+
+def test_changed_children_of_an_assembly_are_converted(conversions):
+    box, sphere = Box(1, 1, 1), Pos(3, 0, 0) * Sphere(1)
+    box.label, sphere.label = "box", "sphere"
+    show_object(Compound(children=[box, sphere]), name="assembly")
+    conversions.clear()
+
+    sphere.location = Location((0, 5, 0))
+    sphere.color = "red"
+    (_, shapes, _, _), _ = show_objects()
+    assert conversions == ["assembly", "box", "sphere"]
+    part = shapes["parts"][1]
+    assert part["loc"][0] == pytest.approx((0, 5, 0))
+    assert part["color"] == "#ff0000"
+
+    conversions.clear()
+    show_objects()
+    assert conversions == []
+
+
+def test_update_and_remove():
+    objs = _objs()
+    for i, obj in enumerate(objs[:3]):
+        push_object(obj, name=f"obj{i}")
+
+    push_object(objs[3], name="obj0", update=True)
+    (_, shapes, _, _), _ = show_objects()
+    assert [part["name"] for part in shapes["parts"]] == ["obj0", "obj1", "obj2"]
+    assert shapes["parts"][0]["subtype"] == "solid"
+
+    # show_object moves the updated object to the end
+    (_, shapes, _, _), _ = show_object(objs[4], name="obj1", update=True)
+    assert [part["name"] for part in shapes["parts"]] == ["obj0", "obj2", "obj1"]
+
+    remove_object("obj2")
+    remove_object("unknown")
+    (_, shapes, _, _), _ = show_objects()
+    assert [part["name"] for part in shapes["parts"]] == ["obj0", "obj1"]
+
+    with pytest.raises(ValueError):
+        push_object(objs[0], name="unknown", update=True)
@@ -1,10 +1,12 @@
 # %%
 import pytest
+import sys
 import threading
 import unittest
 
 from build123d import *
 from ocp_vscode import show, show_all
+from ocp_vscode.show import _convert, _show_all_kind
 import build123d as bd
 import ocp_tessellate as ot
 
@@ -395,6 +397,46 @@ class ShowAllTests(Tests):
         self.assertEqual(len(self.mapping["parts"]), 7)
         self.assertEqual(len(self.mapping["parts"][5]["parts"]), 25)
 
+    def test_show_cadquery_sketch(self):
+        cq = pytest.importorskip("cadquery")
+        sketch = cq.Sketch().rect(1, 2).vertices().fillet(0.2)
+
+        r = show_all()
+
+        self.get(r)
+        self.assertEqual(len(self.instances), 1)
+        self.assertPartsElementsEqual("id", ["/sketch/Face", "/sketch/Selection"])
+
+    def test_unchanged_variables_keep_their_conversion(self):
+        box = Box(1, 2, 3)
+        cyl = Cylinder(0.3, 4)
+        show_all()
+        converted = _show_all_conversions()
+
+        cyl = Cylinder(0.5, 4)
+        r = show_all(exclude=["converted"])
+
+        self.get(r)
+        self.assertPartsElementsEqual("id", ["/Group/box", "/Group/cyl"])
+        self.assertIs(_show_all_conversions()["box"], converted["box"])
+        self.assertIsNot(_show_all_conversions()["cyl"], converted["cyl"])
+
+    def test_kinds_depend_on_the_attributes_of_an_object(self):
+        class Holder:
+            pass
+
+        plain, sketch = Holder(), Holder()
+        sketch._faces, sketch._edges, sketch._selection = None, None, None
+
+        self.assertIsNone(_show_all_kind(plain))
+        self.assertEqual(_show_all_kind(sketch), "object")
+        self.assertEqual(_show_all_kind(Holder), "ignore")
+
+
+def _show_all_conversions():
+    registry = sys.modules["ocp_vscode.show"]._SHOW_ALL_OBJECTS
+    return {entry.name: entry.converted for entry in registry.entries.values()}
+
 
 class SimpleShowTests(Tests):
     def test_show_part(self):
@@ -530,3 +572,54 @@ class ConfigTests(Tests):
         self.assertEqual(self.parts[2]["color"], "#ff8000")
         self.assertEqual(self.parts[3]["color"], "#0080ff")
         self.assertEqual(self.parts[4]["color"], "#40ff80")
+
+
+class StreamTests(Tests):
+    def _leaves(self, shapes):
+        result = []
+        for part in shapes["parts"]:
+            if "parts" in part:
+                result.extend(self._leaves(part))
+            else:
+                result.append(part)
+        return result
+
+    def test_stream_batches(self):
+        box = Box(1, 1, 1)
+        boxes = [Pos(2 * i, 0, 0) * box for i in range(6)]
+        objs = (boxes, Sphere(1), Cylinder(1, 2))
+
+        self.get(show(*objs))
+        expected = self._leaves(self.shapes)
+        expected_instances = self.instances
+        expected_bb = self.shapes["bb"]
+
+        batches = []
+        self.get(_convert(*objs, stream=1, send_batch=lambda m, _: batches.append(m)))
+
+        # 8 leaves in batches of 1, 2, 4 and the remaining 1 as final message
+        self.assertListEqual(
+            [b["stream"] for b in batches],
+            [{"batch": i, "final": False} for i in range(3)],
+        )
+        self.assertEqual(batches[1]["config"]["reset_camera"], "keep")
+        self.assertEqual(self.result[0][2]["reset_camera"], "keep")
+
+        # the box is shared and only sent once
+        instances = [i for b in batches for i in b["data"]["instances"]]
+        instances += self.instances
+        self.assertEqual(len(instances), len(expected_instances))
+
+        leaves = [leaf for b in batches for leaf in self._leaves(b["data"]["shapes"])]
+        leaves += self._leaves(self.shapes)
+        self.assertListEqual([p["id"] for p in leaves], [p["id"] for p in expected])
+        for leaf, exp in zip(leaves, expected):
+            vertices = instances[leaf["shape"]["ref"]]["vertices"]
+            shape = vertices["shape"] if isinstance(vertices, dict) else vertices.shape
+            self.assertEqual(
+                list(shape),
+                list(expected_instances[exp["shape"]["ref"]]["vertices"].shape),
+            )
+
+        self.assertBboxEqual(expected_bb)
+        self.assertEqual(len(self._leaves(self.mapping)), len(expected))
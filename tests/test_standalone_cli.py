@@ -12,9 +12,11 @@ import sys
 import time
 
 import pytest
+from simple_websocket import ConnectionClosed
 
 from ocp_vscode import set_port, workspace_config
 from ocp_vscode.comms import port_check
+from ocp_vscode.standalone import Viewer
 from ocp_vscode.state import del_port
 
 
@@ -83,8 +85,11 @@ def standalone():
 
     def start(*cli_args):
         cmd = [
-            sys.executable, "-m", "ocp_vscode",
-            "--port", str(STANDALONE_PORT),
+            sys.executable,
+            "-m",
+            "ocp_vscode",
+            "--port",
+            str(STANDALONE_PORT),
             *cli_args,
         ]
         env = dict(os.environ)
@@ -117,13 +122,20 @@ def test_passthrough_flags(standalone):
         "--axes",
         "--axes0",
         "--grid_xy",
-        "--theme", "dark",
-        "--tree_width", "300",
-        "--ticks", "12",
-        "--rotate_speed", "2.0",
-        "--zoom_speed", "0.25",
-        "--pan_speed", "0.75",
-        "--up", "Y",
+        "--theme",
+        "dark",
+        "--tree_width",
+        "300",
+        "--ticks",
+        "12",
+        "--rotate_speed",
+        "2.0",
+        "--zoom_speed",
+        "0.25",
+        "--pan_speed",
+        "0.75",
+        "--up",
+        "Y",
     )
     cfg = _wait_for_config(STANDALONE_PORT, proc)
 
@@ -156,9 +168,9 @@ def test_inverted_flags(standalone):
     proc = standalone("--no_glass", "--no_tools", "--perspective")
     cfg = _wait_for_config(STANDALONE_PORT, proc)
 
-    assert cfg["glass"] is False    # --no_glass
-    assert cfg["tools"] is False    # --no_tools
-    assert cfg["ortho"] is False    # --perspective
+    assert cfg["glass"] is False  # --no_glass
+    assert cfg["tools"] is False  # --no_tools
+    assert cfg["ortho"] is False  # --perspective
 
 
 def test_defaults_when_no_flags(standalone):
@@ -362,3 +374,45 @@ def test_standalone_defaults_match_package_json():
         "DEFAULTS drift between standalone_defaults.py and package.json:\n"
         + "\n".join(mismatches)
     )
+
+
+def test_unix_socket(standalone, tmp_path):
+    """`--unix_socket` serves the same websocket protocol on a socket path."""
+    path = str(tmp_path / "ocp.sock")
+    proc = standalone("--unix_socket", path, "--theme", "dark")
+    cfg = _wait_for_config(path, proc)
+    assert cfg["theme"] == "dark"
+
+
+class _Client:
+    """A python client that subscribes to the mirror and disconnects"""
+
+    def __init__(self):
+        self.messages = [b'C:"subscribe"']
+        self.sent = []
+        self.closed = False
+
+    def receive(self):
+        if not self.messages:
+            raise ConnectionClosed(1000, "")
+        return self.messages.pop(0)
+
+    def send(self, data):
+        if self.closed:
+            raise ConnectionClosed(1006, "")
+        self.sent.append(data)
+
+
+def test_closed_subscribers_are_removed():
+    viewer = Viewer({"port": STANDALONE_PORT})
+    client = _Client()
+    with pytest.raises(ConnectionClosed):
+        viewer.handle_message(client)
+    assert len(client.sent) == 1
+    assert viewer.subscribers == set()
+
+    # a client whose connection broke without a close
+    viewer.subscribe(client)
+    client.closed = True
+    viewer.push_status()
+    assert viewer.subscribers == set()